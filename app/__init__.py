@@ -1,42 +1,120 @@
+import time
+
+# Time the imports of the package, which the startup report includes
+IMPORT_STARTED = time.perf_counter()
+
+import atexit
+import datetime
+import json
 import subprocess
 import logging
-import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import click
 from flask import Flask, request, jsonify
 from app.extensions import db, migrate
 from app.logging_config import setup_logging
-from app.algorithms.flat_prob import FlatProbRLAlgorithm
-from app.models import ModelParameters
+from app.models import ModelParameters, Action
+from app.algorithms.registry import (
+    algorithm_seed,
+    initialize_algorithm,
+    initialize_shadow_algorithm,
+    create_algorithm,
+    get_algorithm_class,
+)
+from app.startup import StartupProfiler
+from app.idempotency import ActionCache
+from app.json_provider import FastJSONProvider, dumps as json_dumps, loads as json_loads
+from app.snapshots import ParameterSnapshots
+from app.studies import Study, register_study_routes
+from app.column_types import get_state_dim
+from app.parameter_store import (
+    ParameterStore,
+    split_array_parameters,
+    get_parameter_arrays,
+)
+
+# The modules of features that are off by default, e.g. shadow evaluation,
+# write-behind or partitioning, are imported by the functions that use them
+IMPORT_MS = (time.perf_counter() - IMPORT_STARTED) * 1000
 
 
 def create_app(config_class="config.Config"):
     """
     Factory function to create and configure the Flask app.
     """
+    profiler = StartupProfiler()
+
+    # The imports of the package count toward the startup of the first app
+    # created in the process
+    global IMPORT_MS
+    if IMPORT_MS is not None:
+        profiler.record("import_app", IMPORT_MS)
+        IMPORT_MS = None
+
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+
     # Set up logging
-    setup_logging()
+    setup_logging(app.config.get("LOG_DROP_WHEN_FULL", False))
     logger = logging.getLogger()
     logger.info("Starting Flask application...")
 
-    app = Flask(__name__)
-    app.config.from_object(config_class)
+    app.startup_profiler = profiler
+    app.initialized = False
+    app.initialize_lock = threading.Lock()
+    app.action_cache = ActionCache(app.config.get("ACTION_CACHE_SIZE", 10000))
+    app.studies = {}
 
-    # Initialize database and migration extensions
-    db.init_app(app)
-    migrate.init_app(app, db)
+    # Serialize JSON with orjson, in requests and responses as well as in the
+    # JSON columns of the database
+    app.json = FastJSONProvider(app)
+    engine_options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    engine_options.setdefault("json_serializer", json_dumps)
+    engine_options.setdefault("json_deserializer", json_loads)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
 
-    # Create a shared instance of the Flat Probability RL Algorithm
-    app.rl_algorithm = FlatProbRLAlgorithm()
+    # Initialize database and migration extensions
+    with profiler.phase("extensions"):
+        db.init_app(app)
+        migrate.init_app(app, db)
 
     # Register blueprints
-    from app.routes.user import user_blueprint
-    from app.routes.action import action_blueprint
-    from app.routes.data import data_blueprint
-    from app.routes.update import update_blueprint
+    with profiler.phase("import_blueprints"):
+        from app.routes.user import user_blueprint
+        from app.routes.action import action_blueprint
+        from app.routes.data import data_blueprint
+        from app.routes.update import update_blueprint
+        from app.routes.admin import admin_blueprint
+        from app.routes.health import health_blueprint
 
     app.register_blueprint(user_blueprint, url_prefix="/api/v1")
     app.register_blueprint(action_blueprint, url_prefix="/api/v1")
     app.register_blueprint(data_blueprint, url_prefix="/api/v1")
     app.register_blueprint(update_blueprint, url_prefix="/api/v1")
+    app.register_blueprint(admin_blueprint, url_prefix="/api/v1")
+    app.register_blueprint(health_blueprint)
+
+    # Reject or queue requests over the admission limits before any other
+    # work is done for them
+    app.admission = None
+    if app.config.get("ADMISSION_CONTROL"):
+        from app.admission import register_admission_control
+
+        register_admission_control(app)
+
+    # In lazy mode, the algorithm, tables and priors are set up by the first
+    # request, or before forking by calling initialize_app from a pre-fork hook
+    if app.config.get("LAZY_INIT"):
+
+        @app.before_request
+        def lazy_initialize():
+            initialize_app(app)
+
+    # Serve the routes of each study under /api/v1/studies/<study_id>
+    register_study_routes(
+        app, [user_blueprint, action_blueprint, data_blueprint, update_blueprint]
+    )
 
     # Log incoming requests and outgoing responses
     @app.before_request
@@ -67,33 +145,230 @@ def create_app(config_class="config.Config"):
         logger.error("Unhandled Exception: %s", str(e), exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
-    with app.app_context():
-        # Create tables for models
-        db.create_all()
-        initialize_model_parameters(app)
+    if not app.config.get("LAZY_INIT"):
+        initialize_app(app)
 
     # Register CLI commands
     register_cli_commands(app)
 
+    profiler.log_report(app.config.get("STARTUP_TARGET_MS"))
+
     return app
 
+def initialize_app(app):
+    """
+    Create the algorithm, the tables and the model parameters.
+    Safe to call more than once and from several threads; only the first
+    call does any work.
+    """
+    if app.initialized:
+        return
+
+    with app.initialize_lock:
+        if app.initialized:
+            return
+
+        profiler = app.startup_profiler
+
+        # Create a shared instance of the configured RL Algorithm and register
+        # its state dimension so state columns are stored fixed-width. The
+        # algorithm module is imported here so lazy mode defers it.
+        with profiler.phase("create_algorithm"):
+            app.rl_algorithm = initialize_algorithm(app)
+
+        with app.app_context():
+            # Create tables for models
+            with profiler.phase("create_tables"):
+                db.create_all()
+
+            with profiler.phase("load_priors"):
+                initialize_model_parameters(app)
+
+            # Load the first snapshot of the model parameters, which serves
+            # action requests without database queries
+            with profiler.phase("load_snapshot"):
+                app.parameter_snapshots = ParameterSnapshots(
+                    app, app.config.get("PARAMETER_REFRESH_SECONDS", 1.0)
+                )
+                app.parameter_snapshots.load()
+
+            # Compile kernels and fill caches before the first request
+            with profiler.phase("warm_up"):
+                warm_up_algorithm(app)
+
+            # Create the upcoming partitions of partitioned tables. A failure
+            # here does not stop the app; the default partition takes the
+            # rows until the next update creates the partitions.
+            with profiler.phase("ensure_partitions"):
+                try:
+                    if app.config.get("PARTITIONED_TABLES"):
+                        from app.partitioning import ensure_configured_partitions
+
+                        ensure_configured_partitions(app)
+                except Exception as e:
+                    logging.error(f"[Startup] Partition maintenance failed: {e}")
+
+        # Poll for parameter versions written by other workers
+        if app.parameter_snapshots.refresh_seconds:
+            app.parameter_snapshots.start()
+
+        # Start evaluating the shadow algorithm, if one is configured
+        app.shadow_evaluator = None
+        shadow_algorithm = initialize_shadow_algorithm(app)
+        if shadow_algorithm is not None:
+            from app.shadow import ShadowEvaluator
+
+            app.shadow_evaluator = ShadowEvaluator(
+                app, shadow_algorithm, app.config["SHADOW_QUEUE_SIZE"]
+            )
+            app.shadow_evaluator.start()
+
+        # Start the group commit buffer for action rows, if enabled
+        app.action_writer = None
+        if app.config.get("ACTION_WRITE_BEHIND"):
+            from app.write_behind import WriteBehindBuffer, DURABILITY_MODES
+
+            durability = app.config.get("WRITE_BEHIND_DURABILITY", "wait")
+            if durability not in DURABILITY_MODES:
+                raise ValueError(
+                    f"WRITE_BEHIND_DURABILITY must be one of {DURABILITY_MODES}."
+                )
+            app.action_writer = WriteBehindBuffer(
+                app,
+                Action,
+                app.config.get("WRITE_BEHIND_MAX_BATCH", 500),
+                app.config.get("WRITE_BEHIND_MAX_DELAY_MS", 20),
+            )
+            app.action_writer.start()
+            # Commit the buffered rows when the process exits
+            atexit.register(app.action_writer.stop)
+
+        # Start the update scheduler, if debouncing or triggers are configured
+        from app.scheduler import initialize_scheduler
+
+        app.update_scheduler = initialize_scheduler(app)
+
+        # Set up the further studies of a multi-study deployment
+        with profiler.phase("initialize_studies"):
+            for study_id, settings in app.config.get("STUDIES", {}).items():
+                app.studies[study_id] = initialize_study(app, study_id, settings)
+
+        app.initialized = True
+
+def initialize_study(app, study_id: str, settings: dict) -> Study:
+    """
+    Create a study with its own algorithm, tables, model parameters,
+    parameter snapshots, action cache and update queue. Shadow evaluation
+    and write-behind are only available in the default study.
+    """
+    study = Study(app, study_id, settings)
+    study.rl_algorithm = create_algorithm(
+        study.config.get("RL_ALGORITHM", "flat_prob"),
+        algorithm_seed(study.config, "study", study_id),
+        study.config.get("RL_ALGORITHM_KWARGS"),
+    )
+
+    # State columns have one fixed width in every study
+    state_dim = get_state_dim("state")
+    if state_dim is not None and study.rl_algorithm.state_dim not in (None, state_dim):
+        raise ValueError(
+            f"Study {study_id} has state dimension {study.rl_algorithm.state_dim}, "
+            f"the default study {state_dim}."
+        )
+
+    with app.app_context():
+        study.engine = study.create_engine()
+
+    with study.app_context():
+        db.metadata.create_all(study.engine)
+        initialize_model_parameters(study)
+        study.parameter_snapshots = ParameterSnapshots(
+            study, study.config.get("PARAMETER_REFRESH_SECONDS", 1.0)
+        )
+        study.parameter_snapshots.load()
+        warm_up_algorithm(study)
+
+    if study.parameter_snapshots.refresh_seconds:
+        study.parameter_snapshots.start()
+
+    # Updates of the study run one at a time on its own thread, so they
+    # queue behind each other but not behind other studies' updates
+    study.update_executor = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix=f"update-{study_id}"
+    )
+    from app.scheduler import initialize_scheduler
+
+    study.update_scheduler = initialize_scheduler(study)
+
+    logging.info(f"[Studies] Initialized study {study_id}.")
+    return study
+
+def warm_up_algorithm(app):
+    """
+    Warm up the algorithm with the action parameters of the current
+    snapshot, if there is one.
+    """
+    snapshot = app.parameter_snapshots.current
+    if snapshot is not None:
+        app.rl_algorithm.warm_up(snapshot.action_parameters)
+
 def initialize_model_parameters(app):
     """
     Initialize the ModelParameters table with default priors if empty.
+    Array-valued priors are published to the shared parameter store.
     """
+    # Map the shared parameter arrays. When this runs before the workers fork,
+    # every worker shares the mapped pages.
+    parameters_dir = app.config.get("PARAMETERS_DIR")
+    app.parameter_store = ParameterStore(parameters_dir) if parameters_dir else None
+
+    # Array parameters are only kept in the parameter store
+    array_parameters = sorted(
+        name
+        for name, spec in app.rl_algorithm.parameter_schema.items()
+        if isinstance(spec, tuple)
+    )
+    if array_parameters and app.parameter_store is None:
+        raise ValueError(
+            f"Algorithm {app.rl_algorithm.name} has the array parameters "
+            f"{array_parameters}, which require PARAMETERS_DIR."
+        )
+
     if not ModelParameters.query.first():
-        # Load priors from config or pickle file
-        pickle_file = app.config["PRIORS_PICKLE_FILE"]
+        from app.priors import load_pickle_priors, load_priors, validate_priors
+
+        # Load priors from config or a priors file
+        priors_file = app.config.get("PRIORS_FILE")
+        pickle_file = app.config.get("PRIORS_PICKLE_FILE")
         priors = app.config["MODEL_PRIORS"]
+        schema = app.rl_algorithm.parameter_schema
 
-        if pickle_file:
+        if priors_file or pickle_file:
             try:
-                with open(pickle_file, "rb") as f:
-                    priors = pickle.load(f)
-                app.logger.info("Loaded priors from pickle file: %s", pickle_file)
+                if priors_file:
+                    priors = load_priors(priors_file, schema)
+                else:
+                    # The deprecated setting always names a pickle, whatever
+                    # its extension
+                    priors = load_pickle_priors(pickle_file)
+                    validate_priors(priors, schema)
+                app.logger.info("Loaded priors from file: %s", priors_file or pickle_file)
             except Exception as e:
-                app.logger.error("Failed to load priors from pickle file: %s", str(e))
+                app.logger.error("Failed to load priors from file: %s", str(e))
                 raise e
+        else:
+            validate_priors(priors, schema)
+
+        # Large arrays go to the parameter store instead of the database
+        priors, arrays = split_array_parameters(priors)
+        if arrays:
+            if app.parameter_store is None:
+                raise ValueError(
+                    f"The priors have the array parameters {sorted(arrays)}, "
+                    "which require PARAMETERS_DIR."
+                )
+            app.parameter_store.publish_all(arrays)
+            app.logger.info("Published array priors: %s", list(arrays))
 
         # Initialize the ModelParameters table
         default_params = ModelParameters(probability_of_action=priors["probability_of_action"])
@@ -101,6 +376,9 @@ def initialize_model_parameters(app):
         db.session.commit()
         app.logger.info("Initialized ModelParameters with priors: %s", priors)
 
+    if app.parameter_store is not None:
+        app.parameter_store.arrays()
+
 def register_cli_commands(app):
     """
     Registers custom CLI commands with the Flask app.
@@ -118,3 +396,224 @@ def register_cli_commands(app):
         print("Recreating all tables...")
         subprocess.run(["flask", "db", "upgrade"], check=True)
         print("Database reset complete.")
+
+    @app.cli.command("convert-priors")
+    @click.argument("source")
+    @click.argument("destination")
+    def convert_priors(source, destination):
+        """
+        Converts a priors file, e.g. a pickle, to an uncompressed .npz archive
+        that can be memory-mapped.
+        """
+        from app.priors import load_priors, save_priors
+
+        priors = load_priors(source)
+        save_priors(priors, destination)
+        print(f"Saved priors to {destination}.")
+
+    @app.cli.command("simulate")
+    @click.option("--users", default=1000, help="Number of simulated users.")
+    @click.option("--decisions", default=100, help="Decision points per user.")
+    @click.option("--update-every", default=10, help="Decision points between updates.")
+    @click.option("--replicates", default=4, help="Number of independent replicates.")
+    @click.option("--processes", default=1, help="Size of the process pool.")
+    @click.option("--seed", default=0, help="Seed for the replicates.")
+    @click.option("--algorithm", default="flat_prob", help="Registered algorithm name.")
+    @click.option(
+        "--kwargs",
+        "algorithm_kwargs",
+        default='{"update_delay": 0}',
+        help="Algorithm keyword arguments as JSON.",
+    )
+    def simulate(
+        users, decisions, update_every, replicates, processes, seed, algorithm,
+        algorithm_kwargs,
+    ):
+        """
+        Runs a simulation of an algorithm, by default the flat probability
+        algorithm, in a synthetic temperature/clicks environment. Does not
+        use the database.
+        """
+        from app.simulation import run_simulation
+
+        result = run_simulation(
+            get_algorithm_class(algorithm),
+            app.config["MODEL_PRIORS"],
+            n_users=users,
+            n_decisions=decisions,
+            update_every=update_every,
+            n_replicates=replicates,
+            processes=processes,
+            seed=seed,
+            algorithm_kwargs=json.loads(algorithm_kwargs),
+        )
+        for name, value in result["summary"].items():
+            print(f"{name:<15} {value}")
+
+    @app.cli.command("swap-algorithm")
+    @click.argument("name")
+    @click.option("--url", default="http://127.0.0.1:5000", help="Base URL of the running API.")
+    @click.option("--reload", is_flag=True, help="Re-import the algorithm module.")
+    def swap_algorithm_command(name, url, reload):
+        """
+        Asks a running API to load, warm up and swap in a new algorithm.
+        """
+        import requests
+
+        response = requests.post(
+            f"{url}/api/v1/admin/algorithm",
+            json={"algorithm": name, "reload": reload},
+            headers={"X-Admin-Token": app.config.get("ADMIN_TOKEN") or ""},
+        )
+        print(response.status_code, response.json())
+
+    @app.cli.command("ope")
+    @click.option("--algorithm", default=None, help="Algorithm to evaluate, by default RL_ALGORITHM.")
+    @click.option("--chunk-size", default=10000, help="Rows streamed per chunk.")
+    @click.option("--bootstrap", default=200, help="Number of bootstrap replicates.")
+    @click.option("--processes", default=1, help="Size of the bootstrap process pool.")
+    @click.option("--seed", default=0, help="Seed for the bootstrap.")
+    def ope(algorithm, chunk_size, bootstrap, processes, seed):
+        """
+        Estimates the value of an algorithm's policy from the logged study
+        data with IPW, self-normalized IPW and doubly robust estimators.
+        The policy uses the latest model parameters.
+        """
+        from app.ope import evaluate_policy
+
+        initialize_app(app)
+        if algorithm is None:
+            candidate = app.rl_algorithm
+        else:
+            candidate = create_algorithm(
+                algorithm, algorithm_seed(app.config, "ope")
+            )
+
+        model_parameters = ModelParameters.query.order_by(
+            ModelParameters.timestamp.desc()
+        ).first()
+        parameters = candidate.action_parameters(
+            {
+                "probability_of_action": model_parameters.probability_of_action,
+                **get_parameter_arrays(app),
+            }
+        )
+
+        result = evaluate_policy(
+            candidate,
+            parameters,
+            chunk_size=chunk_size,
+            n_bootstrap=bootstrap,
+            processes=processes,
+            seed=seed,
+        )
+        print(f"Evaluated {candidate.version_string()} on {result['n']} decisions.")
+        for name in ("ipw", "snipw", "dr", "behavior"):
+            lower, upper = result[name]["ci"]
+            print(
+                f"{name:<10} {result[name]['estimate']:>10.4f}"
+                f"  95% CI [{lower:.4f}, {upper:.4f}]"
+            )
+
+    @app.cli.command("startup-report")
+    def startup_report():
+        """
+        Prints the time taken by each startup phase of this process.
+        """
+        initialize_app(app)
+        report = app.startup_profiler.report(app.config.get("STARTUP_TARGET_MS"))
+        for name, elapsed_ms in report["phases_ms"].items():
+            print(f"{name:<20} {elapsed_ms:>10.2f} ms")
+        print(f"{'total':<20} {report['total_ms']:>10.2f} ms")
+        if "within_target" in report:
+            print(f"Target {report['target_ms']} ms met: {report['within_target']}")
+
+    @app.cli.command("precompute-actions")
+    def precompute_actions_command():
+        """
+        Generates actions for the upcoming decision points of every user
+        with the latest model parameters.
+        """
+        from app.precompute import precompute_actions
+
+        initialize_app(app)
+        model_parameters = ModelParameters.query.order_by(
+            ModelParameters.timestamp.desc()
+        ).first()
+        count = precompute_actions(
+            app.rl_algorithm,
+            model_parameters,
+            app.config["PRECOMPUTE_HORIZON"],
+            get_parameter_arrays(app),
+        )
+        print(f"Precomputed {count} actions.")
+
+    @app.cli.command("partition-tables")
+    def partition_tables():
+        """
+        Converts the tables in PARTITIONED_TABLES to tables partitioned by
+        range on PARTITION_COLUMN, moving their rows. PostgreSQL only. Each
+        table is converted in its own transaction; stop the API first.
+        """
+        from app.partitioning import partition_table, partition_scheme
+
+        initialize_app(app)
+        if db.engine.dialect.name != "postgresql":
+            raise click.ClickException("Partitioning requires PostgreSQL.")
+
+        scheme = partition_scheme(app)
+        for table in app.config["PARTITIONED_TABLES"]:
+            with db.engine.begin() as connection:
+                converted = partition_table(
+                    connection,
+                    db.metadata.tables[table],
+                    scheme,
+                    app.config["PARTITIONS_AHEAD"],
+                )
+            print(f"{table}: {'partitioned' if converted else 'already partitioned'}")
+
+    @app.cli.command("create-partitions")
+    def create_partitions():
+        """
+        Creates the upcoming partitions of the partitioned tables. Run it
+        periodically, e.g. from cron, if the API is rarely restarted or
+        updated.
+        """
+        from app.partitioning import ensure_configured_partitions
+
+        initialize_app(app)
+        created = ensure_configured_partitions(app)
+        print(f"Created {len(created)} partitions.")
+
+    @app.cli.command("archive-partitions")
+    @click.option(
+        "--before",
+        required=True,
+        help="Archive partitions ending at or before this date (YYYY-MM-DD) or decision index.",
+    )
+    @click.option("--directory", default=None, help="Output directory, by default ARCHIVE_DIR.")
+    def archive_partitions_command(before, directory):
+        """
+        Detaches old partitions of the partitioned tables, writes them to
+        compressed Parquet files and drops them. Requires pyarrow.
+        """
+        from app.partitioning import archive_partitions, partition_scheme
+
+        initialize_app(app)
+        scheme = partition_scheme(app)
+        if scheme.by_time:
+            before = datetime.datetime.fromisoformat(before)
+        else:
+            before = int(before)
+
+        for table in app.config["PARTITIONED_TABLES"]:
+            with db.engine.begin() as connection:
+                paths = archive_partitions(
+                    connection,
+                    table,
+                    scheme,
+                    before,
+                    directory or app.config["ARCHIVE_DIR"],
+                )
+            for path in paths:
+                print(f"Archived {path}")
@@ -0,0 +1,300 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import g, request, jsonify
+
+
+class TokenBucket:
+    """
+    A token bucket holding up to `burst` tokens, refilled at `rate` tokens
+    per second. Not thread-safe; the AdmissionController holds its lock.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        """
+        Initialize a full bucket.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """
+        Take a token. Returns 0 if one was taken, otherwise the seconds until
+        one is available.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionClass:
+    """
+    The limits of a class of endpoints, e.g. uploads. Classes with a lower
+    `priority` are served first. `max_concurrent` limits the requests of the
+    class in flight, and `rate` and `burst` the requests per second of each
+    client. A request that finds no free slot waits up to `queue_timeout`
+    seconds, behind at most `max_queued` others, before it is rejected.
+    `reserve` slots of the shared capacity are kept free for this class
+    from classes of lower priority.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int = 0,
+        max_concurrent: int = None,
+        rate: float = None,
+        burst: float = None,
+        queue_timeout: float = 0,
+        max_queued: int = 100,
+        reserve: int = 0,
+        retry_after: float = 1,
+        max_clients: int = 10000,
+    ):
+        """
+        Initialize the class. `burst` defaults to one second of `rate`.
+        Buckets are kept for the `max_clients` most recent clients.
+        """
+        self.name = name
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst or max(rate or 0, 1)
+        self.queue_timeout = queue_timeout
+        self.max_queued = max_queued
+        self.reserve = reserve
+        self.retry_after = retry_after
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+
+        self.in_flight = 0
+        self.queued = 0
+
+        # Counters, read by the diagnostics endpoints
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected_rate = 0
+        self.rejected_busy = 0
+        self.wait_seconds = 0.0
+
+    def bucket(self, client: str, now: float) -> TokenBucket:
+        """
+        Return the token bucket of `client`, evicting the least recently
+        seen client if there are too many.
+        """
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.rate, self.burst, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+        return bucket
+
+    def stats(self) -> dict:
+        """
+        Return the current load and the counters.
+        """
+        return {
+            "priority": self.priority,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected_rate": self.rejected_rate,
+            "rejected_busy": self.rejected_busy,
+            "mean_wait_ms": (
+                1000 * self.wait_seconds / self.queued_total if self.queued_total else 0.0
+            ),
+            "clients": len(self.buckets),
+        }
+
+
+class AdmissionController:
+    """
+    Admits requests by class, within per-class concurrency limits, per-client
+    token buckets and an optional shared `capacity` of requests in flight
+    across all classes. When a slot frees up, waiting requests of higher
+    priority take it first.
+    """
+
+    def __init__(self, classes: dict, capacity: int = None):
+        """
+        Initialize the controller. `classes` maps class names to the keyword
+        arguments of AdmissionClass.
+        """
+        self.classes = {
+            name: AdmissionClass(name, **settings) for name, settings in classes.items()
+        }
+        self.capacity = capacity
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+        # Slots of the shared capacity each class may use, leaving the
+        # reserves of the classes of higher priority
+        self.limits = {
+            name: (
+                capacity
+                - sum(
+                    other.reserve
+                    for other in self.classes.values()
+                    if other.priority < admission_class.priority
+                )
+                if capacity is not None
+                else None
+            )
+            for name, admission_class in self.classes.items()
+        }
+
+    def _has_room(self, admission_class: AdmissionClass) -> bool:
+        """
+        Whether a request of the class can start now.
+        """
+        if (
+            admission_class.max_concurrent is not None
+            and admission_class.in_flight >= admission_class.max_concurrent
+        ):
+            return False
+        if self.capacity is None:
+            return True
+        if self.in_flight >= self.limits[admission_class.name]:
+            return False
+        # Leave freed slots to waiting requests of higher priority
+        return not any(
+            other.queued
+            for other in self.classes.values()
+            if other.priority < admission_class.priority
+        )
+
+    def admit(self, name: str, client: str) -> float:
+        """
+        Admit a request of class `name` from `client`, waiting for a slot if
+        the class queues. Returns 0 if the request was admitted, which must
+        be followed by release(name), otherwise the seconds the client
+        should wait before retrying.
+        """
+        admission_class = self.classes[name]
+        with self.condition:
+            now = time.monotonic()
+            if admission_class.rate:
+                wait = admission_class.bucket(client, now).take(now)
+                if wait:
+                    admission_class.rejected_rate += 1
+                    return wait
+
+            if not self._has_room(admission_class):
+                if (
+                    admission_class.queue_timeout <= 0
+                    or admission_class.queued >= admission_class.max_queued
+                ):
+                    admission_class.rejected_busy += 1
+                    return admission_class.retry_after
+
+                deadline = now + admission_class.queue_timeout
+                admission_class.queued += 1
+                admission_class.queued_total += 1
+                try:
+                    while not self._has_room(admission_class):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            admission_class.rejected_busy += 1
+                            return admission_class.retry_after
+                        self.condition.wait(remaining)
+                finally:
+                    admission_class.queued -= 1
+                    admission_class.wait_seconds += time.monotonic() - now
+                    # A lower priority request may have been waiting on this one
+                    self.condition.notify_all()
+
+            admission_class.in_flight += 1
+            admission_class.admitted += 1
+            self.in_flight += 1
+            return 0.0
+
+    def release(self, name: str):
+        """
+        Free the slot of an admitted request of class `name`.
+        """
+        with self.condition:
+            self.classes[name].in_flight -= 1
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Return the shared load and the stats of each class.
+        """
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "classes": {
+                name: admission_class.stats()
+                for name, admission_class in self.classes.items()
+            },
+        }
+
+
+def detach_admission():
+    """
+    Keep the admission slot of the current request after the response, for
+    background work the request started, e.g. an update. Returns the
+    function that frees the slot, which does nothing if the request holds
+    none.
+    """
+    name = g.pop("admission_class", None)
+    controller = g.pop("admission_controller", None)
+    if name is None:
+        return lambda: None
+    return lambda: controller.release(name)
+
+
+def register_admission_control(app):
+    """
+    Limit the endpoints in ADMISSION_ENDPOINTS, by view function name, with
+    the classes in ADMISSION_LIMITS. Rejected requests get a 429 with a
+    Retry-After header. Clients are identified by ADMISSION_CLIENT_HEADER,
+    or by their address.
+    """
+    app.admission = None
+    if not app.config.get("ADMISSION_CONTROL"):
+        return
+
+    app.admission = AdmissionController(
+        app.config["ADMISSION_LIMITS"], app.config.get("ADMISSION_CAPACITY")
+    )
+    endpoints = app.config["ADMISSION_ENDPOINTS"]
+    header = app.config.get("ADMISSION_CLIENT_HEADER")
+
+    @app.before_request
+    def admit_request():
+        # Study routes have the same view names under another blueprint
+        name = endpoints.get((request.endpoint or "").rpartition(".")[2])
+        if name is None:
+            return None
+
+        client = (request.headers.get(header) if header else None) or request.remote_addr
+        retry_after = app.admission.admit(name, client)
+        if retry_after:
+            logging.info(f"[Admission] Rejected {name} request from {client}.")
+            return (
+                jsonify({"status": "failed", "message": "Too many requests."}),
+                429,
+                {"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+        g.admission_class = name
+        g.admission_controller = app.admission
+
+    @app.teardown_request
+    def release_request(exception):
+        name = g.pop("admission_class", None)
+        if name is not None:
+            g.pop("admission_controller").release(name)
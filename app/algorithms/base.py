@@ -1,13 +1,92 @@
+import os
 from abc import ABC, abstractmethod
+import numpy as np
+from app.schemas import Schema
+
+
+def as_rows(data) -> list:
+    """
+    Convert column arrays (a dictionary of equal-length sequences) to a list
+    of row dictionaries. Lists of dictionaries are returned unchanged.
+    """
+    if not isinstance(data, dict):
+        return list(data)
+    names = list(data)
+    columns = [np.asarray(data[name]).tolist() for name in names]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def as_columns(data) -> dict:
+    """
+    Convert a list of row dictionaries to column arrays, keyed by the fields
+    of the first row. Dictionaries of columns are returned unchanged.
+    """
+    if isinstance(data, dict):
+        return data
+    rows = list(data)
+    if not rows:
+        return {}
+    return {name: [row[name] for row in rows] for name in rows[0]}
 
 
 class RLAlgorithm(ABC):
+    # Registry name and version of the algorithm. The version is recorded on
+    # every action, so bump it whenever the behavior of the algorithm changes.
+    name = None
+    version = "0"
+
+    # Fixed dimension of the state vectors returned by make_state.
+    # None means the dimension is not enforced by the storage layer.
+    state_dim = None
+
+    # Whether get_action ignores the state. Actions of state-independent
+    # algorithms can be generated ahead of time for any context.
+    state_independent = False
+
+    # Whether update only needs the study data that arrived since the
+    # parameters it is given were computed, e.g. because it updates a
+    # posterior one row at a time. Updates of such algorithms only load the
+    # new rows.
+    incremental_updates = False
+
+    # Parameters expected in the priors and the ModelParameters table. Maps
+    # each name to a Python type for scalars, or to a shape tuple for arrays,
+    # e.g. {"mean": ("d",), "cov": ("d", "d")}. See app.priors.
+    parameter_schema = {}
+
+    # Fields of the context sent with action requests and of the outcome sent
+    # with uploaded data. The schemas are compiled into the validators of
+    # the routes, see app.schemas.
+    context_schema = Schema({}, name="context")
+    outcome_schema = Schema({}, name="outcome")
+
     def __init__(self, seed: int = None):
         """
         Initialize the RL algorithm with any parameters or configurations.
         """
         pass
 
+    @property
+    def rng(self) -> np.random.Generator:
+        """
+        The random number generator of the algorithm. Worker processes forked
+        from a preloaded app would otherwise all continue the same stream, so
+        a process that did not create the generator replaces it: with fresh
+        entropy if the algorithm is unseeded, else with a generator seeded by
+        the seed and the process id.
+        """
+        if self._rng_pid != os.getpid():
+            seed = getattr(self, "seed", None)
+            self.rng = np.random.default_rng(
+                None if seed is None else [seed, os.getpid()]
+            )
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng: np.random.Generator):
+        self._rng = rng
+        self._rng_pid = os.getpid()
+
     @abstractmethod
     def get_action(self, user_id, state, parameters, decision_idx) -> tuple:
         """
@@ -19,7 +98,9 @@ class RLAlgorithm(ABC):
     @abstractmethod
     def update(self, old_params, data) -> tuple:
         """
-        Update the RL algorithm with new data and/or parameters.
+        Update the RL algorithm with new data and/or parameters. `data` holds
+        the study data as a StudyBatch of column arrays under "batch" (see
+        app.batch), along with its "rewards" and "states".
         """
         pass
 
@@ -35,4 +116,105 @@ class RLAlgorithm(ABC):
         """
         Create a reward based on the user_id, state, action and outcome.
         """
-        pass
\ No newline at end of file
+        pass
+
+    # Batch counterparts of the per-user methods. The defaults loop over the
+    # per-user methods; algorithms override them with vectorized code.
+
+    def make_states(self, contexts) -> tuple:
+        """
+        Create the states of several users. `contexts` is either column
+        arrays or a list of context dictionaries. Return a boolean status
+        array and an (N, d) state matrix; rows that failed are NaN.
+        """
+        rows = as_rows(contexts)
+        status = np.zeros(len(rows), dtype=bool)
+        states = [None] * len(rows)
+        for i, context in enumerate(rows):
+            status[i], states[i] = self.make_state(context)
+
+        dim = next((len(state) for ok, state in zip(status, states) if ok), 0)
+        matrix = np.full((len(rows), dim), np.nan)
+        for i in np.flatnonzero(status):
+            matrix[i] = states[i]
+        return status, matrix
+
+    def get_actions(self, user_ids, states, parameters, decision_idxs) -> tuple:
+        """
+        Generate actions for several users. Return an array of actions, an
+        array of action probabilities and a list of the random states used.
+        """
+        actions = np.empty(len(user_ids), dtype=np.int64)
+        probs = np.empty(len(user_ids), dtype=np.float64)
+        random_states = []
+        for i, (user_id, state, decision_idx) in enumerate(
+            zip(user_ids, states, decision_idxs)
+        ):
+            actions[i], probs[i], random_state = self.get_action(
+                user_id, state, parameters, int(decision_idx)
+            )
+            random_states.append(random_state)
+        return actions, probs, random_states
+
+    def make_rewards(self, user_ids, states, actions, outcomes) -> tuple:
+        """
+        Create the rewards of several users. `outcomes` is either column
+        arrays or a list of outcome dictionaries. Return a boolean status
+        array and an array of rewards; rewards that failed are NaN.
+        """
+        rows = as_rows(outcomes)
+        status = np.zeros(len(rows), dtype=bool)
+        rewards = np.full(len(rows), np.nan)
+        for i, (user_id, state, action, outcome) in enumerate(
+            zip(user_ids, states, actions, rows)
+        ):
+            status[i], reward = self.make_reward(user_id, state, action, outcome)
+            if status[i]:
+                rewards[i] = reward
+        return status, rewards
+
+    def action_probabilities(self, user_ids, states, parameters, decision_idxs):
+        """
+        Return the probability that the policy takes action 1 for each user,
+        state and decision index, as an array. Used to evaluate the policy
+        off-policy from logged data; algorithms opt in by overriding it.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not implement action_probabilities."
+        )
+
+    def version_string(self) -> str:
+        """
+        Return the name and version of the algorithm, e.g. "flat_prob@1.0.0".
+        """
+        return f"{self.name or type(self).__name__}@{self.version}"
+
+    def warm_up(self, parameters: dict):
+        """
+        Prepare the algorithm to serve requests, e.g. compile kernels or fill
+        caches, before it receives traffic. `parameters` are the current
+        action parameters.
+        """
+        pass
+
+    def stats(self) -> dict:
+        """
+        Return the algorithm's counters, e.g. of its caches, read by the
+        diagnostics endpoints.
+        """
+        return {}
+
+    def action_parameters(self, model_parameters: dict) -> dict:
+        """
+        Convert the model parameters, as stored in the ModelParameters table
+        and the parameter store, to the parameters passed to get_action.
+        """
+        return model_parameters
+
+    def forecast_state(self, user_id, decision_idx):
+        """
+        Forecast the state of a user at an upcoming decision index, so the
+        action can be generated ahead of time. Return None if the state
+        cannot be forecast.
+        """
+        return None
@@ -0,0 +1,110 @@
+import numpy as np
+from app.algorithms.linear_ts import LinearTSAlgorithm
+
+
+class BayesianLinearTSAlgorithm(LinearTSAlgorithm):
+    """
+    Bayesian linear regression Thompson sampling with action centering and
+    clipped probabilities, as used in just-in-time adaptive intervention
+    trials. The reward is modelled as
+
+        r = s . beta + (a - pi) * (s . theta) + noise
+
+    where pi is the probability with which action 1 was offered. Centering
+    the action on pi makes the estimate of the treatment effect theta robust
+    to a misspecified baseline s . beta. Each request takes action 1 with
+    the posterior probability that s . theta > 0, clipped to
+    [min_probability, max_probability] so every action keeps a chance of
+    being taken.
+
+    Updates only process the rows that arrived since the previous update.
+    The compiled kernels add them one at a time with rank-one
+    Sherman-Morrison updates, O(p^2) per row for p = 2 * state_dim weights;
+    the NumPy kernels add them in one block, see posterior_update_numpy.
+    """
+
+    name = "blr_ts"
+    version = "1.1.0"
+
+    incremental_updates = True
+
+    def __init__(
+        self,
+        seed: int = None,
+        backend: str = "auto",
+        probability_samples: int = 1000,
+        noise_variance: float = 1.0,
+        min_probability: float = 0.1,
+        max_probability: float = 0.9,
+        probability_method: str = "closed_form",
+        probability_cache_size: int = 10000,
+    ):
+        """
+        Initialize the algorithm. The prior is the initial model parameters,
+        see LinearTSAlgorithm for the other arguments.
+        """
+        if not 0 <= min_probability <= max_probability <= 1:
+            raise ValueError(
+                "Clipping requires 0 <= min_probability <= max_probability <= 1."
+            )
+        super().__init__(
+            seed,
+            backend=backend,
+            probability_samples=probability_samples,
+            noise_variance=noise_variance,
+            probability_method=probability_method,
+            probability_cache_size=probability_cache_size,
+        )
+        self.min_probability = min_probability
+        self.max_probability = max_probability
+
+    def treatment_probability(self, state, parameters: dict) -> float:
+        """
+        Return the posterior probability that action 1 is better in the
+        state, clipped to [min_probability, max_probability].
+        """
+        probability = self.probabilities.probability(parameters, state)
+        return min(max(probability, self.min_probability), self.max_probability)
+
+    def action_probabilities(self, user_ids, states, parameters: dict, decision_idxs):
+        """
+        Return the clipped treatment probability of each state.
+        """
+        return np.clip(
+            self.probabilities.probabilities(parameters, states),
+            self.min_probability,
+            self.max_probability,
+        )
+
+    def update(self, old_params: dict, data: dict) -> tuple[bool, dict]:
+        """
+        Update the posterior with the rows of the batch that have a reward.
+        The batch holds only the rows that arrived since `old_params` were
+        computed.
+        """
+        try:
+            batch = data["batch"]
+            rows = np.isfinite(batch.rewards)
+            states = batch.states[rows].astype(np.float64)
+            actions = batch.actions[rows]
+            # The logged probability is that of action 1
+            probability_of_one = batch.action_probs[rows]
+            centered = (actions - probability_of_one)[:, None] * states
+            features = np.ascontiguousarray(np.hstack([states, centered]))
+
+            mean, cov = self.kernels.posterior_update(
+                np.array(old_params["mean"], dtype=np.float64),
+                np.array(old_params["cov"], dtype=np.float64),
+                features,
+                np.ascontiguousarray(batch.rewards[rows], dtype=np.float64),
+                float(self.noise_variance),
+            )
+            return True, {
+                "probability_of_action": old_params["probability_of_action"],
+                "mean": mean,
+                # Symmetrize away the rounding error of the updates
+                "cov": (cov + cov.T) / 2,
+            }
+        except Exception as e:
+            self.logger.error(f"Error in updating model: {e}")
+            return False, old_params
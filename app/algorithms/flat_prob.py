@@ -1,6 +1,7 @@
 import random
 import numpy as np
-from app.algorithms.base import RLAlgorithm
+from app.algorithms.base import RLAlgorithm, as_columns
+from app.schemas import Schema, Field
 from app.logging_config import get_rl_logger
 import time
 
@@ -10,13 +11,38 @@ class FlatProbRLAlgorithm(RLAlgorithm):
     A flat probability algorithm that generates actions with a fixed probability.
     """
 
-    def __init__(self, seed: int = None):
+    name = "flat_prob"
+    version = "1.0.0"
+
+    # The state is just the temperature
+    state_dim = 1
+
+    # The action probability does not depend on the state
+    state_independent = True
+
+    # The only parameter is the probability of taking the action
+    parameter_schema = {"probability_of_action": float}
+
+    # The context is the temperature and the outcome is the number of clicks
+    context_schema = Schema(
+        {"temperature": Field((float, int), invalid="temperature must be a float or int.")},
+        name="context",
+    )
+    outcome_schema = Schema(
+        {"clicks": Field((int, float), invalid="clicks must be an int or float.")},
+        name="outcome",
+    )
+
+    def __init__(self, seed: int = None, update_delay: float = 5):
         """
         Initialize the flat probability RL algorithm.
+        `update_delay` is the number of seconds each update sleeps to
+        simulate a long-running update.
         """
         super().__init__(seed)
         self.logger = get_rl_logger()
         self.seed = seed
+        self.update_delay = update_delay
         self.rng = np.random.default_rng(
             self.seed
         )  # Use NumPy's RNG for reproducibility
@@ -56,6 +82,12 @@ class FlatProbRLAlgorithm(RLAlgorithm):
 
         return action, probability, rng_state
 
+    def action_parameters(self, model_parameters: dict) -> dict:
+        """
+        get_action only needs the probability of taking the action.
+        """
+        return {"probability": model_parameters["probability_of_action"]}
+
     def update(self, old_params: dict, data: dict) -> tuple[bool, dict]:
         """
         This method is used to update the algorithm with collected data.
@@ -65,7 +97,7 @@ class FlatProbRLAlgorithm(RLAlgorithm):
         """
         try:
             # Add sleep to simulate a long-running update
-            time.sleep(5)
+            time.sleep(self.update_delay)
 
             # For the flat probability algorithm, there is no update
             # Get the old parameters
@@ -127,3 +159,67 @@ class FlatProbRLAlgorithm(RLAlgorithm):
             self.logger.error(f"Error in making reward: {e}")
             return False, None
 
+    def make_states(self, contexts) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Create the states of several users as a (N, 1) temperature matrix.
+        Falls back to the per-user loop if the temperatures are not all
+        present and numeric, so failures are reported per row.
+        """
+        try:
+            temperature = np.asarray(
+                as_columns(contexts)["temperature"], dtype=np.float64
+            )
+            return np.isfinite(temperature), temperature[:, None]
+        except (KeyError, TypeError, ValueError):
+            return super().make_states(contexts)
+
+    def get_actions(
+        self, user_ids, states, parameters: dict, decision_idxs
+    ) -> tuple[np.ndarray, np.ndarray, list]:
+        """
+        Generate the actions of several users with a single draw of N
+        Bernoulli variables, the same draw get_action makes one at a time, so
+        a seeded algorithm takes the same actions either way. Each row records
+        the rng state from before its own draw, so it can be replayed with
+        rng.binomial(1, probability).
+        """
+        n = len(user_ids)
+        probability = parameters["probability"]
+
+        # Every Bernoulli draw takes one step of the bit generator, so the
+        # state before row i is the batch state advanced by i steps
+        replay = type(self.rng.bit_generator)()
+        replay.state = self.rng.bit_generator.state
+        rng_states = []
+        for _ in range(n):
+            rng_states.append(replay.state)
+            replay.advance(1)
+
+        actions = self.rng.binomial(1, probability, size=n).astype(np.int64)
+        probs = np.full(n, probability, dtype=np.float64)
+
+        self.logger.info(
+            "Generated %d actions with probability=%f", n, probability
+        )
+        return actions, probs, rng_states
+
+    def action_probabilities(
+        self, user_ids, states, parameters: dict, decision_idxs
+    ) -> np.ndarray:
+        """
+        Every user takes the action with the flat probability.
+        """
+        return np.full(len(user_ids), parameters["probability"], dtype=np.float64)
+
+    def make_rewards(
+        self, user_ids, states, actions, outcomes
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Create the rewards of several users from the clicks. Falls back to
+        the per-user loop if the clicks are not all present and numeric.
+        """
+        try:
+            clicks = np.asarray(as_columns(outcomes)["clicks"], dtype=np.float64)
+            return np.isfinite(clicks), clicks
+        except (KeyError, TypeError, ValueError):
+            return super().make_rewards(user_ids, states, actions, outcomes)
@@ -0,0 +1,235 @@
+import logging
+import numpy as np
+
+# Numba is optional. Without it, the NumPy implementations are used.
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# NumPy implementations. Each is a few vectorized calls, so at the small
+# sizes of a single request the time goes to the per-call overhead.
+
+
+def cholesky_numpy(matrix: np.ndarray) -> np.ndarray:
+    """
+    Return the lower triangular Cholesky factor of a symmetric positive
+    definite matrix.
+    """
+    return np.linalg.cholesky(matrix)
+
+
+def sample_scores_numpy(
+    state: np.ndarray, mean: np.ndarray, chol: np.ndarray, noise: np.ndarray
+) -> np.ndarray:
+    """
+    Return state . theta for each draw theta = mean + chol @ z of the normal
+    distribution N(mean, chol @ chol.T), where z is a row of the (n, d)
+    standard normal `noise`.
+    """
+    return state @ mean + noise @ (chol.T @ state)
+
+
+def sample_score_matrix(
+    states: np.ndarray, mean: np.ndarray, chol: np.ndarray, noise: np.ndarray
+) -> np.ndarray:
+    """
+    Return the (n_draws, n) matrix of s . theta for each row s of the (n, d)
+    `states` and each draw theta = mean + chol @ z, where z is a row of the
+    (n_draws, d) standard normal `noise`. The same draws score every state
+    with one matrix product, which runs on BLAS in every backend.
+    """
+    return (mean + noise @ chol.T) @ states.T
+
+
+def posterior_update_numpy(
+    mean: np.ndarray,
+    cov: np.ndarray,
+    features: np.ndarray,
+    rewards: np.ndarray,
+    noise_variance: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Update the normal posterior N(mean, cov) of the weights of a Bayesian
+    linear regression with the rows of `features` and `rewards`. The rows
+    are added in one block in information form, which gives the same
+    posterior as the row-by-row Sherman-Morrison updates of the loop
+    version, with two p x p inversions instead of a Python loop over rows.
+    Returns a new mean and covariance.
+    """
+    precision = np.linalg.inv(cov)
+    new_precision = precision + features.T @ features / noise_variance
+    new_cov = np.linalg.inv(new_precision)
+    new_mean = new_cov @ (precision @ mean + features.T @ rewards / noise_variance)
+    return new_mean, new_cov
+
+
+# Loop implementations, compiled by Numba into a single call each. They are
+# plain Python too, which the tests use to check them without Numba.
+
+
+def cholesky_loops(matrix: np.ndarray) -> np.ndarray:
+    """
+    Cholesky-Banachiewicz factorization, written out so Numba does not need
+    SciPy's LAPACK bindings.
+    """
+    n = matrix.shape[0]
+    chol = np.zeros((n, n))
+    for i in range(n):
+        for j in range(i + 1):
+            total = matrix[i, j]
+            for k in range(j):
+                total -= chol[i, k] * chol[j, k]
+            if i == j:
+                if total <= 0.0:
+                    raise ValueError("Matrix is not positive definite.")
+                chol[i, i] = np.sqrt(total)
+            else:
+                chol[i, j] = total / chol[j, j]
+    return chol
+
+
+def sample_scores_loops(
+    state: np.ndarray, mean: np.ndarray, chol: np.ndarray, noise: np.ndarray
+) -> np.ndarray:
+    """
+    Loop version of sample_scores_numpy.
+    """
+    d = state.shape[0]
+    base = 0.0
+    for i in range(d):
+        base += state[i] * mean[i]
+
+    # state . (chol @ z) = (chol.T @ state) . z
+    weights = np.zeros(d)
+    for j in range(d):
+        for i in range(j, d):
+            weights[j] += chol[i, j] * state[i]
+
+    scores = np.empty(noise.shape[0])
+    for k in range(noise.shape[0]):
+        total = base
+        for j in range(d):
+            total += weights[j] * noise[k, j]
+        scores[k] = total
+    return scores
+
+
+def posterior_update_loops(
+    mean: np.ndarray,
+    cov: np.ndarray,
+    features: np.ndarray,
+    rewards: np.ndarray,
+    noise_variance: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Update the posterior one row at a time with the Sherman-Morrison
+    formula, O(p^2) per row: with g = cov @ x / (noise_variance + x . cov @ x),
+    mean += g * (reward - x . mean) and cov -= g (cov @ x)^T.
+    """
+    p = mean.shape[0]
+    mean = mean.copy()
+    cov = cov.copy()
+    cov_x = np.empty(p)
+    for row in range(features.shape[0]):
+        variance = noise_variance
+        residual = rewards[row]
+        for i in range(p):
+            total = 0.0
+            for j in range(p):
+                total += cov[i, j] * features[row, j]
+            cov_x[i] = total
+            variance += features[row, i] * total
+            residual -= features[row, i] * mean[i]
+        for i in range(p):
+            gain = cov_x[i] / variance
+            mean[i] += gain * residual
+            for j in range(p):
+                cov[i, j] -= gain * cov_x[j]
+    return mean, cov
+
+
+class Kernels:
+    """
+    One backend's implementation of the kernels used in the inner loops of
+    algorithms. Every kernel takes and returns float64 NumPy arrays, and all
+    backends compute the same values up to rounding, so algorithms can
+    switch backends without changing their results.
+    """
+
+    def __init__(self, backend: str, cholesky, sample_scores, posterior_update):
+        """
+        Initialize the kernel set of `backend`.
+        """
+        self.backend = backend
+        self.cholesky = cholesky
+        self.sample_scores = sample_scores
+        self.posterior_update = posterior_update
+        self.warmed_up = False
+
+    def warm_up(self, dim: int):
+        """
+        Call every kernel once on arrays of dimension `dim`, so a compiling
+        backend compiles them now rather than on the first request.
+        """
+        matrix = np.eye(dim)
+        chol = self.cholesky(matrix)
+        self.sample_scores(np.ones(dim), np.zeros(dim), chol, np.zeros((2, dim)))
+        self.posterior_update(np.zeros(dim), matrix, np.ones((1, dim)), np.ones(1), 1.0)
+        self.warmed_up = True
+
+    def __repr__(self):
+        """
+        Return a string representation of the Kernels object.
+        """
+        return f"<Kernels backend={self.backend}, warmed_up={self.warmed_up}>"
+
+
+# Kernel sets by backend, created on first use
+_KERNELS = {}
+
+
+def numba_available() -> bool:
+    """
+    Return whether Numba is installed.
+    """
+    return numba is not None
+
+
+def compile_kernels() -> Kernels:
+    """
+    Compile the loop kernels with Numba. Compiled code is cached on disk,
+    so later processes load it instead of compiling again, and releases the
+    GIL so request threads run the kernels in parallel.
+    """
+    jit = numba.njit(cache=True, nogil=True)
+    return Kernels(
+        "numba",
+        jit(cholesky_loops),
+        jit(sample_scores_loops),
+        jit(posterior_update_loops),
+    )
+
+
+def get_kernels(backend: str = "auto") -> Kernels:
+    """
+    Return the kernels of `backend`: "numba", "numpy", or "auto" for Numba
+    when it is installed and NumPy otherwise.
+    """
+    if backend == "auto":
+        backend = "numba" if numba_available() else "numpy"
+
+    if backend not in _KERNELS:
+        if backend == "numba":
+            if not numba_available():
+                raise ValueError("The numba kernel backend requires Numba to be installed.")
+            _KERNELS[backend] = compile_kernels()
+        elif backend == "numpy":
+            _KERNELS[backend] = Kernels(
+                "numpy", cholesky_numpy, sample_scores_numpy, posterior_update_numpy
+            )
+        else:
+            raise ValueError(f"Unknown kernel backend: {backend}")
+        logging.info(f"[Kernels] Using the {backend} kernels.")
+
+    return _KERNELS[backend]
@@ -0,0 +1,249 @@
+import numpy as np
+from app.algorithms.kernels import get_kernels, sample_score_matrix
+from app.algorithms.mapreduce import MapReduceAlgorithm
+from app.algorithms.probability import (
+    ProbabilityService,
+    linear_gaussian_probability,
+    new_parameter_version,
+)
+from app.schemas import Schema, Field
+from app.logging_config import get_rl_logger
+
+
+class LinearTSAlgorithm(MapReduceAlgorithm):
+    """
+    Linear Thompson sampling between two actions. The reward is modelled as
+    r = s . beta + a * (s . theta) + noise for state s and action a, with a
+    normal prior on (beta, theta). Thompson sampling takes action 1 when a
+    posterior draw of theta gives s . theta > 0, which happens with the
+    posterior probability P(s . theta > 0). Each request computes that
+    probability with a ProbabilityService, in closed form by default, and
+    takes action 1 with it, so the logged probability is exact.
+
+    The per-request linear algebra runs on the kernels of app.algorithms.kernels,
+    compiled with Numba when it is installed. The Cholesky factor of the
+    posterior covariance is computed once per parameter version.
+    """
+
+    name = "linear_ts"
+    version = "1.2.0"
+
+    # The state is an intercept and the temperature
+    state_dim = 2
+
+    # Posterior mean and covariance of (beta, theta), which has 2 * state_dim
+    # entries. probability_of_action is kept for the ModelParameters table
+    # and not used by the algorithm. Updates add the prior, the initial mean
+    # and covariance, as prior_mean and prior_cov.
+    parameter_schema = {
+        "probability_of_action": float,
+        "mean": ("p",),
+        "cov": ("p", "p"),
+    }
+
+    context_schema = Schema(
+        {"temperature": Field((float, int), invalid="temperature must be a float or int.")},
+        name="context",
+    )
+    outcome_schema = Schema(
+        {"clicks": Field((int, float), invalid="clicks must be an int or float.")},
+        name="outcome",
+    )
+
+    def __init__(
+        self,
+        seed: int = None,
+        backend: str = "auto",
+        probability_samples: int = 1000,
+        noise_variance: float = 1.0,
+        probability_method: str = "closed_form",
+        probability_cache_size: int = 10000,
+    ):
+        """
+        Initialize the algorithm. `backend` selects the kernels, see
+        get_kernels. The action probability is computed with
+        `probability_method`, "closed_form" or "monte_carlo" from
+        `probability_samples` posterior draws, and the last
+        `probability_cache_size` probabilities are cached. Updates refit the
+        posterior with the given reward noise variance from the prior, the
+        initial model parameters.
+        """
+        if probability_method not in ("closed_form", "monte_carlo"):
+            raise ValueError(f"Unknown probability method: {probability_method}")
+        super().__init__(seed)
+        self.logger = get_rl_logger()
+        self.seed = seed
+        self.backend = backend
+        self.kernels = get_kernels(backend)
+        self.probability_samples = probability_samples
+        self.noise_variance = noise_variance
+        self.rng = np.random.default_rng(self.seed)
+        self.probabilities = ProbabilityService(
+            closed_form=posterior_probability if probability_method == "closed_form" else None,
+            sampler=self.sample_scores,
+            samples=probability_samples,
+            cache_size=probability_cache_size,
+            seed=seed,
+        )
+
+    def __getstate__(self):
+        """
+        Leave the kernels out when the algorithm is sent to the update
+        worker processes, which look them up again.
+        """
+        state = self.__dict__.copy()
+        del state["kernels"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore the algorithm in a worker process.
+        """
+        self.__dict__.update(state)
+        self.kernels = get_kernels(self.backend)
+
+    def action_parameters(self, model_parameters: dict) -> dict:
+        """
+        get_action needs the posterior mean of theta and the Cholesky factor
+        of its covariance.
+        """
+        d = self.state_dim
+        mean = np.asarray(model_parameters["mean"], dtype=np.float64)
+        cov = np.asarray(model_parameters["cov"], dtype=np.float64)
+        return {
+            "version": new_parameter_version(),
+            "mean": np.ascontiguousarray(mean[d:]),
+            "chol": self.kernels.cholesky(np.ascontiguousarray(cov[d:, d:])),
+        }
+
+    def warm_up(self, parameters: dict):
+        """
+        Compile the kernels and run one action, so the first request does
+        not pay for either.
+        """
+        self.kernels.warm_up(self.state_dim)
+        self.sample_action(np.ones(self.state_dim), parameters, np.random.default_rng(0))
+
+    def sample_scores(self, states, parameters: dict, noise: np.ndarray) -> np.ndarray:
+        """
+        Return s . theta for each state s and each posterior draw of theta
+        given by `noise`, the Monte Carlo sampler of the probability service.
+        """
+        return sample_score_matrix(states, parameters["mean"], parameters["chol"], noise)
+
+    def treatment_probability(self, state, parameters: dict) -> float:
+        """
+        Return the posterior probability that action 1 is better in the
+        state.
+        """
+        return self.probabilities.probability(parameters, state)
+
+    def sample_action(self, state, parameters: dict, rng: np.random.Generator) -> tuple:
+        """
+        Take action 1 with the treatment probability. Return the action and
+        the probability of action 1, which is logged as action_prob by every
+        algorithm.
+        """
+        probability_of_one = self.treatment_probability(state, parameters)
+        action = int(rng.random() < probability_of_one)
+        return action, probability_of_one
+
+    def get_action(
+        self, user_id: str, state, parameters: dict, decision_idx: int
+    ) -> tuple[int, float, dict]:
+        """
+        Generate an action for the state by Thompson sampling.
+        """
+        rng_state = self.rng.bit_generator.state
+        action, probability = self.sample_action(state, parameters, self.rng)
+        return action, probability, rng_state
+
+    def action_probabilities(self, user_ids, states, parameters: dict, decision_idxs):
+        """
+        Return the treatment probability of each state.
+        """
+        return self.probabilities.probabilities(parameters, states)
+
+    def stats(self) -> dict:
+        """
+        Return the kernel backend and the counters of the probability
+        service.
+        """
+        return {
+            "kernels": self.kernels.backend,
+            "probabilities": self.probabilities.stats(),
+        }
+
+    def map_shard(self, old_params: dict, shard, rng: np.random.Generator) -> tuple:
+        """
+        Return the sufficient statistics of the shard's rows with a reward:
+        X.T @ X and X.T @ r for the features X = [s, a * s].
+        """
+        rows = np.isfinite(shard.rewards)
+        states = shard.states[rows].astype(np.float64)
+        actions = shard.actions[rows].astype(np.float64)
+        features = np.hstack([states, actions[:, None] * states])
+        return features.T @ features, features.T @ shard.rewards[rows]
+
+    def reduce_shards(self, old_params: dict, results: list) -> tuple[bool, dict]:
+        """
+        Sum the sufficient statistics and compute the posterior from the
+        prior. Every update refits on all the study data, so the prior is
+        the initial mean and covariance, kept as prior_mean and prior_cov
+        from the first update on.
+        """
+        prior_mean = np.asarray(
+            old_params.get("prior_mean", old_params["mean"]), dtype=np.float64
+        )
+        prior_cov = np.asarray(
+            old_params.get("prior_cov", old_params["cov"]), dtype=np.float64
+        )
+        p = 2 * self.state_dim
+        gram = np.zeros((p, p))
+        moment = np.zeros(p)
+        for shard_gram, shard_moment in results:
+            gram += shard_gram
+            moment += shard_moment
+
+        prior_precision = np.linalg.inv(prior_cov)
+        precision = prior_precision + gram / self.noise_variance
+        cov = np.linalg.inv(precision)
+        mean = cov @ (prior_precision @ prior_mean + moment / self.noise_variance)
+        return True, {
+            "probability_of_action": old_params["probability_of_action"],
+            "mean": mean,
+            # Symmetrize away the rounding error of the inverse
+            "cov": (cov + cov.T) / 2,
+            "prior_mean": prior_mean,
+            "prior_cov": prior_cov,
+        }
+
+    def make_state(self, context: dict) -> tuple[bool, list]:
+        """
+        The state is an intercept and the temperature.
+        """
+        try:
+            return True, [1.0, float(context["temperature"])]
+        except Exception as e:
+            self.logger.error(f"Error in making state: {e}")
+            return False, []
+
+    def make_reward(
+        self, user_id: str, state, action: int, outcome: dict
+    ) -> tuple[bool, float]:
+        """
+        The reward is the number of clicks.
+        """
+        try:
+            return True, float(outcome["clicks"])
+        except Exception as e:
+            self.logger.error(f"Error in making reward: {e}")
+            return False, None
+
+
+def posterior_probability(states: np.ndarray, parameters: dict) -> np.ndarray:
+    """
+    Closed form of the probability service: P(s . theta > 0) under the
+    posterior of theta in the action parameters.
+    """
+    return linear_gaussian_probability(states, parameters["mean"], parameters["chol"])
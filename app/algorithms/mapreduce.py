@@ -0,0 +1,153 @@
+import logging
+import multiprocessing
+import os
+import zlib
+from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from app.algorithms.base import RLAlgorithm
+from app.batch import StudyBatch
+
+# The process pool of this process and its size, kept across updates so its
+# start-up cost is only paid once
+_executor = None
+_executor_key = None
+
+
+def user_shards(users: np.ndarray, n_shards: int) -> np.ndarray:
+    """
+    Return the shard of each user id: a CRC32 of the id modulo `n_shards`,
+    which is the same in every process and every run.
+    """
+    return np.fromiter(
+        (zlib.crc32(str(user).encode()) % n_shards for user in users),
+        dtype=np.int64,
+        count=len(users),
+    )
+
+
+def split_batch(batch: StudyBatch, n_shards: int) -> list[tuple[int, StudyBatch]]:
+    """
+    Partition a batch by user into at most `n_shards` batches, so all rows
+    of a user are in the same shard, in id order. Returns the non-empty
+    shards with their index.
+    """
+    row_shards = user_shards(batch.users, n_shards)[batch.user_codes]
+    order = np.argsort(row_shards, kind="stable")
+    bounds = np.searchsorted(row_shards[order], np.arange(n_shards + 1))
+    return [
+        (shard, batch.take(order[bounds[shard] : bounds[shard + 1]]))
+        for shard in range(n_shards)
+        if bounds[shard + 1] > bounds[shard]
+    ]
+
+
+def run_shard(algorithm, old_params: dict, shard: StudyBatch, seed: tuple):
+    """
+    Run the map step of one shard with its own random generator.
+    """
+    return algorithm.map_shard(old_params, shard, np.random.default_rng(seed))
+
+
+def get_executor(processes: int) -> ProcessPoolExecutor:
+    """
+    Return the process pool of this process with `processes` workers. The
+    workers are spawned rather than forked, since the API process runs
+    other threads.
+    """
+    global _executor, _executor_key
+
+    key = (os.getpid(), processes)
+    if _executor is None or _executor_key != key:
+        if _executor is not None and _executor_key[0] == os.getpid():
+            _executor.shutdown(wait=False)
+        _executor = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        _executor_key = key
+    return _executor
+
+
+def map_reduce_update(
+    algorithm,
+    old_params: dict,
+    batch: StudyBatch,
+    processes: int = 1,
+    seed: tuple = (0,),
+) -> tuple[bool, dict]:
+    """
+    Run a map-reduce update: split the batch into the algorithm's n_shards
+    shards by user, run map_shard on each one across `processes` processes,
+    and pass the results, in shard order, to reduce_shards. Shard i draws
+    its random numbers from default_rng((*seed, i)), so the result does not
+    depend on the number of processes.
+    """
+    shards = split_batch(batch, algorithm.n_shards)
+    seeds = [(*seed, shard) for shard, _ in shards]
+    batches = [shard_batch for _, shard_batch in shards]
+
+    if processes > 1 and len(shards) > 1:
+        executor = get_executor(processes)
+        results = list(
+            executor.map(
+                run_shard,
+                [algorithm] * len(batches),
+                [old_params] * len(batches),
+                batches,
+                seeds,
+            )
+        )
+    else:
+        results = [
+            run_shard(algorithm, old_params, shard_batch, shard_seed)
+            for shard_batch, shard_seed in zip(batches, seeds)
+        ]
+    return algorithm.reduce_shards(old_params, results)
+
+
+class MapReduceAlgorithm(RLAlgorithm):
+    """
+    Base class of algorithms whose update is data-parallel across users,
+    e.g. per-user posterior updates. Subclasses implement map_shard, which
+    computes a partial result from the rows of a subset of the users, and
+    reduce_shards, which combines the partial results into the new
+    parameters. update() runs them through map_reduce_update, with the
+    process count and seed that process_update_request passes in the data.
+    """
+
+    # Number of user shards. It is fixed, rather than the number of
+    # processes, so the results do not depend on the size of the pool.
+    n_shards = 16
+
+    @abstractmethod
+    def map_shard(self, old_params: dict, shard: StudyBatch, rng: np.random.Generator):
+        """
+        Compute the partial result of the rows of one shard of users. Runs
+        in a worker process, so the result must be picklable.
+        """
+        pass
+
+    @abstractmethod
+    def reduce_shards(self, old_params: dict, results: list) -> tuple[bool, dict]:
+        """
+        Combine the partial results of the shards, in shard order, into the
+        new parameters. Return the status and the new parameters.
+        """
+        pass
+
+    def update(self, old_params: dict, data: dict) -> tuple[bool, dict]:
+        """
+        Update the parameters with a map-reduce over the shards of users.
+        """
+        try:
+            return map_reduce_update(
+                self,
+                old_params,
+                data["batch"],
+                data.get("processes", 1),
+                data.get("seed", (0,)),
+            )
+        except Exception as e:
+            logging.error(f"[MapReduce] Error: {e}")
+            logging.exception(e)
+            return False, old_params
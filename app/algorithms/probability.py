@@ -0,0 +1,256 @@
+import itertools
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# SciPy is optional. Without it, the normal CDF is computed with erfc below.
+try:
+    from scipy.special import ndtr
+except ImportError:
+    ndtr = None
+
+# math.erfc of each value, for the small arrays where it is faster than the
+# vectorized erfc
+_erfc_elementwise = np.frompyfunc(math.erfc, 1, 1)
+_VECTORIZED_ERFC_MIN_SIZE = 1024
+
+# Source of the versions of action parameters, see new_parameter_version
+_PARAMETER_VERSIONS = itertools.count(1)
+
+# Coefficients of the rational approximations of erf and erfc in W. J. Cody,
+# "Rational Chebyshev approximations for the error function", Math. Comp. 23
+# (1969), for |x| <= 0.46875, 0.46875 < |x| <= 4 and |x| > 4
+_ERF_A = (3.16112374387056560e00, 1.13864154151050156e02, 3.77485237685302021e02,
+          3.20937758913846947e03, 1.85777706184603153e-1)
+_ERF_B = (2.36012909523441209e01, 2.44024637934444173e02, 1.28261652607737228e03,
+          2.84423683343917062e03)
+_ERFC_C = (5.64188496988670089e-1, 8.88314979438837594e00, 6.61191906371416295e01,
+           2.98635138197400131e02, 8.81952221241769090e02, 1.71204761263407058e03,
+           2.05107837782607147e03, 1.23033935479799725e03, 2.15311535474403846e-8)
+_ERFC_D = (1.57449261107098347e01, 1.17693950891312499e02, 5.37181101862009858e02,
+           1.62138957456669019e03, 3.29079923573345963e03, 4.36261909014324716e03,
+           3.43936767414372164e03, 1.23033935480374942e03)
+_ERFC_P = (3.05326634961232344e-1, 3.60344899949804439e-1, 1.25781726111229246e-1,
+           1.60837851487422766e-2, 6.58749161529837803e-4, 1.63153871373020978e-2)
+_ERFC_Q = (2.56852019228982242e00, 1.87295284992346725e00, 5.27905102951428412e-1,
+           6.05183413124413191e-2, 2.33520497626869185e-3)
+
+
+def new_parameter_version() -> int:
+    """
+    Return a version number for a new set of action parameters, unique in
+    this process. Algorithms store it under "version" in the parameters
+    returned by action_parameters, which is called once per parameter
+    snapshot, so cached probabilities are never read across versions.
+    """
+    return next(_PARAMETER_VERSIONS)
+
+
+def erfc(x) -> np.ndarray:
+    """
+    Return the complementary error function of each value, vectorized over
+    arrays, with Cody's rational approximations. They are accurate to about
+    1e-15 relative to the result, so erfc of large values, the far tails of
+    the normal distribution, keeps its relative precision. Each branch is
+    evaluated on all values, clipped to its range, and the results are
+    selected with np.where, which is cheaper than indexing the values of
+    each branch.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.abs(x)
+
+    # |x| <= 0.46875: erfc = 1 - erf, with erf a rational function of x^2
+    xs = np.clip(x, -0.46875, 0.46875)
+    xsq = xs * xs
+    num, den = _ERF_A[4] * xsq, xsq
+    for a, b in zip(_ERF_A[:3], _ERF_B[:3]):
+        num, den = (num + a) * xsq, (den + b) * xsq
+    small = 1 - xs * (num + _ERF_A[3]) / (den + _ERF_B[3])
+
+    # 0.46875 < |x| <= 4 and 4 < |x|: erfc(|x|) is exp(-x^2) times a rational
+    # function of |x| or of 1 / x^2. erfc(|x|) underflows above 27.
+    yo = np.clip(y, 0.46875, 27.0)
+    ym = np.minimum(yo, 4.0)
+    num, den = _ERFC_C[8] * ym, ym
+    for c, d in zip(_ERFC_C[:7], _ERFC_D[:7]):
+        num, den = (num + c) * ym, (den + d) * ym
+    middle = (num + _ERFC_C[7]) / (den + _ERFC_D[7])
+
+    yl = np.maximum(yo, 4.0)
+    inverse = 1 / (yl * yl)
+    num, den = _ERFC_P[5] * inverse, inverse
+    for p, q in zip(_ERFC_P[:4], _ERFC_Q[:4]):
+        num, den = (num + p) * inverse, (den + q) * inverse
+    large = (1 / math.sqrt(math.pi) - inverse * (num + _ERFC_P[4]) / (den + _ERFC_Q[4])) / yl
+
+    # x^2 is split into a part that is exact in floating point and a small
+    # remainder, so that exp(-x^2) stays accurate
+    split = np.trunc(yo * 16) / 16
+    outer = np.where(yo <= 4, middle, large)
+    outer = outer * np.exp(-split * split) * np.exp(-(yo - split) * (yo + split))
+    outer = np.where(y > 27, 0.0, outer)
+
+    # erfc(-x) = 2 - erfc(x)
+    outer = np.where(x < 0, 2 - outer, outer)
+    return np.where(y <= 0.46875, small, outer)
+
+
+def normal_cdf(x) -> np.ndarray:
+    """
+    Return the standard normal CDF of each value, with scipy.special.ndtr if
+    SciPy is installed and erfc otherwise. All keep the relative precision
+    of tail probabilities. The vectorized erfc makes some fifty passes over
+    its input, so below _VECTORIZED_ERFC_MIN_SIZE values, e.g. for the state
+    of a single request, math.erfc of each value is faster.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if ndtr is not None:
+        return ndtr(x)
+    scaled = -x / math.sqrt(2)
+    if scaled.size < _VECTORIZED_ERFC_MIN_SIZE:
+        return np.asarray(_erfc_elementwise(scaled), dtype=np.float64) / 2
+    return erfc(scaled) / 2
+
+
+def linear_gaussian_probability(
+    states: np.ndarray, mean: np.ndarray, chol: np.ndarray
+) -> np.ndarray:
+    """
+    Return P(s . theta > 0) for each row s of `states` when theta follows
+    N(mean, chol @ chol.T). s . theta is normal with mean s . mean and
+    standard deviation |chol.T @ s|, so the probability is a normal CDF.
+    States with a zero standard deviation get 1 if s . mean > 0, else 0.
+    """
+    states = np.atleast_2d(np.asarray(states, dtype=np.float64))
+    means = states @ mean
+    sds = np.linalg.norm(states @ chol, axis=1)
+    probabilities = (means > 0).astype(np.float64)
+    varying = sds > 0
+    probabilities[varying] = normal_cdf(means[varying] / sds[varying])
+    return probabilities
+
+
+class ProbabilityService:
+    """
+    Computes the probability that a stochastic policy takes action 1 in a
+    state, for logging as action_prob. The probability is computed in closed
+    form when the algorithm provides one, and otherwise estimated by Monte
+    Carlo from `samples` posterior draws in one vectorized call. Results are
+    cached in a thread-safe LRU cache keyed by (parameter version, state),
+    so retries, precomputed actions and repeated states cost a lookup.
+
+    `closed_form(states, parameters)` returns the probabilities of an (n, d)
+    array of states. `sampler(states, parameters, noise)` returns the
+    (samples, n) scores of the states for the draws given by the (samples, d)
+    standard normal `noise`; action 1 is taken when the score is positive.
+    One set of draws scores all the states of a batch.
+    """
+
+    def __init__(
+        self,
+        closed_form=None,
+        sampler=None,
+        samples: int = 1000,
+        cache_size: int = 10000,
+        seed: int = None,
+    ):
+        """
+        Initialize the service. At least one of `closed_form` and `sampler`
+        is required.
+        """
+        if closed_form is None and sampler is None:
+            raise ValueError("A closed form or a sampler is required.")
+        self.closed_form = closed_form
+        self.sampler = sampler
+        self.samples = samples
+        self.cache_size = cache_size
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters, read by the diagnostics endpoints
+        self.hits = 0
+        self.misses = 0
+        self.closed_form_computations = 0
+        self.monte_carlo_computations = 0
+
+    def __getstate__(self):
+        """
+        Copy the service without its cache and lock, e.g. when the algorithm
+        is sent to the update worker processes.
+        """
+        state = self.__dict__.copy()
+        state["_entries"] = OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore the service with an empty cache.
+        """
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def probability(self, parameters: dict, state) -> float:
+        """
+        Return the probability of action 1 in `state`. Parameters without a
+        "version" are not cached.
+        """
+        state = np.ascontiguousarray(state, dtype=np.float64)
+        version = parameters.get("version")
+        key = (version, state.tobytes()) if version is not None else None
+
+        if key is not None:
+            with self._lock:
+                probability = self._entries.get(key)
+                if probability is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return probability
+                self.misses += 1
+
+        probability = float(self.compute(parameters, state[None, :])[0])
+
+        if key is not None and self.cache_size > 0:
+            with self._lock:
+                self._entries[key] = probability
+                while len(self._entries) > self.cache_size:
+                    self._entries.popitem(last=False)
+        return probability
+
+    def probabilities(self, parameters: dict, states) -> np.ndarray:
+        """
+        Return the probability of action 1 in each row of `states`, without
+        the cache. Used for batches, e.g. off-policy evaluation.
+        """
+        return self.compute(parameters, np.asarray(states, dtype=np.float64))
+
+    def compute(self, parameters: dict, states: np.ndarray) -> np.ndarray:
+        """
+        Compute the probabilities of an (n, d) array of states, in closed form
+        if possible and by Monte Carlo otherwise.
+        """
+        if self.closed_form is not None:
+            self.closed_form_computations += len(states)
+            return self.closed_form(states, parameters)
+
+        self.monte_carlo_computations += len(states)
+        with self._lock:
+            noise = self.rng.standard_normal((self.samples, states.shape[1]))
+        scores = self.sampler(states, parameters, noise)
+        return np.count_nonzero(scores > 0, axis=0) / self.samples
+
+    def stats(self) -> dict:
+        """
+        Return the cache size and the counters.
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "closed_form": self.closed_form_computations,
+            "monte_carlo": self.monte_carlo_computations,
+        }
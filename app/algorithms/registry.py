@@ -0,0 +1,200 @@
+import importlib
+import logging
+import zlib
+from importlib.metadata import entry_points
+from threading import Thread
+import numpy as np
+from app.algorithms.base import RLAlgorithm
+from app.column_types import get_state_dim, register_state_dim
+
+# Entry point group that installed packages use to provide algorithms
+ENTRY_POINT_GROUP = "justin_rl_api.algorithms"
+
+# Algorithms shipped with the template, as "module:Class" paths so that they
+# are only imported when used
+BUILTIN_ALGORITHMS = {
+    "flat_prob": "app.algorithms.flat_prob:FlatProbRLAlgorithm",
+    "linear_ts": "app.algorithms.linear_ts:LinearTSAlgorithm",
+    "blr_ts": "app.algorithms.blr_ts:BayesianLinearTSAlgorithm",
+}
+
+# Algorithms registered in-process with register_algorithm
+_REGISTRY = {}
+
+
+def register_algorithm(name: str):
+    """
+    Class decorator that registers an RLAlgorithm under `name`.
+    """
+
+    def decorator(cls):
+        if not issubclass(cls, RLAlgorithm):
+            raise TypeError(f"{cls.__name__} is not an RLAlgorithm.")
+        cls.name = name
+        _REGISTRY[name] = cls
+        return cls
+
+    return decorator
+
+
+def _import_path(path: str, reload: bool = False) -> type:
+    """
+    Import a class from a "module:Class" path, optionally reloading the
+    module so that new code on disk is picked up.
+    """
+    module_name, _, class_name = path.partition(":")
+    module = importlib.import_module(module_name)
+    if reload:
+        module = importlib.reload(module)
+    return getattr(module, class_name)
+
+
+def get_algorithm_class(name: str, reload: bool = False) -> type:
+    """
+    Return the algorithm class for `name`. The name is looked up in the
+    in-process registry, the built-in algorithms and the entry points, in
+    that order, and may also be a "module:Class" path. With `reload`, the
+    module is re-imported to load a new version of the algorithm.
+    """
+    if name in _REGISTRY:
+        cls = _REGISTRY[name]
+        if reload:
+            cls = _import_path(f"{cls.__module__}:{cls.__qualname__}", reload)
+        return cls
+
+    if name in BUILTIN_ALGORITHMS:
+        return _import_path(BUILTIN_ALGORITHMS[name], reload)
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name == name:
+            return _import_path(entry_point.value, reload)
+
+    if ":" in name:
+        return _import_path(name, reload)
+
+    raise KeyError(f"Unknown algorithm: {name}")
+
+
+def algorithm_seed(config, *keys) -> int:
+    """
+    Return the seed of a new algorithm instance. Without a configured
+    RL_ALGORITHM_SEED this is None, so every instance draws fresh entropy.
+    A configured seed is combined with `keys`, such as the role of the
+    instance and its swap generation, so the primary, shadow, study and
+    swapped-in algorithms are reproducible without sharing one stream.
+    """
+    seed = config.get("RL_ALGORITHM_SEED")
+    if seed is None:
+        return None
+    key = [
+        zlib.crc32(str(k).encode()) if not isinstance(k, int) else k for k in keys
+    ]
+    return int(np.random.SeedSequence([seed, *key]).generate_state(1)[0])
+
+
+def create_algorithm(
+    name: str, seed: int = None, kwargs: dict = None, reload: bool = False
+) -> RLAlgorithm:
+    """
+    Create an instance of the algorithm registered under `name`.
+    """
+    cls = get_algorithm_class(name, reload)
+    algorithm = cls(seed=seed, **(kwargs or {}))
+    if getattr(algorithm, "name", None) is None:
+        algorithm.name = name
+    return algorithm
+
+
+def swap_algorithm(
+    app,
+    name: str,
+    kwargs: dict = None,
+    reload: bool = False,
+    parameters: dict = None,
+) -> RLAlgorithm:
+    """
+    Load the algorithm `name`, warm it up with the current action parameters
+    and atomically replace app.rl_algorithm. Requests read app.rl_algorithm
+    once, so in-flight requests finish with the old instance and no request
+    is dropped. The new algorithm must store states of the same dimension.
+    """
+    generation = getattr(app, "algorithm_generation", 0) + 1
+    algorithm = create_algorithm(
+        name, algorithm_seed(app.config, "primary", generation), kwargs, reload
+    )
+
+    if algorithm.state_dim != get_state_dim("state"):
+        raise ValueError(
+            f"{name} has state dimension {algorithm.state_dim}, but the stored "
+            f"states have dimension {get_state_dim('state')}."
+        )
+
+    if parameters is not None:
+        algorithm.warm_up(algorithm.action_parameters(parameters))
+
+    app.rl_algorithm = algorithm
+    app.algorithm_generation = generation
+    logging.info(f"[Algorithm] Swapped in {algorithm.version_string()}.")
+    return algorithm
+
+
+def swap_algorithm_in_background(
+    app, name: str, kwargs: dict = None, reload: bool = False, parameters: dict = None
+) -> Thread:
+    """
+    Run swap_algorithm in a background thread. The progress is recorded in
+    app.algorithm_swap_status.
+    """
+    app.algorithm_swap_status = {"status": "loading", "algorithm": name}
+
+    def run():
+        try:
+            algorithm = swap_algorithm(app, name, kwargs, reload, parameters)
+            app.algorithm_swap_status = {
+                "status": "completed",
+                "algorithm": algorithm.version_string(),
+            }
+        except Exception as e:
+            logging.error(f"[Algorithm] Swap to {name} failed: {e}")
+            logging.exception(e)
+            app.algorithm_swap_status = {
+                "status": "failed",
+                "algorithm": name,
+                "message": str(e),
+            }
+
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def initialize_algorithm(app) -> RLAlgorithm:
+    """
+    Create the algorithm selected by the RL_ALGORITHM config and register
+    its state dimension.
+    """
+    algorithm = create_algorithm(
+        app.config.get("RL_ALGORITHM", "flat_prob"),
+        algorithm_seed(app.config, "primary", 0),
+        app.config.get("RL_ALGORITHM_KWARGS"),
+    )
+    register_state_dim("state", algorithm.state_dim)
+    return algorithm
+
+
+def initialize_shadow_algorithm(app) -> RLAlgorithm:
+    """
+    Create the shadow algorithm selected by the SHADOW_ALGORITHM config, or
+    return None if there is none. It must store states of the same dimension
+    as the primary algorithm.
+    """
+    name = app.config.get("SHADOW_ALGORITHM")
+    if not name:
+        return None
+
+    algorithm = create_algorithm(
+        name,
+        algorithm_seed(app.config, "shadow"),
+        app.config.get("SHADOW_ALGORITHM_KWARGS"),
+    )
+    return algorithm
@@ -0,0 +1,328 @@
+import numpy as np
+from app.extensions import db
+from app.models import StudyData
+from app.column_types import STATE_DTYPE, decode_state_matrix, get_state_dim
+from app.json_provider import loads
+
+
+class JSONColumn:
+    """
+    A column of JSON values kept as their encoded text: one bytes buffer
+    holding every value and an array of offsets into it. Values are only
+    decoded when they are read.
+    """
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data: bytes, offsets: np.ndarray):
+        """
+        Initialize the column. Value i is data[offsets[i]:offsets[i + 1]].
+        """
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_texts(cls, texts) -> "JSONColumn":
+        """
+        Create a column from the JSON text of each value.
+        """
+        encoded = [text.encode() if isinstance(text, str) else text for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    @classmethod
+    def concatenate(cls, columns: list) -> "JSONColumn":
+        """
+        Join several columns into one.
+        """
+        if not columns:
+            return cls.from_texts([])
+        starts = np.cumsum([0] + [len(column.data) for column in columns[:-1]])
+        offsets = np.concatenate(
+            [columns[0].offsets[:1]]
+            + [column.offsets[1:] + start for column, start in zip(columns, starts)]
+        )
+        return cls(b"".join(column.data for column in columns), offsets)
+
+    def __len__(self) -> int:
+        """
+        Return the number of values.
+        """
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        """
+        Decode value `i`.
+        """
+        return loads(self.data[self.offsets[i] : self.offsets[i + 1]])
+
+    def __iter__(self):
+        """
+        Decode the values one at a time.
+        """
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, indices: np.ndarray) -> "JSONColumn":
+        """
+        Return a column of the values at `indices`, without decoding them.
+        """
+        starts = self.offsets[indices]
+        ends = self.offsets[np.asarray(indices) + 1]
+        offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+        np.cumsum(ends - starts, out=offsets[1:])
+        data = self.data
+        return JSONColumn(
+            b"".join(data[start:end] for start, end in zip(starts.tolist(), ends.tolist())),
+            offsets,
+        )
+
+    def field(self, name: str, dtype=np.float64) -> np.ndarray:
+        """
+        Return the `name` field of every value, which must be a dictionary,
+        as an array. Only one decoded value is held at a time.
+        """
+        return np.fromiter((value[name] for value in self), dtype=dtype, count=len(self))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Return the memory used by the buffer and the offsets.
+        """
+        return len(self.data) + self.offsets.nbytes
+
+
+class StudyBatch:
+    """
+    Study data rows as a struct of arrays: one NumPy array per column, an
+    (N, d) float32 state matrix and lazily decoded JSON columns. User ids
+    are stored once each, with an array of codes per row. Missing rewards
+    are NaN. A batch of a million rows takes tens of megabytes, where the
+    ORM objects take gigabytes.
+    """
+
+    __slots__ = (
+        "ids",
+        "users",
+        "user_codes",
+        "decision_idxs",
+        "actions",
+        "action_probs",
+        "rewards",
+        "states",
+        "raw_contexts",
+        "outcomes",
+    )
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        users: np.ndarray,
+        user_codes: np.ndarray,
+        decision_idxs: np.ndarray,
+        actions: np.ndarray,
+        action_probs: np.ndarray,
+        rewards: np.ndarray,
+        states: np.ndarray,
+        raw_contexts: JSONColumn,
+        outcomes: JSONColumn,
+    ):
+        """
+        Initialize the batch. Use from_rows or load_study_batch to build one
+        from the database.
+        """
+        self.ids = ids
+        self.users = users
+        self.user_codes = user_codes
+        self.decision_idxs = decision_idxs
+        self.actions = actions
+        self.action_probs = action_probs
+        self.rewards = rewards
+        self.states = states
+        self.raw_contexts = raw_contexts
+        self.outcomes = outcomes
+
+    @classmethod
+    def from_rows(cls, rows, state_dim: int = None) -> "StudyBatch":
+        """
+        Build a batch from rows of the columns of study_batch_select, in
+        that order.
+        """
+        rows = list(rows)
+        if not rows:
+            return cls.concatenate([], state_dim)
+
+        (
+            ids,
+            user_ids,
+            decision_idxs,
+            actions,
+            action_probs,
+            rewards,
+            blobs,
+            raw_contexts,
+            outcomes,
+        ) = zip(*rows)
+        users, user_codes = np.unique(np.array(user_ids), return_inverse=True)
+        return cls(
+            np.array(ids, dtype=np.int64),
+            users,
+            user_codes.astype(np.int32),
+            np.array(decision_idxs, dtype=np.int32),
+            np.array(actions, dtype=np.int32),
+            np.array(action_probs, dtype=np.float64),
+            np.array([np.nan if r is None else r for r in rewards], dtype=np.float64),
+            decode_state_matrix(blobs, state_dim),
+            JSONColumn.from_texts(raw_contexts),
+            JSONColumn.from_texts(outcomes),
+        )
+
+    @classmethod
+    def concatenate(cls, batches: list, state_dim: int = None) -> "StudyBatch":
+        """
+        Join several batches into one, re-coding the user ids.
+        """
+        if not batches:
+            return cls(
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=str),
+                np.empty(0, dtype=np.int32),
+                np.empty(0, dtype=np.int32),
+                np.empty(0, dtype=np.int32),
+                np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.float64),
+                np.empty((0, state_dim or 0), dtype=STATE_DTYPE),
+                JSONColumn.from_texts([]),
+                JSONColumn.from_texts([]),
+            )
+        if len(batches) == 1:
+            return batches[0]
+
+        users, codes = np.unique(
+            np.concatenate([batch.users for batch in batches]), return_inverse=True
+        )
+        user_codes = []
+        start = 0
+        for batch in batches:
+            user_codes.append(codes[start : start + len(batch.users)][batch.user_codes])
+            start += len(batch.users)
+
+        return cls(
+            np.concatenate([batch.ids for batch in batches]),
+            users,
+            np.concatenate(user_codes).astype(np.int32),
+            np.concatenate([batch.decision_idxs for batch in batches]),
+            np.concatenate([batch.actions for batch in batches]),
+            np.concatenate([batch.action_probs for batch in batches]),
+            np.concatenate([batch.rewards for batch in batches]),
+            np.concatenate([batch.states for batch in batches]),
+            JSONColumn.concatenate([batch.raw_contexts for batch in batches]),
+            JSONColumn.concatenate([batch.outcomes for batch in batches]),
+        )
+
+    def __len__(self) -> int:
+        """
+        Return the number of rows.
+        """
+        return len(self.ids)
+
+    def __repr__(self):
+        """
+        Return a string representation of the StudyBatch object.
+        """
+        return f"<StudyBatch rows={len(self)}, users={len(self.users)}, nbytes={self.nbytes}>"
+
+    def take(self, indices: np.ndarray) -> "StudyBatch":
+        """
+        Return a batch of the rows at `indices`, in that order. The user ids
+        are not re-coded, so users without rows are kept.
+        """
+        return StudyBatch(
+            self.ids[indices],
+            self.users,
+            self.user_codes[indices],
+            self.decision_idxs[indices],
+            self.actions[indices],
+            self.action_probs[indices],
+            self.rewards[indices],
+            self.states[indices],
+            self.raw_contexts.take(indices),
+            self.outcomes.take(indices),
+        )
+
+    @property
+    def user_ids(self) -> np.ndarray:
+        """
+        Return the user id of every row.
+        """
+        return self.users[self.user_codes]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Return the memory used by the arrays and the JSON buffers.
+        """
+        arrays = (
+            self.ids,
+            self.users,
+            self.user_codes,
+            self.decision_idxs,
+            self.actions,
+            self.action_probs,
+            self.rewards,
+            self.states,
+        )
+        return (
+            sum(array.nbytes for array in arrays)
+            + self.raw_contexts.nbytes
+            + self.outcomes.nbytes
+        )
+
+
+def study_batch_select():
+    """
+    Return the select of the study data columns of a StudyBatch. States are
+    selected as raw blobs and JSON columns as text, so neither is decoded
+    per row.
+    """
+    return db.select(
+        StudyData.id,
+        StudyData.user_id,
+        StudyData.decision_idx,
+        StudyData.action,
+        StudyData.action_prob,
+        StudyData.reward,
+        db.type_coerce(StudyData.state, db.LargeBinary),
+        db.cast(StudyData.raw_context, db.Text),
+        db.cast(StudyData.outcome, db.Text),
+    ).order_by(StudyData.id)
+
+
+def load_study_batch(
+    max_id: int = None,
+    chunk_size: int = 10000,
+    after_id: int = None,
+    pending_only: bool = False,
+) -> StudyBatch:
+    """
+    Load the study data, up to id `max_id` and after id `after_id` if
+    given, and only the rows no update has consumed yet with
+    `pending_only`, as a StudyBatch. The rows are fetched and converted
+    `chunk_size` at a time, so at most one chunk of Python row objects is
+    held at once. Must be called inside an app context.
+    """
+    query = study_batch_select()
+    if max_id is not None:
+        query = query.where(StudyData.id <= max_id)
+    if after_id is not None:
+        query = query.where(StudyData.id > after_id)
+    if pending_only:
+        query = query.where(StudyData.consumed_by.is_(None))
+
+    state_dim = get_state_dim("state")
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    return StudyBatch.concatenate(
+        [StudyBatch.from_rows(rows, state_dim) for rows in result.partitions()],
+        state_dim,
+    )
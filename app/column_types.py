@@ -0,0 +1,110 @@
+import datetime
+import numpy as np
+from app.extensions import db
+
+# States are stored as little-endian float32 so the encoding is identical on
+# every database backend and platform.
+STATE_DTYPE = np.dtype("<f4")
+
+# Registry of the fixed state dimension for each state column. The key is the
+# name passed to StateVector, e.g. "state". A dimension of None means that the
+# width is not enforced and is inferred when decoding.
+_STATE_DIMS = {}
+
+
+def register_state_dim(name: str, dim: int):
+    """
+    Register the fixed dimension of the state vectors stored under `name`.
+    """
+    if dim is not None and dim < 1:
+        raise ValueError(f"State dimension must be positive, got {dim}.")
+    _STATE_DIMS[name] = dim
+
+
+def get_state_dim(name: str):
+    """
+    Return the registered state dimension for `name`, or None if not set.
+    """
+    return _STATE_DIMS.get(name)
+
+
+def encode_state(state, dim: int = None) -> bytes:
+    """
+    Encode a state vector as a fixed-width float32 binary blob.
+    """
+    array = np.asarray(state, dtype=STATE_DTYPE).ravel()
+    if dim is not None and array.size != dim:
+        raise ValueError(
+            f"State has dimension {array.size}, expected {dim}."
+        )
+    return array.tobytes()
+
+
+def decode_state(blob: bytes) -> np.ndarray:
+    """
+    Decode a single binary blob into a 1-D float32 array.
+    """
+    return np.frombuffer(blob, dtype=STATE_DTYPE)
+
+
+def decode_state_matrix(blobs, dim: int = None) -> np.ndarray:
+    """
+    Decode a sequence of state blobs into an (N, d) float32 matrix.
+    All blobs are joined and decoded with a single np.frombuffer call, so
+    there is no per-row parsing.
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return np.empty((0, dim or 0), dtype=STATE_DTYPE)
+
+    if dim is None:
+        dim = len(blobs[0]) // STATE_DTYPE.itemsize
+
+    matrix = np.frombuffer(b"".join(blobs), dtype=STATE_DTYPE)
+    if matrix.size != len(blobs) * dim:
+        raise ValueError(f"State blobs do not all have dimension {dim}.")
+    return matrix.reshape(len(blobs), dim)
+
+
+class StateVector(db.TypeDecorator):
+    """
+    Column type storing a state vector as a float32 binary blob.
+    Works on any backend with a binary type (BYTEA on PostgreSQL, BLOB on
+    SQLite) and uses 4 bytes per dimension. Values are returned as lists.
+    """
+
+    impl = db.LargeBinary
+    cache_ok = True
+
+    def __init__(self, name: str = "state", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_state(value, get_state_dim(self.name))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode_state(value).tolist()
+
+
+class Timestamp(db.TypeDecorator):
+    """
+    DateTime column that also accepts ISO 8601 strings.
+    PostgreSQL parses strings itself, but SQLite only accepts datetime
+    objects, so strings are parsed here. Like a PostgreSQL timestamp without
+    time zone, any UTC offset in the string is dropped.
+    """
+
+    impl = db.DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            value = datetime.datetime.fromisoformat(value)
+        if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+            value = value.replace(tzinfo=None)
+        return value
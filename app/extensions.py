@@ -1,6 +1,38 @@
+from contextvars import ContextVar
+from flask.globals import app_ctx
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_migrate import Migrate
 
+# The study served by the current request or background job, or None for the
+# default study. Set by app.studies.
+current_study = ContextVar("current_study", default=None)
+
+
+def session_scope():
+    """
+    Scope database sessions to the app context and the current study, so
+    the rows of two studies never share an identity map.
+    """
+    return id(app_ctx._get_current_object()), current_study.get()
+
+
+class StudySession(Session):
+    """
+    A session that runs the queries of a study on the study's engine, which
+    has its own database or translates the tables to its own schema.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        """
+        Return the engine of the current study, if it has one.
+        """
+        study = current_study.get()
+        if bind is None and study is not None and study.engine is not None:
+            return study.engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
 # Initialize Flask extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": StudySession, "scopefunc": session_scope})
 migrate = Migrate()
@@ -0,0 +1,179 @@
+import threading
+from collections import OrderedDict
+from app.models import Action
+
+
+class IdempotencyConflict(Exception):
+    """
+    Raised when a request reuses a decision slot or an Idempotency-Key of a
+    different request. `status_code` is 409 for a slot that already has an
+    action under another key, and 422 for a key sent with another slot or
+    context.
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ActionCache:
+    """
+    Thread-safe LRU cache of action responses, keyed by (user_id,
+    decision_idx).
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """
+        Initialize an empty cache holding at most `max_size` responses.
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Return the cached response for `key`, or None.
+        """
+        with self._lock:
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key, response: dict):
+        """
+        Cache the response for `key`, evicting the least recently used one
+        if the cache is full.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """
+        Remove the response for `key`, if cached.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        Return the cache size and hit counters.
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def action_cache_key(user_id: str, decision_idx: int):
+    """
+    Return the cache key of an action request. Requests are always
+    deduplicated on their decision slot.
+    """
+    return (user_id, decision_idx)
+
+
+def cache_entry(response: dict, idempotency_key: str = None, context: dict = None) -> dict:
+    """
+    Build the cache entry of an action, holding its response along with the
+    Idempotency-Key and context of the request, which retries must match.
+    """
+    return {"response": response, "idempotency_key": idempotency_key, "context": context}
+
+
+def action_response(
+    user_id: str, state: list, action: int, action_prob: float, timestamp: str
+) -> dict:
+    """
+    Build the response body of an action request.
+    """
+    return {
+        "status": "success",
+        "user_id": user_id,
+        "state": state,
+        "action": action,
+        "action_prob": action_prob,
+        "timestamp": timestamp,
+    }
+
+
+def check_retry(entry: dict, decision_idx: int, idempotency_key: str, context: dict):
+    """
+    Raise IdempotencyConflict if a request with an Idempotency-Key does not
+    match the earlier request of its slot. Requests without a key replay
+    the stored action of the slot.
+    """
+    if not idempotency_key:
+        return
+    if entry["idempotency_key"] != idempotency_key:
+        raise IdempotencyConflict(
+            f"Decision {decision_idx} already has an action for another Idempotency-Key.",
+            409,
+        )
+    if context is not None and entry["context"] != context:
+        raise IdempotencyConflict(
+            "Idempotency-Key was already used with a different context.", 422
+        )
+
+
+def find_previous_action(
+    cache: ActionCache,
+    user_id: str,
+    decision_idx: int,
+    idempotency_key: str = None,
+    context: dict = None,
+) -> dict:
+    """
+    Return the response of an earlier request for the same decision slot,
+    from the cache or, failing that, from the actions table. Return None if
+    this is the first request. The Idempotency-Key, if any, is checked
+    against the earlier request, see check_retry, and must not have been
+    used for another slot. Must be called inside an app context.
+    """
+    key = action_cache_key(user_id, decision_idx)
+    entry = cache.get(key)
+    if entry is None:
+        previous = (
+            Action.query.filter_by(user_id=user_id, decision_idx=decision_idx)
+            .order_by(Action.id)
+            .first()
+        )
+        if previous:
+            timestamp = previous.timestamp
+            entry = cache_entry(
+                action_response(
+                    previous.user_id,
+                    previous.state,
+                    previous.action,
+                    previous.action_prob,
+                    timestamp.isoformat() if hasattr(timestamp, "isoformat") else timestamp,
+                ),
+                previous.idempotency_key,
+                previous.raw_context,
+            )
+            cache.put(key, entry)
+
+    if entry is not None:
+        check_retry(entry, decision_idx, idempotency_key, context)
+        return entry["response"]
+
+    # A new slot, so a key that was already used belongs to another slot
+    if idempotency_key and Action.query.filter_by(
+        user_id=user_id, idempotency_key=idempotency_key
+    ).first():
+        raise IdempotencyConflict(
+            "Idempotency-Key was already used for another decision.", 422
+        )
+    return None
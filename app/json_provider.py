@@ -0,0 +1,118 @@
+import datetime
+import json
+import re
+import numpy as np
+from flask.json.provider import JSONProvider
+
+# orjson is optional. Without it, the standard library json module is used.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+)
+
+# orjson parses integers wider than 64 bits as floats. Documents that may
+# contain one, such as NumPy bit generator states, are parsed by json instead.
+WIDE_INTEGER = re.compile(rb"\d{19}")
+
+
+def default(obj):
+    """
+    Convert the objects that json cannot serialize natively: NumPy scalars
+    and arrays, and dates.
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def is_bit_generator_state(obj) -> bool:
+    """
+    Return whether `obj` is the state of a NumPy bit generator, such as the
+    random_state of an action. PCG64 states hold 128-bit integers, which
+    orjson cannot serialize.
+    """
+    return isinstance(obj, dict) and "bit_generator" in obj
+
+
+def dumps_bytes(obj, sort_keys: bool = False) -> bytes:
+    """
+    Serialize `obj` to UTF-8 encoded JSON with orjson. Bit generator states
+    go straight to the standard library, which also serializes any other
+    value orjson rejects, such as integers wider than 64 bits.
+    """
+    if orjson is not None and not is_bit_generator_state(obj):
+        option = ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            pass
+    return json.dumps(
+        obj, default=default, sort_keys=sort_keys, ensure_ascii=False
+    ).encode("utf-8")
+
+
+def dumps(obj, sort_keys: bool = False) -> str:
+    """
+    Serialize `obj` to a JSON string. Used as SQLAlchemy's json_serializer.
+    """
+    return dumps_bytes(obj, sort_keys).decode("utf-8")
+
+
+def loads(s):
+    """
+    Deserialize a JSON string or bytes. Used as SQLAlchemy's json_deserializer.
+    """
+    if orjson is not None:
+        data = s.encode("utf-8") if isinstance(s, str) else s
+        if not WIDE_INTEGER.search(data):
+            return orjson.loads(data)
+    return json.loads(s)
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson, with support for NumPy scalars and
+    arrays and dates. Falls back to the standard library json module when
+    orjson is not installed.
+    """
+
+    # Sort the keys of responses, like Flask's default provider
+    sort_keys = True
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs) -> str:
+        """
+        Serialize data as JSON. Extra json.dumps arguments, such as indent,
+        are handled by the standard library.
+        """
+        sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+        if kwargs:
+            kwargs.setdefault("default", default)
+            return json.dumps(obj, sort_keys=sort_keys, **kwargs)
+        return dumps(obj, sort_keys)
+
+    def loads(self, s, **kwargs):
+        """
+        Deserialize data as JSON.
+        """
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        """
+        Serialize the arguments as JSON and return a response, without
+        decoding the serialized bytes to a string first.
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            dumps_bytes(obj, self.sort_keys), mimetype=self.mimetype
+        )
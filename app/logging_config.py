@@ -1,46 +1,132 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def setup_logging():
+# Records waiting for the logging thread before new ones wait, or are
+# dropped with LOG_DROP_WHEN_FULL
+LOG_QUEUE_SIZE = 10000
+
+# The handler of the root logger, once logging is set up
+log_queue_handler = None
+
+
+class BackgroundQueueHandler(QueueHandler):
     """
-    Configures the logging for the Flask application.
+    Hands log records to the logging thread, which writes them to the
+    file and the console, so requests do not wait on log output. When the
+    queue is full, logging waits for room, so no record is lost, unless
+    `drop_when_full` is set, in which case records are dropped and counted.
     """
+
+    def __init__(self, log_queue: queue.Queue, *handlers):
+        """
+        Initialize the handler and start the logging thread, which writes
+        the records to `handlers`.
+        """
+        super().__init__(log_queue)
+        self.drop_when_full = False
+        self.dropped = 0
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.start()
+
+    def start(self):
+        """
+        Start the logging thread of this process.
+        """
+        self.pid = os.getpid()
+        self.listener.start()
+
+    def enqueue(self, record):
+        """
+        Queue the record, waiting for room if the queue is full unless
+        records are dropped.
+        """
+        # The logging thread does not survive a fork, so restart it in the
+        # worker after a pre-fork initialization
+        if self.pid != os.getpid():
+            self.start()
+        if not self.drop_when_full:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def logging_stats() -> dict:
+    """
+    Return the length of the logging queue and the number of dropped
+    records, or None if logging is not set up.
+    """
+    if log_queue_handler is None:
+        return None
+    return {
+        "queued": log_queue_handler.queue.qsize(),
+        "capacity": log_queue_handler.queue.maxsize,
+        "drop_when_full": log_queue_handler.drop_when_full,
+        "dropped": log_queue_handler.dropped,
+    }
+
+
+def setup_logging(drop_when_full: bool = False):
+    """
+    Configures the logging for the Flask application. With
+    `drop_when_full`, records are dropped instead of waiting when the
+    logging thread falls behind.
+    """
+    global log_queue_handler
     # Ensure the logs directory exists
     log_dir = "logs"
     os.makedirs(log_dir, exist_ok=True)
 
-    # Set up rotating file handler
-    log_file = os.path.join(log_dir, "app.log")
-    handler = RotatingFileHandler(log_file, maxBytes=100 * 1024 * 1024, backupCount=5000)  # 100 MB per file
-    handler.setLevel(logging.INFO)
-    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-    handler.setFormatter(formatter)
-
-    # Set up logging configuration
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[
+    # Set up logging configuration. Records are written by a background
+    # thread, which writes out the queued records when the process exits.
+    if log_queue_handler is None:
+        # Set up rotating file handler
+        log_file = os.path.join(log_dir, "app.log")
+        handler = RotatingFileHandler(log_file, maxBytes=100 * 1024 * 1024, backupCount=5000)  # 100 MB per file
+        handler.setLevel(logging.INFO)
+        formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+        handler.setFormatter(formatter)
+
+        log_queue_handler = BackgroundQueueHandler(
+            queue.Queue(LOG_QUEUE_SIZE),
             handler,              # Log to file in logs directory
-            logging.StreamHandler()  # Log to console
-        ]
-    )
+            logging.StreamHandler(),  # Log to console
+        )
+        atexit.register(log_queue_handler.listener.stop)
+    log_queue_handler.drop_when_full = drop_when_full
+
+    logging.basicConfig(level=logging.INFO, handlers=[log_queue_handler])
 
-def get_rl_logger():
+def get_rl_logger(quiet: bool = False):
     """
     Returns a logger for the RL Algorithm with a dedicated file handler.
+    The handler is attached on the first call only. With `quiet`, returns a
+    child logger that only passes on warnings and errors, for callers such
+    as simulations that run many decisions.
     """
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
+    rl_logger = logging.getLogger("RLAlgorithm")
+    if not any(getattr(handler, "rl_handler", False) for handler in rl_logger.handlers):
+        log_dir = "logs"
+        os.makedirs(log_dir, exist_ok=True)
 
-    rl_log_file = os.path.join(log_dir, "rl.log")
-    rl_handler = RotatingFileHandler(rl_log_file, maxBytes=100 * 1024 * 1024, backupCount=5000)  # 100 MB per file
-    rl_handler.setLevel(logging.INFO)
-    rl_formatter = logging.Formatter("%(asctime)s [%(levelname)s] [RL] %(message)s")
-    rl_handler.setFormatter(rl_formatter)
+        rl_log_file = os.path.join(log_dir, "rl.log")
+        rl_handler = RotatingFileHandler(rl_log_file, maxBytes=100 * 1024 * 1024, backupCount=5000)  # 100 MB per file
+        rl_handler.setLevel(logging.INFO)
+        rl_formatter = logging.Formatter("%(asctime)s [%(levelname)s] [RL] %(message)s")
+        rl_handler.setFormatter(rl_formatter)
+        rl_handler.rl_handler = True
 
-    rl_logger = logging.getLogger("RLAlgorithm")
-    rl_logger.setLevel(logging.INFO)
-    rl_logger.addHandler(rl_handler)
+        rl_logger.setLevel(logging.INFO)
+        rl_logger.addHandler(rl_handler)
+
+    if quiet:
+        quiet_logger = rl_logger.getChild("quiet")
+        quiet_logger.setLevel(logging.WARNING)
+        return quiet_logger
 
-    return rl_logger
\ No newline at end of file
+    return rl_logger
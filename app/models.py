@@ -1,4 +1,5 @@
 from app.extensions import db
+from app.column_types import StateVector, Timestamp
 import datetime
 
 
@@ -11,7 +12,7 @@ class User(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.String(255), unique=True, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(Timestamp, nullable=False)
 
     def __init__(
         self,
@@ -37,10 +38,18 @@ class Action(db.Model):
     """
 
     __tablename__ = "actions"
+    __table_args__ = (
+        # One action per decision slot, so concurrent retries cannot both
+        # insert one
+        db.UniqueConstraint(
+            "user_id", "decision_idx", name="uq_actions_user_id_decision_idx"
+        ),
+        db.Index("ix_actions_user_id_idempotency_key", "user_id", "idempotency_key"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.String(255), nullable=False)
-    state = db.Column(db.JSON, nullable=True)
+    state = db.Column(StateVector("state"), nullable=True)
     decision_idx = db.Column(db.Integer, nullable=False)
     raw_context = db.Column(db.JSON, nullable=False)
     action = db.Column(db.Integer, nullable=False)
@@ -49,14 +58,16 @@ class Action(db.Model):
     model_parameters_id = db.Column(
         db.Integer, db.ForeignKey("model_parameters.id"), nullable=False
     )
-    request_timestamp = db.Column(db.DateTime, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False)
+    algorithm_version = db.Column(db.String(255), nullable=True)
+    idempotency_key = db.Column(db.String(255), nullable=True)
+    request_timestamp = db.Column(Timestamp, nullable=False)
+    timestamp = db.Column(Timestamp, nullable=False)
 
     def __init__(
         self,
         user_id: str,
         action: int,
-        state: dict,
+        state: list,
         decision_idx: int,
         raw_context: dict,
         action_prob: float,
@@ -64,6 +75,8 @@ class Action(db.Model):
         model_parameters_id: int,
         request_timestamp: datetime.datetime,
         timestamp: datetime.datetime = datetime.datetime.now().isoformat(),
+        algorithm_version: str = None,
+        idempotency_key: str = None,
     ):
         """
         Initialize the Action object.
@@ -76,6 +89,8 @@ class Action(db.Model):
         self.action_prob = action_prob
         self.random_state = random_state
         self.model_parameters_id = model_parameters_id
+        self.algorithm_version = algorithm_version
+        self.idempotency_key = idempotency_key
         self.request_timestamp = request_timestamp
         self.timestamp = timestamp
 
@@ -97,17 +112,22 @@ class ModelParameters(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     probability_of_action = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False)
+    # Highest study data id included in the update that produced these
+    # parameters, used to skip updates when no new data has arrived
+    data_watermark = db.Column(db.Integer, nullable=True)
+    timestamp = db.Column(Timestamp, nullable=False)
 
     def __init__(
         self,
         probability_of_action: float,
         timestamp: datetime.datetime = datetime.datetime.now().isoformat(),
+        data_watermark: int = None,
     ):
         """
         Initialize the ModelParameters object.
         """
         self.probability_of_action = probability_of_action
+        self.data_watermark = data_watermark
         self.timestamp = timestamp
 
     def __repr__(self):
@@ -128,10 +148,12 @@ class ModelUpdateRequests(db.Model):
     update_id = db.Column(db.String(255), nullable=False)
     status = db.Column(db.String(50), nullable=False)
     callback_url = db.Column(db.String(1024), nullable=False)
-    request_timestamp = db.Column(db.DateTime, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False)
-    completed_at = db.Column(db.DateTime, nullable=True)
+    request_timestamp = db.Column(Timestamp, nullable=False)
+    created_at = db.Column(Timestamp, nullable=False)
+    completed_at = db.Column(Timestamp, nullable=True)
     error_message = db.Column(db.String(1024), nullable=True)
+    # What triggered the update: "request", "schedule" or "data_threshold"
+    trigger_reason = db.Column(db.String(50), nullable=True)
 
     def __init__(
         self,
@@ -140,6 +162,7 @@ class ModelUpdateRequests(db.Model):
         request_timestamp: datetime.datetime,
         status: str = "processing",
         created_at: datetime.datetime = datetime.datetime.now().isoformat(),
+        trigger_reason: str = "request",
     ):
         """
         Initialize the ModelUpdateRequests object.
@@ -149,6 +172,7 @@ class ModelUpdateRequests(db.Model):
         self.request_timestamp = request_timestamp
         self.status = status
         self.created_at = created_at
+        self.trigger_reason = trigger_reason
 
     def __repr__(self):
         """
@@ -169,12 +193,25 @@ class StudyData(db.Model):
     decision_idx = db.Column(db.Integer, nullable=False)
     action = db.Column(db.Integer, nullable=False)
     action_prob = db.Column(db.Float, nullable=False)
-    state = db.Column(db.ARRAY(db.Float), nullable=False)
+    state = db.Column(StateVector("state"), nullable=False)
     raw_context = db.Column(db.JSON, nullable=False)
     outcome = db.Column(db.JSON, nullable=False)
     reward = db.Column(db.Float, nullable=True)
-    request_timestamp = db.Column(db.DateTime, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False)
+    request_timestamp = db.Column(Timestamp, nullable=False)
+    created_at = db.Column(Timestamp, nullable=False)
+    # Model parameters of the update that first read the row, or None while
+    # no update has. Updates find the new rows by this column rather than by
+    # id, since rows can commit in a different order than they took their ids.
+    consumed_by = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.Index(
+            "ix_study_data_pending",
+            "id",
+            postgresql_where=db.text("consumed_by IS NULL"),
+            sqlite_where=db.text("consumed_by IS NULL"),
+        ),
+    )
 
     def __init__(
         self,
@@ -208,3 +245,108 @@ class StudyData(db.Model):
         Return a string representation of the StudyData object.
         """
         return f"<StudyData user_id={self.user_id}, raw_context={self.raw_context}, action={self.action}, reward={self.reward}>"
+
+
+class PrecomputedAction(db.Model):
+    """
+    Database table to store actions generated ahead of time for upcoming
+    decision points. A row is consumed by the first action request for its
+    (user_id, decision_idx) slot.
+    """
+
+    __tablename__ = "precomputed_actions"
+    __table_args__ = (db.UniqueConstraint("user_id", "decision_idx"),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(255), nullable=False)
+    decision_idx = db.Column(db.Integer, nullable=False)
+    state = db.Column(StateVector("state"), nullable=True)
+    action = db.Column(db.Integer, nullable=False)
+    action_prob = db.Column(db.Float, nullable=False)
+    random_state = db.Column(db.JSON, nullable=False)
+    model_parameters_id = db.Column(
+        db.Integer, db.ForeignKey("model_parameters.id"), nullable=False
+    )
+    algorithm_version = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(Timestamp, nullable=False)
+
+    def __init__(
+        self,
+        user_id: str,
+        decision_idx: int,
+        action: int,
+        action_prob: float,
+        random_state: dict,
+        model_parameters_id: int,
+        state: list = None,
+        algorithm_version: str = None,
+        created_at: datetime.datetime = datetime.datetime.now().isoformat(),
+    ):
+        """
+        Initialize the PrecomputedAction object.
+        """
+        self.user_id = user_id
+        self.decision_idx = decision_idx
+        self.state = state
+        self.action = action
+        self.action_prob = action_prob
+        self.random_state = random_state
+        self.model_parameters_id = model_parameters_id
+        self.algorithm_version = algorithm_version
+        self.created_at = created_at
+
+    def __repr__(self):
+        """
+        Return a string representation of the PrecomputedAction object.
+        """
+        return f"<PrecomputedAction user_id={self.user_id}, decision_idx={self.decision_idx}, action={self.action}>"
+
+
+class ShadowAction(db.Model):
+    """
+    Database table to store the decisions of a shadow algorithm, which is
+    evaluated on live requests without its actions being sent.
+    """
+
+    __tablename__ = "shadow_actions"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(255), nullable=False)
+    decision_idx = db.Column(db.Integer, nullable=False)
+    algorithm_version = db.Column(db.String(255), nullable=False)
+    action = db.Column(db.SmallInteger, nullable=False)
+    action_prob = db.Column(db.Float, nullable=False)
+    primary_action = db.Column(db.SmallInteger, nullable=False)
+    model_parameters_id = db.Column(
+        db.Integer, db.ForeignKey("model_parameters.id"), nullable=False
+    )
+    created_at = db.Column(Timestamp, nullable=False)
+
+    def __init__(
+        self,
+        user_id: str,
+        decision_idx: int,
+        algorithm_version: str,
+        action: int,
+        action_prob: float,
+        primary_action: int,
+        model_parameters_id: int,
+        created_at: datetime.datetime = datetime.datetime.now().isoformat(),
+    ):
+        """
+        Initialize the ShadowAction object.
+        """
+        self.user_id = user_id
+        self.decision_idx = decision_idx
+        self.algorithm_version = algorithm_version
+        self.action = action
+        self.action_prob = action_prob
+        self.primary_action = primary_action
+        self.model_parameters_id = model_parameters_id
+        self.created_at = created_at
+
+    def __repr__(self):
+        """
+        Return a string representation of the ShadowAction object.
+        """
+        return f"<ShadowAction user_id={self.user_id}, algorithm_version={self.algorithm_version}, action={self.action}>"
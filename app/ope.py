@@ -0,0 +1,248 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from app.extensions import db
+from app.models import StudyData
+from app.column_types import decode_state_matrix, get_state_dim
+from app.algorithms.base import RLAlgorithm
+
+# Sums accumulated per chunk, in the order used by the bootstrap
+SUM_NAMES = ("n", "weighted_reward", "weight", "doubly_robust", "reward")
+
+
+def iter_study_data_chunks(chunk_size: int = 10000):
+    """
+    Stream the logged decisions with a reward from the study data table as
+    column arrays, `chunk_size` rows at a time. Uses keyset pagination on
+    the id, so memory stays bounded and no server-side cursor is needed.
+    Must be called inside an app context.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(
+                StudyData.id,
+                StudyData.user_id,
+                StudyData.decision_idx,
+                StudyData.action,
+                StudyData.action_prob,
+                StudyData.reward,
+                db.type_coerce(StudyData.state, db.LargeBinary),
+            )
+            .where(StudyData.id > last_id, StudyData.reward.is_not(None))
+            .order_by(StudyData.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+
+        ids, user_ids, decision_idxs, actions, action_probs, rewards, blobs = zip(
+            *rows
+        )
+        last_id = ids[-1]
+
+        yield {
+            "user_id": np.array(user_ids),
+            "decision_idx": np.array(decision_idxs, dtype=np.int64),
+            "action": np.array(actions, dtype=np.int64),
+            "action_prob": np.array(action_probs, dtype=np.float64),
+            "reward": np.array(rewards, dtype=np.float64),
+            "state": decode_state_matrix(blobs, get_state_dim("state")).astype(
+                np.float64
+            ),
+        }
+
+
+def _features(states: np.ndarray) -> np.ndarray:
+    """
+    Return the reward model features: an intercept and the state.
+    """
+    return np.column_stack([np.ones(len(states)), states])
+
+
+class RewardModel:
+    """
+    Ridge regression of the reward on the state, fitted separately for each
+    action from streamed sufficient statistics. Used as the outcome model of
+    the doubly robust estimator.
+    """
+
+    def __init__(self, dim: int, ridge: float = 1.0):
+        """
+        Initialize the sufficient statistics for states of dimension `dim`.
+        """
+        self.ridge = ridge
+        self.xtx = np.zeros((2, dim + 1, dim + 1))
+        self.xty = np.zeros((2, dim + 1))
+        self.coef = None
+
+    def partial_fit(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray):
+        """
+        Add a chunk of logged decisions to the sufficient statistics.
+        """
+        x = _features(states)
+        for action in (0, 1):
+            mask = actions == action
+            self.xtx[action] += x[mask].T @ x[mask]
+            self.xty[action] += x[mask].T @ rewards[mask]
+
+    def fit(self):
+        """
+        Solve for the coefficients of both actions.
+        """
+        penalty = self.ridge * np.eye(self.xtx.shape[1])
+        self.coef = np.stack(
+            [np.linalg.solve(self.xtx[a] + penalty, self.xty[a]) for a in (0, 1)]
+        )
+        return self
+
+    def predict(self, states: np.ndarray) -> np.ndarray:
+        """
+        Return the predicted rewards of both actions as an (N, 2) matrix.
+        """
+        return _features(states) @ self.coef.T
+
+
+def chunk_terms(
+    chunk: dict,
+    target_prob: np.ndarray,
+    reward_model: RewardModel,
+    min_prob: float = 1e-6,
+) -> np.ndarray:
+    """
+    Return the per-row terms of the estimators as a (len(SUM_NAMES), N)
+    matrix: ones, importance-weighted rewards, importance weights, doubly
+    robust terms and rewards. `target_prob` is the probability that the
+    evaluated policy takes action 1.
+    """
+    action = chunk["action"]
+    reward = chunk["reward"]
+
+    # Probabilities of the logged action under the target and behavior
+    # policies. The logged action_prob is the probability of action 1.
+    behavior_prob = chunk["action_prob"]
+    behavior = np.clip(
+        np.where(action == 1, behavior_prob, 1.0 - behavior_prob), min_prob, 1.0
+    )
+    target = np.where(action == 1, target_prob, 1.0 - target_prob)
+    weight = target / behavior
+
+    predicted = reward_model.predict(chunk["state"])
+    predicted_logged = predicted[np.arange(len(action)), action]
+    direct = (1.0 - target_prob) * predicted[:, 0] + target_prob * predicted[:, 1]
+    doubly_robust = direct + weight * (reward - predicted_logged)
+
+    return np.stack(
+        [np.ones(len(action)), weight * reward, weight, doubly_robust, reward]
+    )
+
+
+def bootstrap_sums(terms: np.ndarray, n_bootstrap: int, seed: tuple) -> np.ndarray:
+    """
+    Return the Poisson bootstrap sums of the terms of one chunk as a
+    (n_bootstrap, len(SUM_NAMES)) matrix. Each row of the data gets a
+    Poisson(1) weight per replicate, so chunks can be resampled
+    independently. The seed identifies the chunk, which makes the result
+    independent of the process that computes it.
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(1.0, size=(n_bootstrap, terms.shape[1]))
+    return counts @ terms.T
+
+
+def estimates(sums: np.ndarray) -> dict:
+    """
+    Compute the estimates from the accumulated sums.
+    """
+    n, weighted_reward, weight, doubly_robust, reward = sums
+    return {
+        "ipw": weighted_reward / n,
+        "snipw": weighted_reward / weight,
+        "dr": doubly_robust / n,
+        "behavior": reward / n,
+    }
+
+
+def evaluate_policy(
+    algorithm: RLAlgorithm,
+    parameters: dict,
+    chunk_size: int = 10000,
+    n_bootstrap: int = 200,
+    processes: int = 1,
+    seed: int = 0,
+    alpha: float = 0.05,
+    ridge: float = 1.0,
+) -> dict:
+    """
+    Estimate the value of the algorithm's policy from the logged study data
+    with IPW, self-normalized IPW and doubly robust estimators, along with
+    percentile bootstrap confidence intervals at level 1 - alpha.
+    `parameters` are the action parameters of the evaluated policy.
+
+    The data is streamed twice in chunks: once to fit the reward model and
+    once to accumulate the estimator sums. Bootstrap replicates of each chunk
+    run across a process pool with at most 2 * processes chunks in flight,
+    so memory stays bounded. Must be called inside an app context.
+    """
+    # First pass: fit the reward model for the doubly robust estimator
+    reward_model = None
+    for chunk in iter_study_data_chunks(chunk_size):
+        if reward_model is None:
+            reward_model = RewardModel(chunk["state"].shape[1], ridge)
+        reward_model.partial_fit(chunk["state"], chunk["action"], chunk["reward"])
+
+    if reward_model is None:
+        raise ValueError("There is no study data with rewards to evaluate.")
+    reward_model.fit()
+
+    # Second pass: accumulate the estimator sums and the bootstrap sums
+    totals = np.zeros(len(SUM_NAMES))
+    bootstrap_totals = np.zeros((n_bootstrap, len(SUM_NAMES)))
+
+    # Workers are spawned rather than forked, as in the map-reduce updates,
+    # since the API process runs other threads
+    executor = (
+        ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        if processes > 1
+        else None
+    )
+    pending = []
+    try:
+        for chunk_idx, chunk in enumerate(iter_study_data_chunks(chunk_size)):
+            target_prob = np.asarray(
+                algorithm.action_probabilities(
+                    chunk["user_id"], chunk["state"], parameters, chunk["decision_idx"]
+                ),
+                dtype=np.float64,
+            )
+            terms = chunk_terms(chunk, target_prob, reward_model)
+            totals += terms.sum(axis=1)
+
+            if executor is None:
+                bootstrap_totals += bootstrap_sums(terms, n_bootstrap, (seed, chunk_idx))
+                continue
+
+            pending.append(
+                executor.submit(bootstrap_sums, terms, n_bootstrap, (seed, chunk_idx))
+            )
+            if len(pending) >= 2 * processes:
+                bootstrap_totals += pending.pop(0).result()
+
+        for future in pending:
+            bootstrap_totals += future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    point = estimates(totals)
+    replicates = estimates(bootstrap_totals.T)
+    result = {"n": int(totals[0])}
+    for name, value in point.items():
+        lower, upper = np.nanquantile(replicates[name], [alpha / 2, 1 - alpha / 2])
+        result[name] = {
+            "estimate": float(value),
+            "ci": [float(lower), float(upper)],
+        }
+    return result
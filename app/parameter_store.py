@@ -0,0 +1,200 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+
+
+class ParameterStore:
+    """
+    Stores named parameter arrays as .npy files and maps them read-only into
+    memory. When the store is set up before the server forks its workers,
+    all workers share the same physical pages instead of each keeping a
+    private copy.
+
+    Every publish writes a complete set of arrays to a new version
+    directory under versions/, then switches the CURRENT file, which names
+    the live version, with one atomic rename. Readers therefore see either
+    the old or the new set, never a mix of the two or a partial file. A
+    read costs one stat of CURRENT; the arrays of a version are mapped once
+    and cached until CURRENT changes.
+    """
+
+    SUFFIX = ".npy"
+    POINTER = "CURRENT"
+    VERSIONS = "versions"
+
+    # Versions kept besides the current one, for readers still mapping them
+    KEEP_VERSIONS = 1
+
+    def __init__(self, directory: str):
+        """
+        Initialize the store, creating the directory if needed.
+        """
+        self.directory = directory
+        os.makedirs(os.path.join(directory, self.VERSIONS), exist_ok=True)
+
+        # Identity of the CURRENT file, and the arrays of the version it names
+        self._identity = None
+        self._version = None
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def pointer_path(self) -> str:
+        """
+        Return the path of the file naming the current version.
+        """
+        return os.path.join(self.directory, self.POINTER)
+
+    def version_path(self, version: str) -> str:
+        """
+        Return the directory of a version.
+        """
+        return os.path.join(self.directory, self.VERSIONS, version)
+
+    def current_version(self) -> str:
+        """
+        Return the name of the current version, or None if nothing has been
+        published.
+        """
+        try:
+            with open(self.pointer_path()) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def path(self, name: str) -> str:
+        """
+        Return the path of the file holding the array `name` in the current
+        version.
+        """
+        version = self.current_version()
+        if version is None:
+            return os.path.join(self.directory, name + self.SUFFIX)
+        return os.path.join(self.version_path(version), name + self.SUFFIX)
+
+    def publish(self, name: str, array):
+        """
+        Replace the array stored under `name`, keeping the other arrays.
+        """
+        self.publish_all({name: array})
+
+    def publish_all(self, arrays: dict):
+        """
+        Atomically publish a new version holding every array in the
+        dictionary, along with the arrays of the current version that it
+        does not replace.
+        """
+        version_dir = tempfile.mkdtemp(
+            dir=os.path.join(self.directory, self.VERSIONS),
+            prefix=f"{time.time_ns():020d}-",
+        )
+        try:
+            merged = {**self.arrays(), **arrays}
+            for name, array in merged.items():
+                with open(os.path.join(version_dir, name + self.SUFFIX), "wb") as f:
+                    np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.directory, prefix=f".{self.POINTER}.", suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                f.write(os.path.basename(version_dir))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.pointer_path())
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        self._remove_old_versions(os.path.basename(version_dir))
+
+    def _remove_old_versions(self, current: str):
+        """
+        Delete all but the newest KEEP_VERSIONS versions before `current`.
+        Files still mapped by other processes stay readable on POSIX; where
+        they cannot be deleted, they are left for the next publish.
+        """
+        versions = sorted(
+            entry.name
+            for entry in os.scandir(os.path.join(self.directory, self.VERSIONS))
+            if entry.is_dir() and entry.name < current
+        )
+        for version in versions[: max(len(versions) - self.KEEP_VERSIONS, 0)]:
+            shutil.rmtree(self.version_path(version), ignore_errors=True)
+
+    def arrays(self) -> dict:
+        """
+        Return all arrays of the current version as read-only memory maps.
+        The result is shared between callers and must not be modified.
+        """
+        try:
+            stat = os.stat(self.pointer_path())
+            identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            identity = None
+
+        if identity == self._identity and (identity is not None or self._version == ""):
+            return self._arrays
+
+        with self._lock:
+            if identity is None:
+                # Nothing published yet, or arrays written by an older
+                # release straight into the directory
+                version, directory = "", self.directory
+            else:
+                version = self.current_version()
+                directory = self.version_path(version)
+
+            if version != self._version:
+                self._arrays = {
+                    entry.name[: -len(self.SUFFIX)]: np.load(
+                        entry.path, mmap_mode="r", allow_pickle=False
+                    )
+                    for entry in sorted(os.scandir(directory), key=lambda e: e.name)
+                    if entry.name.endswith(self.SUFFIX) and not entry.name.startswith(".")
+                }
+                self._version = version
+            self._identity = identity
+            return self._arrays
+
+    def get(self, name: str) -> np.ndarray:
+        """
+        Return the read-only memory map of the array `name` in the current
+        version.
+        """
+        arrays = self.arrays()
+        if name not in arrays:
+            raise KeyError(f"No parameter array named {name}.")
+        return arrays[name]
+
+    def names(self) -> list:
+        """
+        Return the names of the arrays of the current version.
+        """
+        return sorted(self.arrays())
+
+
+def split_array_parameters(parameters: dict) -> tuple[dict, dict]:
+    """
+    Split parameters into scalars and arrays. Arrays are NumPy arrays and
+    lists or tuples of numbers.
+    """
+    scalars, arrays = {}, {}
+    for name, value in parameters.items():
+        if isinstance(value, (np.ndarray, list, tuple)):
+            arrays[name] = np.asarray(value)
+        else:
+            scalars[name] = value
+    return scalars, arrays
+
+
+def get_parameter_arrays(app) -> dict:
+    """
+    Return a copy of the shared parameter arrays of the app, or an empty
+    dictionary if no parameter store is configured.
+    """
+    store = getattr(app, "parameter_store", None)
+    return dict(store.arrays()) if store is not None else {}
@@ -0,0 +1,423 @@
+import datetime
+import json
+import logging
+import os
+import re
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import AddConstraint, CreateIndex
+from app.extensions import db
+
+# Interval names accepted for timestamp partitions
+INTERVALS = ("day", "week", "month")
+
+
+class PartitionError(RuntimeError):
+    """
+    Raised when a table cannot be partitioned or archived.
+    """
+
+
+class PartitionScheme:
+    """
+    Range partitioning of a table on request_timestamp, by day, week or
+    month, or on decision_idx, by a fixed number of decision points. Each
+    partition is named after its lower bound, e.g. actions_p2025_01 or
+    study_data_p000100, so the bounds can be read back from the names.
+    """
+
+    def __init__(self, column: str = "request_timestamp", interval="month"):
+        """
+        Initialize the scheme. `interval` is "day", "week" or "month" for
+        request_timestamp, and a number of decision points for decision_idx.
+        """
+        if column == "request_timestamp":
+            if interval not in INTERVALS:
+                raise PartitionError(f"The interval must be one of {INTERVALS}.")
+        elif column == "decision_idx":
+            if not isinstance(interval, int) or interval <= 0:
+                raise PartitionError("The interval must be a positive integer.")
+        else:
+            raise PartitionError(
+                "Tables can be partitioned on request_timestamp or decision_idx."
+            )
+        self.column = column
+        self.interval = interval
+
+    @property
+    def by_time(self) -> bool:
+        """
+        Whether the partitions are time ranges.
+        """
+        return self.column == "request_timestamp"
+
+    def lower_bound(self, value):
+        """
+        Return the lower bound of the partition holding `value`.
+        """
+        if not self.by_time:
+            return value - value % self.interval
+        day = datetime.datetime(value.year, value.month, value.day)
+        if self.interval == "day":
+            return day
+        if self.interval == "week":
+            return day - datetime.timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    def next_bound(self, lower):
+        """
+        Return the lower bound of the partition after the one starting at
+        `lower`.
+        """
+        if not self.by_time:
+            return lower + self.interval
+        if self.interval == "day":
+            return lower + datetime.timedelta(days=1)
+        if self.interval == "week":
+            return lower + datetime.timedelta(days=7)
+        if lower.month == 12:
+            return lower.replace(year=lower.year + 1, month=1)
+        return lower.replace(month=lower.month + 1)
+
+    def ranges(self, first, last) -> list[tuple]:
+        """
+        Return the (lower, upper) bounds of the partitions covering the
+        values from `first` to `last`.
+        """
+        ranges = []
+        lower = self.lower_bound(first)
+        while lower <= last:
+            upper = self.next_bound(lower)
+            ranges.append((lower, upper))
+            lower = upper
+        return ranges
+
+    def suffix(self, lower) -> str:
+        """
+        Return the name suffix of the partition starting at `lower`.
+        """
+        if not self.by_time:
+            return f"p{lower:06d}"
+        if self.interval == "month":
+            return lower.strftime("p%Y_%m")
+        return lower.strftime("p%Y_%m_%d")
+
+    def parse_suffix(self, suffix: str):
+        """
+        Return the lower bound encoded in a partition name suffix, or None
+        if the suffix does not follow the naming scheme.
+        """
+        try:
+            if not self.by_time:
+                return int(re.fullmatch(r"p(\d+)", suffix).group(1))
+            if self.interval == "month":
+                return datetime.datetime.strptime(suffix, "p%Y_%m")
+            return datetime.datetime.strptime(suffix, "p%Y_%m_%d")
+        except (AttributeError, ValueError):
+            return None
+
+    def literal(self, value) -> str:
+        """
+        Return `value` as an SQL literal of the partition column.
+        """
+        if not self.by_time:
+            return str(int(value))
+        return f"'{value.isoformat(sep=' ')}'"
+
+
+def partition_sql(table: str, scheme: PartitionScheme, lower, upper) -> str:
+    """
+    Return the statement that creates the partition of `table` for the range
+    from `lower` (inclusive) to `upper` (exclusive).
+    """
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table}_{scheme.suffix(lower)} "
+        f"PARTITION OF {table} FOR VALUES FROM ({scheme.literal(lower)}) "
+        f"TO ({scheme.literal(upper)})"
+    )
+
+
+def create_partition_sql(table: str, scheme: PartitionScheme, lower, upper) -> list[str]:
+    """
+    Return the statements that create the partition of `table` for the range
+    from `lower` to `upper`. PostgreSQL refuses to create a partition while
+    the default partition holds rows in its range, e.g. rows written before
+    the partition maintenance ran, so those rows are moved out of the
+    default partition first and reinserted once the partition exists.
+    """
+    name = f"{table}_{scheme.suffix(lower)}"
+    in_range = (
+        f"{scheme.column} >= {scheme.literal(lower)} "
+        f"AND {scheme.column} < {scheme.literal(upper)}"
+    )
+    return [
+        f"CREATE TEMPORARY TABLE {name}_moved AS "
+        f"SELECT * FROM {table}_default WHERE {in_range}",
+        f"DELETE FROM {table}_default WHERE {in_range}",
+        partition_sql(table, scheme, lower, upper),
+        f"INSERT INTO {table} SELECT * FROM {name}_moved",
+        f"DROP TABLE {name}_moved",
+    ]
+
+
+def convert_table_sql(table: db.Table, scheme: PartitionScheme, ranges: list) -> list[str]:
+    """
+    Return the statements that convert an existing table to a table
+    partitioned by range on the scheme's column, with the same name,
+    columns, defaults, indexes and constraints, and move its rows. The
+    primary key becomes (id, column), and the partition column is added to
+    unique constraints that lack it, since a partitioned table's keys must
+    include it. Rows outside the ranges go to the default partition.
+    """
+    name = table.name
+    old = f"{name}_unpartitioned"
+    dialect = postgresql.dialect()
+
+    statements = [
+        f"ALTER TABLE {name} RENAME TO {old}",
+        f"ALTER INDEX IF EXISTS {name}_pkey RENAME TO {old}_pkey",
+        f"CREATE TABLE {name} (LIKE {old} INCLUDING DEFAULTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE ({scheme.column})",
+        f"ALTER TABLE {name} ADD PRIMARY KEY (id, {scheme.column})",
+        f"CREATE TABLE {name}_default PARTITION OF {name} DEFAULT",
+    ]
+    statements += [partition_sql(name, scheme, lower, upper) for lower, upper in ranges]
+    statements += [
+        f"INSERT INTO {name} SELECT * FROM {old}",
+        # Keep the id sequence when the old table is dropped
+        f"ALTER SEQUENCE {name}_id_seq OWNED BY {name}.id",
+        f"DROP TABLE {old}",
+    ]
+    statements += [
+        str(AddConstraint(constraint).compile(dialect=dialect))
+        for constraint in table.foreign_key_constraints
+    ]
+    # Unique constraints of a partitioned table must include the partition
+    # column as well
+    for constraint in sorted(
+        (c for c in table.constraints if isinstance(c, db.UniqueConstraint)),
+        key=lambda constraint: constraint.name,
+    ):
+        columns = [column.name for column in constraint.columns]
+        if scheme.column not in columns:
+            columns.append(scheme.column)
+        statements.append(
+            f"ALTER TABLE {name} ADD CONSTRAINT {constraint.name} "
+            f"UNIQUE ({', '.join(columns)})"
+        )
+    statements += [
+        str(CreateIndex(index).compile(dialect=dialect))
+        for index in sorted(table.indexes, key=lambda index: index.name)
+    ]
+    return statements
+
+
+def is_partitioned(connection, table: str) -> bool:
+    """
+    Whether `table` is a partitioned table.
+    """
+    relkind = connection.execute(
+        db.text("SELECT relkind FROM pg_class WHERE relname = :table"),
+        {"table": table},
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(connection, table: str, scheme: PartitionScheme) -> dict:
+    """
+    Return the range partitions of `table` that follow the naming scheme,
+    mapped from name to lower bound. The default partition is left out.
+    """
+    names = connection.execute(
+        db.text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    ).scalars()
+
+    partitions = {}
+    for name in names:
+        lower = scheme.parse_suffix(name[len(table) + 1 :])
+        if lower is not None:
+            partitions[name] = lower
+    return partitions
+
+
+def _current_value(connection, table: str, scheme: PartitionScheme):
+    """
+    Return the value of the partition column for new rows: the current time,
+    or the highest decision index so far.
+    """
+    if scheme.by_time:
+        return datetime.datetime.now()
+    return connection.execute(
+        db.text(f"SELECT coalesce(max(decision_idx), 0) FROM {table}")
+    ).scalar()
+
+
+def partition_table(connection, table: db.Table, scheme: PartitionScheme, ahead: int = 2):
+    """
+    Convert `table` to a partitioned table, with partitions covering its
+    rows and the next `ahead` partitions. Runs in the caller's transaction,
+    so a failure leaves the table unchanged. Returns False if the table is
+    already partitioned.
+    """
+    if is_partitioned(connection, table.name):
+        return False
+
+    first, last = connection.execute(
+        db.text(f"SELECT min({scheme.column}), max({scheme.column}) FROM {table.name}")
+    ).one()
+    current = _current_value(connection, table.name, scheme)
+    if first is None:
+        first = last = current
+    last = max(last, current)
+    for _ in range(ahead):
+        last = scheme.next_bound(scheme.lower_bound(last))
+
+    for statement in convert_table_sql(table, scheme, scheme.ranges(first, last)):
+        connection.execute(db.text(statement))
+    logging.info(f"[Partitioning] Partitioned {table.name} on {scheme.column}.")
+    return True
+
+
+def ensure_partitions(connection, table: str, scheme: PartitionScheme, ahead: int = 2) -> list[str]:
+    """
+    Create the partition for current rows and the next `ahead` partitions of
+    `table`, if they do not exist, moving their rows out of the default
+    partition. Returns the names of the partitions that were missing.
+    """
+    existing = list_partitions(connection, table, scheme)
+    lower = scheme.lower_bound(_current_value(connection, table, scheme))
+
+    created = []
+    for _ in range(ahead + 1):
+        upper = scheme.next_bound(lower)
+        name = f"{table}_{scheme.suffix(lower)}"
+        if name not in existing:
+            for statement in create_partition_sql(table, scheme, lower, upper):
+                connection.execute(db.text(statement))
+            created.append(name)
+        lower = upper
+
+    if created:
+        logging.info(f"[Partitioning] Created partitions: {created}")
+    return created
+
+
+def export_parquet(connection, table: str, path: str, chunk_size: int = 10000) -> int:
+    """
+    Write the rows of `table` to a zstd-compressed Parquet file, streaming
+    `chunk_size` rows at a time. JSON values are written as JSON text and
+    states as their float32 bytes. Returns the number of rows. Requires
+    pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise PartitionError("Archiving partitions requires pyarrow.") from e
+
+    result = connection.execution_options(stream_results=True).execute(
+        db.text(f"SELECT * FROM {table} ORDER BY id")
+    )
+    columns = list(result.keys())
+    count = 0
+    writer = None
+    try:
+        for rows in result.partitions(chunk_size):
+            data = {name: [] for name in columns}
+            for row in rows:
+                for name, value in zip(columns, row):
+                    if isinstance(value, (dict, list)):
+                        value = json.dumps(value)
+                    elif isinstance(value, memoryview):
+                        value = value.tobytes()
+                    data[name].append(value)
+            chunk = pa.Table.from_pydict(data)
+            if writer is None:
+                writer = pq.ParquetWriter(path, chunk.schema, compression="zstd")
+            writer.write_table(chunk)
+            count += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def archive_partitions(
+    connection,
+    table: str,
+    scheme: PartitionScheme,
+    before,
+    directory: str,
+    chunk_size: int = 10000,
+) -> list[str]:
+    """
+    Detach the partitions of `table` that end at or before `before`, export
+    each one to a Parquet file in `directory`, and drop it once the file
+    has all of its rows. Returns the paths of the files. Runs in the
+    caller's transaction, so if an export fails, the transaction rolls back
+    and every partition stays attached; the incomplete file is removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for name, lower in sorted(
+        list_partitions(connection, table, scheme).items(), key=lambda item: item[1]
+    ):
+        if scheme.next_bound(lower) > before:
+            continue
+
+        connection.execute(db.text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        expected = connection.execute(db.text(f"SELECT count(*) FROM {name}")).scalar()
+        path = os.path.join(directory, f"{name}.parquet")
+        try:
+            written = export_parquet(connection, name, path, chunk_size)
+            if written != expected:
+                raise PartitionError(
+                    f"Exported {written} of {expected} rows of {name}; it was not dropped."
+                )
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        connection.execute(db.text(f"DROP TABLE {name}"))
+        logging.info(f"[Partitioning] Archived {name} to {path}.")
+        paths.append(path)
+    return paths
+
+
+def partition_scheme(app) -> PartitionScheme:
+    """
+    Return the partition scheme of the PARTITION_COLUMN and
+    PARTITION_INTERVAL config.
+    """
+    return PartitionScheme(
+        app.config.get("PARTITION_COLUMN", "request_timestamp"),
+        app.config.get("PARTITION_INTERVAL", "month"),
+    )
+
+
+def ensure_configured_partitions(app) -> list[str]:
+    """
+    Create the upcoming partitions of the tables in PARTITIONED_TABLES that
+    are partitioned. Does nothing on databases other than PostgreSQL. Must
+    be called inside an app context.
+    """
+    tables = app.config.get("PARTITIONED_TABLES") or ()
+    if not tables or db.engine.dialect.name != "postgresql":
+        return []
+
+    scheme = partition_scheme(app)
+    created = []
+    with db.engine.begin() as connection:
+        for table in tables:
+            if is_partitioned(connection, table):
+                created += ensure_partitions(
+                    connection, table, scheme, app.config.get("PARTITIONS_AHEAD", 2)
+                )
+    return created
@@ -0,0 +1,130 @@
+import datetime
+import logging
+import numpy as np
+from app.extensions import db
+from app.models import User, Action, StudyData, PrecomputedAction
+from app.algorithms.base import RLAlgorithm
+
+
+def next_decision_indices() -> dict:
+    """
+    Return the next decision index for every user, i.e. one past the largest
+    decision index in the actions and study data tables, or 0 if the user
+    has no decisions yet.
+    """
+    next_idx = {user_id: 0 for (user_id,) in db.session.query(User.user_id)}
+
+    for model in (Action, StudyData):
+        rows = db.session.query(model.user_id, db.func.max(model.decision_idx)).group_by(
+            model.user_id
+        )
+        for user_id, max_idx in rows:
+            if user_id in next_idx and max_idx is not None:
+                next_idx[user_id] = max(next_idx[user_id], max_idx + 1)
+
+    return next_idx
+
+
+def precompute_actions(
+    rl_algorithm: RLAlgorithm,
+    model_parameters,
+    horizon: int,
+    parameter_arrays: dict = None,
+) -> int:
+    """
+    Generate and store actions for the next `horizon` decision points of every
+    user with the given model parameters. Previously precomputed actions are
+    replaced. Arrays from the shared parameter store are passed in
+    `parameter_arrays`. Slots whose state cannot be forecast by a state-dependent
+    algorithm are skipped and computed live. Must be called inside an app
+    context. Returns the number of stored actions.
+    """
+    parameters = rl_algorithm.action_parameters(
+        {
+            "probability_of_action": model_parameters.probability_of_action,
+            **(parameter_arrays or {}),
+        }
+    )
+    created_at = datetime.datetime.now()
+
+    # Collect the slots first, so all actions come from one batch call
+    user_ids, decision_idxs, states = [], [], []
+    for user_id, start_idx in next_decision_indices().items():
+        for decision_idx in range(start_idx, start_idx + horizon):
+            state = rl_algorithm.forecast_state(user_id, decision_idx)
+            if state is None and not rl_algorithm.state_independent:
+                continue
+            user_ids.append(user_id)
+            decision_idxs.append(decision_idx)
+            states.append(state)
+
+    rows = []
+    if user_ids:
+        actions, probs, random_states = rl_algorithm.get_actions(
+            user_ids, states, parameters, decision_idxs
+        )
+        rows = [
+            {
+                "user_id": user_id,
+                "decision_idx": decision_idx,
+                "state": state,
+                "action": int(action),
+                "action_prob": float(prob),
+                "random_state": random_state,
+                "model_parameters_id": model_parameters.id,
+                "algorithm_version": rl_algorithm.version_string(),
+                "created_at": created_at,
+            }
+            for user_id, decision_idx, state, action, prob, random_state in zip(
+                user_ids, decision_idxs, states, actions, probs, random_states
+            )
+        ]
+
+    # Replace the previous slots in a single transaction
+    db.session.query(PrecomputedAction).delete()
+    if rows:
+        db.session.execute(db.insert(PrecomputedAction), rows)
+    db.session.commit()
+
+    logging.info(
+        f"[Precompute] Stored {len(rows)} actions for model parameters "
+        f"{model_parameters.id}."
+    )
+    return len(rows)
+
+
+def take_precomputed_action(
+    rl_algorithm: RLAlgorithm,
+    user_id: str,
+    decision_idx: int,
+    state: list,
+    model_parameters_id: int,
+):
+    """
+    Return the precomputed action for the slot if it was generated with the
+    given model parameters and algorithm version and its state matches the
+    live state, or None.
+    The row is deleted in the current session, so it is consumed when the
+    caller commits. State-independent algorithms match on any state.
+    """
+    precomputed = PrecomputedAction.query.filter_by(
+        user_id=user_id, decision_idx=decision_idx
+    ).first()
+    if not precomputed:
+        return None
+
+    if precomputed.model_parameters_id != model_parameters_id:
+        return None
+
+    if precomputed.algorithm_version != rl_algorithm.version_string():
+        return None
+
+    if not rl_algorithm.state_independent:
+        if precomputed.state is None or not np.allclose(
+            np.asarray(precomputed.state, dtype=np.float32),
+            np.asarray(state, dtype=np.float32),
+        ):
+            return None
+
+    db.session.delete(precomputed)
+    return precomputed
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import pickle
+import zipfile
+import numpy as np
+
+# File extensions handled by each loader
+NPZ_EXTENSIONS = (".npz",)
+JSON_EXTENSIONS = (".json",)
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+PICKLE_EXTENSIONS = (".pkl", ".pickle")
+
+
+class PriorsError(ValueError):
+    """
+    Raised when a priors file cannot be loaded or does not match the
+    parameter schema of the algorithm.
+    """
+
+
+def load_priors(path: str, schema: dict = None) -> dict:
+    """
+    Load priors from a file, picking the loader from the file extension.
+    Supported formats are .npz archives, JSON manifests, Arrow IPC files and,
+    for compatibility, pickles. Arrays are memory-mapped where the format
+    allows it, so large priors are not copied into memory. If a schema is
+    given, the priors are validated against it.
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in NPZ_EXTENSIONS:
+        priors = load_npz_priors(path)
+    elif extension in JSON_EXTENSIONS:
+        priors = load_manifest_priors(path)
+    elif extension in ARROW_EXTENSIONS:
+        priors = load_arrow_priors(path)
+    elif extension in PICKLE_EXTENSIONS:
+        priors = load_pickle_priors(path)
+    else:
+        raise PriorsError(f"Unsupported priors file format: {path}")
+
+    if schema is not None:
+        validate_priors(priors, schema)
+
+    return priors
+
+
+def load_npz_priors(path: str) -> dict:
+    """
+    Load priors from a .npz archive. Members stored without compression are
+    memory-mapped in place; compressed members are read into memory. Zero
+    dimensional arrays are returned as Python scalars.
+    """
+    priors = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[: -len(".npy")]
+
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    array = np.lib.format.read_array(member, allow_pickle=False)
+            else:
+                array = _map_stored_member(path, f, info)
+
+            priors[name] = array.item() if array.ndim == 0 else array
+
+    return priors
+
+
+def _map_stored_member(path: str, f, info: zipfile.ZipInfo) -> np.ndarray:
+    """
+    Memory-map an uncompressed .npy member of a zip archive.
+    """
+    # The local file header is 30 bytes followed by the file name and the
+    # extra field, whose lengths are at offsets 26 and 28
+    f.seek(info.header_offset + 26)
+    name_length = int.from_bytes(f.read(2), "little")
+    extra_length = int.from_bytes(f.read(2), "little")
+    f.seek(info.header_offset + 30 + name_length + extra_length)
+
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+    if dtype.hasobject:
+        raise PriorsError(f"Object arrays are not allowed in priors: {info.filename}")
+
+    if shape == ():
+        return np.frombuffer(f.read(dtype.itemsize), dtype=dtype).reshape(())
+
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        offset=f.tell(),
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+def load_manifest_priors(path: str) -> dict:
+    """
+    Load priors from a JSON manifest. Values are either inline numbers and
+    lists, or {"file": "<path>.npy"} references to arrays that are
+    memory-mapped. Relative paths are resolved against the manifest.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+
+    if not isinstance(manifest, dict):
+        raise PriorsError("A priors manifest must be a JSON object.")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    priors = {}
+    for name, value in manifest.items():
+        if isinstance(value, dict):
+            if "file" not in value:
+                raise PriorsError(f"Manifest entry {name} must have a file.")
+            array_path = os.path.join(base_dir, value["file"])
+            priors[name] = np.load(array_path, mmap_mode="r", allow_pickle=False)
+        elif isinstance(value, list):
+            priors[name] = np.asarray(value)
+        else:
+            priors[name] = value
+
+    return priors
+
+
+def load_arrow_priors(path: str) -> dict:
+    """
+    Load priors from a single-row Arrow IPC file, with one column per
+    parameter. List columns become arrays, reshaped by the optional "shape"
+    field metadata (a JSON list). The file is memory-mapped and numeric
+    arrays are zero-copy views where Arrow allows it. Requires pyarrow.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise PriorsError("Loading Arrow priors requires pyarrow.") from e
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    if table.num_rows != 1:
+        raise PriorsError("An Arrow priors file must have exactly one row.")
+
+    priors = {}
+    for field, column in zip(table.schema, table.columns):
+        column = column.combine_chunks()
+        if pa.types.is_list(field.type) or pa.types.is_fixed_size_list(field.type):
+            values = column.flatten()
+            while pa.types.is_list(values.type) or pa.types.is_fixed_size_list(
+                values.type
+            ):
+                values = values.flatten()
+            array = values.to_numpy(zero_copy_only=False)
+
+            metadata = field.metadata or {}
+            if b"shape" in metadata:
+                array = array.reshape(json.loads(metadata[b"shape"]))
+            priors[field.name] = array
+        else:
+            priors[field.name] = column[0].as_py()
+
+    return priors
+
+
+def load_pickle_priors(path: str) -> dict:
+    """
+    Load priors from a pickle file. Kept for compatibility with
+    PRIORS_PICKLE_FILE; only load pickles from trusted sources.
+    """
+    logging.warning(
+        "Loading priors from pickle file %s. Pickles can run arbitrary code; "
+        "prefer .npz or a JSON manifest.",
+        path,
+    )
+    with open(path, "rb") as f:
+        priors = pickle.load(f)
+
+    if not isinstance(priors, dict):
+        raise PriorsError("A priors pickle must contain a dictionary.")
+
+    return priors
+
+
+def save_priors(priors: dict, path: str):
+    """
+    Save priors as an uncompressed .npz archive, which load_priors maps
+    without copying.
+    """
+    np.savez(path, **{name: np.asarray(value) for name, value in priors.items()})
+
+
+def validate_priors(priors: dict, schema: dict):
+    """
+    Check that the priors have every parameter in the schema with the right
+    type or shape. A schema maps each parameter name to either a Python type
+    for scalars, or a shape tuple for arrays. Shape entries are ints, None
+    for any size, or names for sizes that must agree across parameters.
+    """
+    sizes = {}
+    for name, spec in schema.items():
+        if name not in priors:
+            raise PriorsError(f"Priors are missing the parameter {name}.")
+
+        value = priors[name]
+        if isinstance(spec, tuple):
+            shape = np.shape(value)
+            if len(shape) != len(spec):
+                raise PriorsError(
+                    f"Parameter {name} must have {len(spec)} dimensions, got {len(shape)}."
+                )
+            for expected, actual in zip(spec, shape):
+                if isinstance(expected, str):
+                    expected = sizes.setdefault(expected, actual)
+                if expected is not None and expected != actual:
+                    raise PriorsError(
+                        f"Parameter {name} has shape {shape}, expected {spec}."
+                    )
+        else:
+            # Accept NumPy scalars and ints where floats are expected
+            if spec is float and isinstance(value, (int, np.integer, np.floating)):
+                continue
+            if not isinstance(value, spec):
+                raise PriorsError(
+                    f"Parameter {name} must be of type {spec.__name__}."
+                )
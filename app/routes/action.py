@@ -1,49 +1,52 @@
+import functools
 import logging
 import datetime
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import IntegrityError
 from app.extensions import db
-from app.models import User, Action, ModelParameters, StudyData
+from app.models import User, Action, StudyData
+from app.precompute import take_precomputed_action
+from app.schemas import Schema, Field, algorithm_schema
+from app.idempotency import (
+    IdempotencyConflict,
+    action_cache_key,
+    action_response,
+    cache_entry,
+    find_previous_action,
+)
+from app.studies import get_study
 
 action_blueprint = Blueprint("action", __name__)
 
 
-def check_fields(data: dict) -> tuple[bool, str]:
-    """
-    Check if the required fields are present in the data.
-    """
-    if not data or "user_id" not in data or "timestamp" not in data:
-        return False, "user_id and timestamp are required."
-
-    if "decision_idx" not in data:
-        return False, "decision_idx is required."
-
-    if "context" not in data:
-        return False, "context is required."
-
-    if "temperature" not in data["context"]:
-        return False, "Invalid context. Temperature is required."
-
-    # Check field types
-    if not isinstance(data["user_id"], str):
-        return False, "user_id must be a string."
-
-    if not isinstance(data["timestamp"], str) and not isinstance(
-        data["timestamp"], datetime.datetime
-    ):
-        return False, "timestamp must be a string or datetime object."
+# Fields of an action request, followed by the algorithm's context
+ACTION_FIELDS = {
+    "user_id": Field(str, missing="user_id and timestamp are required."),
+    "timestamp": Field(
+        (str, datetime.datetime),
+        missing="user_id and timestamp are required.",
+        invalid="timestamp must be a string or datetime object.",
+    ),
+    "decision_idx": Field(int),
+}
 
-    if not isinstance(data["decision_idx"], int):
-        return False, "decision_idx must be an integer."
 
-    if not isinstance(data["context"], dict):
-        return False, "context must be a dictionary."
+@functools.lru_cache(maxsize=None)
+def action_schema(context_schema: Schema) -> Schema:
+    """
+    Return the compiled schema of action requests with the given context.
+    """
+    return Schema({**ACTION_FIELDS, "context": Field(dict, schema=context_schema)})
 
-    if not isinstance(data["context"]["temperature"], float) and not isinstance(
-        data["context"]["temperature"], int
-    ):
-        return False, "temperature must be a float or int."
 
-    return True, ""
+def check_fields(data: dict, context_schema: Schema = None) -> tuple[bool, str]:
+    """
+    Check if the required fields are present in the data, and that the
+    context matches the algorithm's context schema.
+    """
+    if context_schema is None:
+        context_schema = algorithm_schema("context_schema")
+    return action_schema(context_schema).validate(data)
 
 
 @action_blueprint.route("/action", methods=["POST"])
@@ -65,8 +68,25 @@ def request_action():
         decision_idx = data["decision_idx"]
         context = data["context"]
         request_timestamp = data["timestamp"]
+        idempotency_key = request.headers.get("Idempotency-Key")
         received_timestamp_iso = datetime.datetime.now().isoformat()
 
+        # The study of the request, or the app for the default study
+        study = get_study()
+
+        # Return the stored action if this is a retry, without drawing again
+        try:
+            previous = find_previous_action(
+                study.action_cache, user_id, decision_idx, idempotency_key, context
+            )
+        except IdempotencyConflict as e:
+            return jsonify({"status": "failed", "message": str(e)}), e.status_code
+        if previous:
+            logging.info(
+                f"[Action] Replaying action for user {user_id}, decision {decision_idx}."
+            )
+            return jsonify(previous), 200, {"Idempotent-Replayed": "true"}
+
         # Check if the user exists in the database
         user = User.query.filter_by(user_id=user_id).first()
         if not user:
@@ -85,33 +105,48 @@ def request_action():
             )
 
         # Get the RL algorithm
-        rl_algorithm = current_app.rl_algorithm
+        rl_algorithm = study.rl_algorithm
 
         # Make the state
         status, state = rl_algorithm.make_state(context)
         if not status:
             return jsonify({"status": "failed", "message": state}), 400
 
-        # Get the latest model parameters from the database
-        model_parameters = ModelParameters.query.order_by(
-            ModelParameters.timestamp.desc()
-        ).first()
+        # Get the current snapshot of the model parameters. This is a single
+        # reference read, with no lock and no database query, and the same
+        # version is used for the whole request.
+        snapshot = study.parameter_snapshots.get(rl_algorithm)
 
         # Check if the model parameters exist
-        if not model_parameters:
+        if snapshot is None:
             return (
                 jsonify({"status": "failed", "message": "Model parameters not found."}),
                 404,
             )
 
-        # Extract the model parameters, in this case, the probability
-        probability = model_parameters.probability_of_action
+        # The stored parameters, in this case, the probability, along with
+        # any arrays from the shared parameter store, and the action
+        # parameters the algorithm derived from them
+        stored_parameters = snapshot.parameters
+        parameters = snapshot.action_parameters
+
+        # Use the action generated ahead of time for this slot if there is one,
+        # otherwise get the action, action selection probability, and random
+        # state used to generate the action
+        precomputed = None
+        if study.config.get("PRECOMPUTE_ACTIONS"):
+            precomputed = take_precomputed_action(
+                rl_algorithm, user_id, decision_idx, state, snapshot.version
+            )
 
-        # Get the action, action selection probability, and random state
-        # used to generate the action
-        action, prob, random_state = rl_algorithm.get_action(
-            user_id, state, {"probability": probability}, decision_idx
-        )
+        if precomputed:
+            action = precomputed.action
+            prob = precomputed.action_prob
+            random_state = precomputed.random_state
+        else:
+            action, prob, random_state = rl_algorithm.get_action(
+                user_id, state, parameters, decision_idx
+            )
 
         # Save the action to the action database
         new_action = Action(
@@ -122,28 +157,73 @@ def request_action():
             raw_context=context,
             action_prob=prob,
             random_state=random_state,
-            model_parameters_id=model_parameters.id,
+            model_parameters_id=snapshot.version,
+            algorithm_version=rl_algorithm.version_string(),
+            idempotency_key=idempotency_key,
             request_timestamp=request_timestamp,
             timestamp=received_timestamp_iso,
         )
 
-        # Save the action to the database
-        db.session.add(new_action)
-        db.session.commit()
-
-        return (
-            jsonify(
-                {
-                    "status": "success",
-                    "user_id": user_id,
-                    "state": state,
-                    "action": action,
-                    "action_prob": prob,
-                    "timestamp": received_timestamp_iso,
-                }
-            ),
-            201,
-        )
+        # Save the action to the database, through the group commit buffer if
+        # write-behind is enabled
+        action_writer = getattr(study, "action_writer", None)
+        written = None
+        cache_key = action_cache_key(user_id, decision_idx)
+        try:
+            if action_writer is not None:
+                # The buffer only inserts the row, so commit the consumed
+                # precomputed action here
+                if precomputed:
+                    db.session.commit()
+                wait = study.config.get("WRITE_BEHIND_DURABILITY") == "wait"
+                written = action_writer.write(new_action, wait=wait)
+            else:
+                db.session.add(new_action)
+                db.session.commit()
+        except IntegrityError:
+            # A concurrent request for the slot stored its action first.
+            # Return that one, so every request for the slot gets the
+            # action that was stored.
+            db.session.rollback()
+            study.action_cache.discard(cache_key)
+            try:
+                previous = find_previous_action(
+                    study.action_cache, user_id, decision_idx, idempotency_key, context
+                )
+            except IdempotencyConflict as e:
+                return jsonify({"status": "failed", "message": str(e)}), e.status_code
+            if previous is None:
+                raise
+            logging.info(
+                f"[Action] Replaying concurrent action for user {user_id}, decision {decision_idx}."
+            )
+            return jsonify(previous), 200, {"Idempotent-Replayed": "true"}
+
+        # Cache the response for retries of this request
+        response = action_response(user_id, state, action, prob, received_timestamp_iso)
+        study.action_cache.put(cache_key, cache_entry(response, idempotency_key, context))
+
+        # An acknowledged row whose group commit fails is lost, and counted
+        # as failed by the buffer. Forget its response, so a retry draws a
+        # new action instead of replaying one that was never stored.
+        if written is not None:
+            written.add_done_callback(
+                lambda future: future.exception() and study.action_cache.discard(cache_key)
+            )
+
+        # Hand the request to the shadow algorithm, if any. This never blocks.
+        shadow_evaluator = getattr(study, "shadow_evaluator", None)
+        if shadow_evaluator is not None:
+            shadow_evaluator.submit(
+                user_id,
+                decision_idx,
+                context,
+                stored_parameters,
+                snapshot.version,
+                action,
+            )
+
+        return jsonify(response), 201
 
     except Exception as e:
         # Log the exception
@@ -0,0 +1,112 @@
+import hmac
+import logging
+from flask import Blueprint, request, jsonify, current_app
+from app.models import ModelParameters
+from app.parameter_store import get_parameter_arrays
+from app.algorithms.registry import get_algorithm_class, swap_algorithm_in_background
+
+admin_blueprint = Blueprint("admin", __name__)
+
+
+@admin_blueprint.before_request
+def check_admin_token():
+    """
+    Only allow requests with the configured admin token.
+    """
+    token = current_app.config.get("ADMIN_TOKEN")
+    if not token:
+        return jsonify({"status": "failed", "message": "Admin endpoints are disabled."}), 403
+
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        return jsonify({"status": "failed", "message": "Invalid admin token."}), 403
+
+
+def check_fields(data: dict) -> tuple[bool, str]:
+    """
+    Check if the required fields are present in the data.
+    """
+    if not data or "algorithm" not in data:
+        return False, "algorithm is required."
+
+    if not isinstance(data["algorithm"], str):
+        return False, "algorithm must be a string."
+
+    if "kwargs" in data and not isinstance(data["kwargs"], dict):
+        return False, "kwargs must be a dictionary."
+
+    return True, ""
+
+
+@admin_blueprint.route("/admin/algorithm", methods=["GET"])
+def get_algorithm():
+    """
+    Returns the algorithm serving requests and the status of the last swap.
+    """
+    return jsonify(
+        {
+            "status": "success",
+            "algorithm": current_app.rl_algorithm.version_string(),
+            "swap": getattr(current_app, "algorithm_swap_status", None),
+        }
+    )
+
+
+@admin_blueprint.route("/admin/admission", methods=["GET"])
+def get_admission():
+    """
+    Returns the load and counters of the admission control.
+    """
+    admission = getattr(current_app, "admission", None)
+    return jsonify(
+        {
+            "status": "success",
+            "admission": admission.stats() if admission is not None else None,
+        }
+    )
+
+
+@admin_blueprint.route("/admin/algorithm", methods=["POST"])
+def swap_algorithm():
+    """
+    Loads an algorithm in the background, warms it up with the latest model
+    parameters and swaps it in for new requests.
+    """
+    try:
+        data = request.get_json()
+
+        # Check if the required fields are present
+        fields_present, error_message = check_fields(data)
+        if not fields_present:
+            return jsonify({"status": "failed", "message": error_message}), 400
+
+        name = data["algorithm"]
+        reload = bool(data.get("reload", False))
+
+        # Fail fast on unknown algorithms
+        try:
+            get_algorithm_class(name)
+        except (KeyError, ImportError, AttributeError):
+            return jsonify({"status": "failed", "message": f"Unknown algorithm: {name}"}), 404
+
+        # Get the latest model parameters to warm up the new algorithm
+        model_parameters = ModelParameters.query.order_by(
+            ModelParameters.timestamp.desc()
+        ).first()
+        parameters = None
+        if model_parameters:
+            parameters = {
+                "probability_of_action": model_parameters.probability_of_action,
+                **get_parameter_arrays(current_app),
+            }
+
+        app = current_app._get_current_object()  # Get the actual app object
+        swap_algorithm_in_background(app, name, data.get("kwargs"), reload, parameters)
+
+        logging.info(f"[Admin] Loading algorithm: {name}")
+
+        return jsonify({"status": "loading", "algorithm": name}), 202
+
+    except Exception as e:
+        logging.error(f"[Admin] Error: {e}")
+        logging.exception(e)
+        return jsonify({"status": "failed", "message": "Internal server error."}), 500
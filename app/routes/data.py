@@ -1,55 +1,97 @@
 import datetime
+import functools
+import itertools
 import logging
-import uuid
-import requests
-from threading import Thread
-from flask import Blueprint, current_app, request, jsonify
-from app.models import User, ModelParameters, StudyData, ModelUpdateRequests
-from app.algorithms.base import RLAlgorithm
+import numpy as np
+from flask import Blueprint, request, jsonify
+from app.models import User, StudyData
 from app.extensions import db
+from app.column_types import get_state_dim
+from app.schemas import Schema, Field, algorithm_schema
+from app.studies import get_study
 
 data_blueprint = Blueprint("data", __name__)
 
 
-def check_fields(data: dict) -> tuple[bool, str]:
+@functools.lru_cache(maxsize=None)
+def upload_schema(context_schema: Schema, outcome_schema: Schema) -> Schema:
     """
-    Check if the required fields are present in the data.
+    Return the compiled schema of uploaded data with the given context and
+    outcome. Batch uploads use the same schema with a list of values per
+    field.
     """
-    if not data or "user_id" not in data:
-        return False, "user_id is required."
+    user_data = Schema(
+        {
+            "context": Field(schema=context_schema),
+            "action": Field(int),
+            "action_prob": Field((float, int), invalid="action_prob must be a float."),
+            "state": Field(list, invalid="state must be a list of numbers."),
+            "outcome": Field(schema=outcome_schema),
+        }
+    )
+    return Schema(
+        {
+            "user_id": Field(str),
+            "decision_idx": Field(int),
+            "timestamp": Field(str),
+            "data": Field(schema=user_data),
+        }
+    )
 
-    if "decision_idx" not in data:
-        return False, "decision_idx is required."
 
-    if "timestamp" not in data:
-        return False, "timestamp is required."
+def get_upload_schema() -> Schema:
+    """
+    Return the compiled upload schema of the algorithm serving requests.
+    """
+    return upload_schema(
+        algorithm_schema("context_schema"), algorithm_schema("outcome_schema")
+    )
 
-    if "data" not in data:
-        return False, "data is required."
 
-    user_data = data["data"]
+def check_fields(data: dict) -> tuple[bool, str]:
+    """
+    Check if the required fields are present in the data, and that the
+    context and outcome match the algorithm's schemas.
+    """
+    return get_upload_schema().validate(data)
 
-    if not user_data or "context" not in user_data:
-        return False, "context is required."
 
-    if "temperature" not in user_data["context"]:
-        return False, "Invalid context. Temperature is required."
+def check_batch_fields(data: dict) -> tuple[bool, str]:
+    """
+    Check a batch upload, which has the fields of a single upload with a
+    list of values, one per row, in place of each value.
+    """
+    return get_upload_schema().validate_columns(data)
 
-    if "action" not in user_data:
-        return False, "action is required."
 
-    if "action_prob" not in user_data:
-        return False, "action_prob is required."
-    
-    if "state" not in user_data:
-        return False, "state is required."
+# Types of the values of a state. bool is a subclass of int but not a number
+# here, and is left out since the types are compared exactly.
+STATE_VALUE_TYPES = frozenset((int, float))
 
-    if "outcome" not in user_data:
-        return False, "outcome is required."
 
-    if "clicks" not in user_data["outcome"]:
-        return False, "Invalid outcome. Clicks is required."
+def check_states(states: list, batch: bool = False) -> tuple[bool, str]:
+    """
+    Check that every state is a list of finite numbers with the registered
+    state dimension. States are stored fixed-width, so this is checked up
+    front rather than when the row is written. Errors of a batch upload
+    name the row.
+    """
+    state_dim = get_state_dim("state")
+    for i, state in enumerate(states):
+        row = f"Row {i}: " if batch else ""
+        if not isinstance(state, list) or not set(map(type, state)) <= STATE_VALUE_TYPES:
+            return False, f"{row}state must be a list of numbers."
+        if state_dim is not None and len(state) != state_dim:
+            return False, f"{row}state must have dimension {state_dim}."
 
+    # The values of all states are converted at once. Integers too large
+    # for a float overflow.
+    try:
+        values = np.fromiter(itertools.chain.from_iterable(states), dtype=np.float64)
+    except OverflowError:
+        return False, "state values must be finite."
+    if not np.isfinite(values).all():
+        return False, "state values must be finite."
     return True, ""
 
 
@@ -99,8 +141,13 @@ def upload_data():
         state = user_data["state"]
         outcome = user_data["outcome"]
 
+        # Check the values and the dimension of the state
+        state_valid, error_message = check_states([state])
+        if not state_valid:
+            return jsonify({"status": "failed", "message": error_message}), 400
+
         # Get the RL algorithm
-        rl_algorithm = current_app.rl_algorithm
+        rl_algorithm = get_study().rl_algorithm
 
         # Create the reward based on the outcome
         status, reward = rl_algorithm.make_reward(user_id, state, action, outcome)
@@ -133,3 +180,111 @@ def upload_data():
         logging.error(f"[Upload Data] Error: {e}")
         logging.exception(e)
         return jsonify({"error": "Internal Server Error"}), 500
+
+
+@data_blueprint.route("/upload_data_batch", methods=["POST"])
+def upload_data_batch():
+    """
+    Uploads interaction data for several decisions at once, in columns: each
+    field of a single upload holds a list with one value per decision. The
+    rewards are created with a single batch call and all rows are inserted
+    in one transaction, or none are.
+    """
+    try:
+        data = request.get_json()
+
+        # Check the fields and the types of whole columns
+        fields_present, error_message = check_batch_fields(data)
+        if not fields_present:
+            return jsonify({"status": "failed", "message": error_message}), 400
+
+        user_ids = data["user_id"]
+        decision_idxs = data["decision_idx"]
+        request_timestamps = data["timestamp"]
+        user_data = data["data"]
+        contexts = user_data["context"]
+        actions = user_data["action"]
+        action_probs = user_data["action_prob"]
+        states = user_data["state"]
+        outcomes = user_data["outcome"]
+
+        if not user_ids:
+            return jsonify({"status": "failed", "message": "No data to upload."}), 400
+
+        # Check that all users exist
+        known_users = set(
+            db.session.scalars(
+                db.select(User.user_id).where(User.user_id.in_(set(user_ids)))
+            )
+        )
+        if len(known_users) != len(set(user_ids)):
+            return jsonify({"status": "failed", "message": "User not found."}), 404
+
+        # Check that no decision index is repeated or already exists
+        slots = set(zip(user_ids, decision_idxs))
+        existing = db.session.execute(
+            db.select(StudyData.user_id, StudyData.decision_idx).where(
+                StudyData.user_id.in_(known_users),
+                StudyData.decision_idx.in_(set(decision_idxs)),
+            )
+        ).all()
+        if len(slots) != len(user_ids) or slots.intersection(map(tuple, existing)):
+            return (
+                jsonify(
+                    {"status": "failed", "message": "Decision index already exists."}
+                ),
+                400,
+            )
+
+        # Check the values and the dimension of every state
+        states_valid, error_message = check_states(states, batch=True)
+        if not states_valid:
+            return jsonify({"status": "failed", "message": error_message}), 400
+
+        # Create the rewards of all rows at once
+        rl_algorithm = get_study().rl_algorithm
+        status, rewards = rl_algorithm.make_rewards(user_ids, states, actions, outcomes)
+        if not status.all():
+            return jsonify({"status": "failed", "message": "Reward creation failed."}), 400
+
+        # Rebuild the raw context and outcome of each row
+        context_rows = [dict(zip(contexts, values)) for values in zip(*contexts.values())]
+        outcome_rows = [dict(zip(outcomes, values)) for values in zip(*outcomes.values())]
+
+        created_at = datetime.datetime.now().isoformat()
+        rows = [
+            {
+                "user_id": user_ids[i],
+                "decision_idx": decision_idxs[i],
+                "action": actions[i],
+                "action_prob": action_probs[i],
+                "state": states[i],
+                "raw_context": context_rows[i] if context_rows else {},
+                "outcome": outcome_rows[i] if outcome_rows else {},
+                "reward": float(rewards[i]),
+                "request_timestamp": request_timestamps[i],
+                "created_at": created_at,
+            }
+            for i in range(len(user_ids))
+        ]
+        db.session.execute(db.insert(StudyData), rows)
+        db.session.commit()
+
+        logging.info(f"[Upload Data] Batch of {len(rows)} rows uploaded.")
+
+        return (
+            jsonify(
+                {
+                    "status": "success",
+                    "message": "Data uploaded successfully.",
+                    "count": len(rows),
+                }
+            ),
+            201,
+        )
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"[Upload Data] Error: {e}")
+        logging.exception(e)
+        return jsonify({"error": "Internal Server Error"}), 500
@@ -0,0 +1,286 @@
+import concurrent.futures
+import importlib.util
+import os
+import time
+from flask import Blueprint, current_app, jsonify
+from app.extensions import db
+from app.logging_config import logging_stats
+from app.routes.admin import check_admin_token
+from app.routes.update import running_updates
+
+health_blueprint = Blueprint("health", __name__)
+
+# Runs the database round trips, so a check stuck on an exhausted connection
+# pool can be abandoned after its time limit
+check_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="health-check"
+)
+
+# The running database check of each engine. A check that is still stuck is
+# waited on again instead of queueing another one behind it.
+database_checks = {}
+
+STARTED_AT = time.monotonic()
+
+
+def round_trip(engine) -> float:
+    """
+    Run a trivial query on a pooled connection and return the time taken,
+    in milliseconds, including the wait for the connection.
+    """
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        connection.execute(db.text("SELECT 1"))
+    return (time.perf_counter() - start) * 1000
+
+
+def check_database(name: str, engine, timeout_ms: float) -> dict:
+    """
+    Check that a database answers within `timeout_ms`.
+    """
+    future = database_checks.get(name)
+    if future is None or future.done():
+        future = database_checks[name] = check_executor.submit(round_trip, engine)
+    try:
+        latency_ms = future.result(timeout_ms / 1000)
+    except concurrent.futures.TimeoutError:
+        return {"ok": False, "message": f"No response within {timeout_ms} ms."}
+    except Exception as e:
+        return {"ok": False, "message": str(e)}
+    return {"ok": True, "latency_ms": round(latency_ms, 3)}
+
+
+def check_snapshots(snapshots, max_age_seconds: float) -> dict:
+    """
+    Check that there are model parameters and, if they are polled, that
+    they were refreshed within `max_age_seconds`.
+    """
+    stats = snapshots.stats()
+    ok = stats["version"] is not None
+    if snapshots.refresh_seconds and snapshots.pid == os.getpid():
+        since = stats["seconds_since_refresh"]
+        ok = ok and since is not None and since <= max_age_seconds
+    return {"ok": ok, **stats}
+
+
+def check_queue(stats: dict, max_fill: float) -> dict:
+    """
+    Check that a queue is at most `max_fill` full.
+    """
+    fill = stats["queued"] / stats["capacity"] if stats["capacity"] else 0.0
+    return {"ok": fill <= max_fill, "fill": round(fill, 3), **stats}
+
+
+def check_update_backlog(study, max_backlog: int) -> dict:
+    """
+    Check that at most `max_backlog` update requests of a study are waiting,
+    in its scheduler or in the queue of its update thread.
+    """
+    scheduler = getattr(study, "update_scheduler", None)
+    executor = getattr(study, "update_executor", None)
+    pending = scheduler.stats()["pending"] if scheduler is not None else 0
+    # ThreadPoolExecutor has no public queue length
+    queued = executor._work_queue.qsize() if executor is not None else 0
+    return {
+        "ok": pending + queued <= max_backlog,
+        "pending": pending,
+        "queued": queued,
+    }
+
+
+def active_backends() -> dict:
+    """
+    Return which of the optional libraries the worker uses: orjson for JSON,
+    Numba for the kernels of algorithms on the "auto" backend, SciPy for the
+    normal CDF and pyarrow for Arrow priors and partition archives.
+    """
+    from app import json_provider
+    from app.algorithms import kernels, probability
+
+    return {
+        "json": "orjson" if json_provider.orjson is not None else "json",
+        "kernels": "numba" if kernels.numba_available() else "numpy",
+        "normal_cdf": "scipy" if probability.ndtr is not None else "numpy",
+        "pyarrow": importlib.util.find_spec("pyarrow") is not None,
+    }
+
+
+def thread_alive(component) -> bool:
+    """
+    Whether the background thread of a component is running, or was never
+    started.
+    """
+    thread = getattr(component, "thread", None)
+    return thread is None or thread.is_alive()
+
+
+def studies_of(app) -> dict:
+    """
+    Return the default study, which is the app itself, and the further
+    studies, by study id.
+    """
+    return {"default": app, **getattr(app, "studies", {})}
+
+
+def liveness_checks(app) -> dict:
+    """
+    Check that the background threads are running and no update is hung.
+    """
+    components = {
+        "shadow_evaluator": getattr(app, "shadow_evaluator", None),
+        "action_writer": getattr(app, "action_writer", None),
+    }
+    for study_id, study in studies_of(app).items():
+        components[f"{study_id}.update_scheduler"] = getattr(
+            study, "update_scheduler", None
+        )
+    threads = {
+        name: thread_alive(component)
+        for name, component in components.items()
+        if component is not None
+    }
+
+    longest = max(
+        (time.monotonic() - start for start in list(running_updates.values())),
+        default=0.0,
+    )
+    max_update_seconds = app.config.get("HEALTH_MAX_UPDATE_SECONDS", 3600)
+    return {
+        "threads": {"ok": all(threads.values()), **threads},
+        "updates": {
+            "ok": longest <= max_update_seconds,
+            "running": len(running_updates),
+            "longest_seconds": round(longest, 3),
+        },
+    }
+
+
+def readiness_checks(app) -> dict:
+    """
+    Check that the worker can serve requests within its latency targets:
+    the databases answer in time, the parameter snapshots are fresh, the
+    queues have room and updates are not backing up. Each study with its own
+    database gets a check of its engine.
+    """
+    config = app.config
+    timeout_ms = config.get("HEALTH_DB_TIMEOUT_MS", 250)
+    checks = {
+        "initialized": {"ok": bool(app.initialized)},
+        "database": check_database("default", db.engine, timeout_ms),
+    }
+    if not app.initialized:
+        return checks
+
+    # Studies in a schema of the default database share its pool
+    checked = {db.engine.pool}
+    for study_id, study in getattr(app, "studies", {}).items():
+        engine = getattr(study, "engine", None)
+        if engine is not None and engine.pool not in checked:
+            checked.add(engine.pool)
+            checks[f"{study_id}.database"] = check_database(study_id, engine, timeout_ms)
+
+    max_age = config.get("HEALTH_MAX_SNAPSHOT_AGE_SECONDS", 30)
+    for study_id, study in studies_of(app).items():
+        checks[f"{study_id}.parameters"] = check_snapshots(
+            study.parameter_snapshots, max_age
+        )
+
+    max_backlog = config.get("HEALTH_MAX_UPDATE_BACKLOG", 10)
+    for study_id, study in studies_of(app).items():
+        checks[f"{study_id}.update_backlog"] = check_update_backlog(
+            study, max_backlog
+        )
+
+    max_fill = config.get("HEALTH_MAX_QUEUE_FILL", 0.8)
+    queues = {
+        "action_writer": getattr(app, "action_writer", None),
+        "shadow_evaluator": getattr(app, "shadow_evaluator", None),
+    }
+    for name, component in queues.items():
+        if component is not None:
+            checks[name] = check_queue(component.stats(), max_fill)
+
+    stats = logging_stats()
+    if stats is not None:
+        checks["logging"] = check_queue(stats, max_fill)
+    return checks
+
+
+def health_response(checks: dict):
+    """
+    Return the checks with a 200 if all passed, otherwise a 503.
+    """
+    ok = all(check["ok"] for check in checks.values())
+    return (
+        jsonify({"status": "ok" if ok else "failed", "checks": checks}),
+        200 if ok else 503,
+    )
+
+
+@health_blueprint.route("/healthz", methods=["GET"])
+def healthz():
+    """
+    Liveness: whether the worker should be restarted. Does not touch the
+    database.
+    """
+    return health_response(liveness_checks(current_app))
+
+
+@health_blueprint.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness: whether the worker should receive traffic.
+    """
+    app = current_app._get_current_object()
+    return health_response({**liveness_checks(app), **readiness_checks(app)})
+
+
+@health_blueprint.route("/debug/vars", methods=["GET"])
+def debug_vars():
+    """
+    Returns the counters of the worker's components. Requires the admin
+    token.
+    """
+    denied = check_admin_token()
+    if denied is not None:
+        return denied
+
+    app = current_app._get_current_object()
+    pool = db.engine.pool
+    components = {
+        "admission": getattr(app, "admission", None),
+        "shadow_evaluator": getattr(app, "shadow_evaluator", None),
+        "action_writer": getattr(app, "action_writer", None),
+    }
+    studies = {
+        study_id: {
+            "algorithm": study.rl_algorithm.version_string(),
+            "algorithm_stats": study.rl_algorithm.stats(),
+            "parameters": study.parameter_snapshots.stats(),
+            "action_cache": study.action_cache.stats(),
+            "update_scheduler": (
+                study.update_scheduler.stats()
+                if getattr(study, "update_scheduler", None) is not None
+                else None
+            ),
+        }
+        for study_id, study in studies_of(app).items()
+        if app.initialized
+    }
+    return jsonify(
+        {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.monotonic() - STARTED_AT, 3),
+            "initialized": app.initialized,
+            "startup": app.startup_profiler.report(app.config.get("STARTUP_TARGET_MS")),
+            "backends": active_backends(),
+            "database_pool": pool.status(),
+            "logging": logging_stats(),
+            "running_updates": len(running_updates),
+            "studies": studies,
+            **{
+                name: component.stats() if component is not None else None
+                for name, component in components.items()
+            },
+        }
+    )
@@ -1,18 +1,26 @@
 import datetime
 import logging
 import uuid
-import requests
 import shutil
 import os
 import csv
+import time
 from threading import Thread
-from flask import Blueprint, current_app, request, jsonify
+from flask import Blueprint, request, jsonify
 from app.models import ModelParameters, StudyData, ModelUpdateRequests, User, Action
 from app.algorithms.base import RLAlgorithm
 from app.extensions import db
+from app.batch import load_study_batch
+from app.precompute import precompute_actions
+from app.parameter_store import get_parameter_arrays, split_array_parameters
+from app.studies import get_study
 
 update_blueprint = Blueprint("update", __name__)
 
+# Start times of the updates running in this process, by update ID, read by
+# the health checks
+running_updates = {}
+
 
 def backup_tables(app):
     """
@@ -53,63 +61,214 @@ def backup_tables(app):
     return f"{backup_dir}.zip"
 
 
-def process_update_request(
-    app, update_id: str, rl_algorithm: RLAlgorithm, callback_url: str
+def send_callback(callback_url: str, payload: dict):
+    """
+    Send the update status to the callback URL, if there is one.
+    requests is imported here so it is only loaded once an update runs.
+    """
+    if not callback_url:
+        return
+
+    import requests
+
+    requests.post(callback_url, json=payload)
+
+
+def pending_study_data_ids() -> list:
+    """
+    Return the ids of the committed study data rows that no update has
+    consumed yet. Must be called inside an app context.
+    """
+    return db.session.scalars(
+        db.select(StudyData.id)
+        .where(StudyData.consumed_by.is_(None))
+        .order_by(StudyData.id)
+    ).all()
+
+
+def mark_consumed(ids, model_parameters_id: int, chunk_size: int = 10000):
+    """
+    Record that the study data rows `ids` were consumed by the update that
+    produced `model_parameters_id`, in the caller's transaction. Must be
+    called inside an app context.
+    """
+    ids = [int(i) for i in ids]
+    for start in range(0, len(ids), chunk_size):
+        db.session.execute(
+            db.update(StudyData)
+            .where(StudyData.id.in_(ids[start : start + chunk_size]))
+            .values(consumed_by=model_parameters_id)
+        )
+
+
+def finish_update_requests(
+    requests: list, status: str, payload: dict, error_message: str = None
 ):
     """
-    Process the update request.
+    Set the status of the update requests and send their callbacks. Must be
+    called inside an app context.
     """
-    try:
-        # Check if the database backup is enabled
+    completed_at = datetime.datetime.now().isoformat()
+    for update_id, callback_url in requests:
+        model_update_request = ModelUpdateRequests.query.filter_by(
+            update_id=update_id
+        ).first()
+        model_update_request.status = status
+        model_update_request.completed_at = completed_at
+        model_update_request.error_message = error_message
+    db.session.commit()
 
-        if app.config.get("BACKUP_DATABASE"):
-            backup_file = backup_tables(app)
-            app.logger.info("Database backed up to: %s", backup_file)
+    for update_id, callback_url in requests:
+        send_callback(callback_url, {**payload, "update_id": update_id})
 
+
+def process_update_request(
+    app,
+    update_id: str,
+    rl_algorithm: RLAlgorithm,
+    callback_url: str,
+    coalesced: list = None,
+):
+    """
+    Process the update request. `coalesced` lists further (update_id,
+    callback_url) pairs of requests that were debounced into this update;
+    they share its outcome. The update is skipped if no study data has
+    arrived since the current model parameters were computed.
+    """
+    requests = [(update_id, callback_url)] + list(coalesced or [])
+    running_updates[update_id] = time.monotonic()
+
+    try:
         with app.app_context():
             # Get the latest model parameters from the database
             current_params = ModelParameters.query.order_by(
                 ModelParameters.timestamp.desc()
             ).first()
 
-            # Get the data required for the update
-            # In this case, it is all the temperatures and the
-            # reward values from the study data
-            study_data = StudyData.query.all()
-            temperatures = [data.raw_context["temperature"] for data in study_data]
-            rewards = [data.reward for data in study_data]
+            # Skip the update cheaply if there is no new study data. Rows are
+            # new until an update has consumed them, whatever their id, so a
+            # row that commits after a row with a higher id is not missed.
+            pending = pending_study_data_ids()
+            if (
+                app.config.get("SKIP_NOOP_UPDATES", True)
+                and current_params.data_watermark is not None
+                and not pending
+            ):
+                finish_update_requests(
+                    requests,
+                    "skipped",
+                    {
+                        "status": "skipped",
+                        "message": "No new study data.",
+                        "timestamp": datetime.datetime.now().isoformat(),
+                    },
+                )
+                logging.info(f"[Update] Update ID: {update_id} skipped, no new data.")
+                return
+
+        # Check if the database backup is enabled
+        if app.config.get("BACKUP_DATABASE"):
+            backup_file = backup_tables(app)
+            app.logger.info("Database backed up to: %s", backup_file)
+
+        with app.app_context():
+            # Load the study data the update is computed from as column
+            # arrays read straight from the result set. Incremental
+            # algorithms only get the rows no update has consumed, and
+            # consume exactly the rows they read. Other algorithms refit on
+            # all rows and consume the pending rows, which they all read.
+            if rl_algorithm.incremental_updates:
+                batch = load_study_batch(pending_only=True)
+                consumed = batch.ids
+            else:
+                batch = load_study_batch()
+                consumed = pending
+
+            # The highest id read, recorded with the parameters and seeding
+            # the update
+            watermark = int(batch.ids.max()) if len(batch.ids) else 0
 
             # Update the model parameters
+            old_parameters = {
+                "probability_of_action": current_params.probability_of_action
+            }
+            old_parameters.update(get_parameter_arrays(app))
             status, new_parameters = rl_algorithm.update(
-                {"probability_of_action": current_params.probability_of_action},
-                {"temperatures": temperatures, "rewards": rewards},
+                old_parameters,
+                {
+                    "temperatures": batch.raw_contexts.field("temperature"),
+                    "rewards": batch.rewards,
+                    "states": batch.states,
+                    "batch": batch,
+                    # Map-reduce updates run their shards on this many
+                    # processes, seeded by the configured seed and the
+                    # watermark, so rerunning an update gives the same result
+                    "processes": app.config.get("UPDATE_PROCESSES", 1),
+                    "seed": (app.config.get("RL_ALGORITHM_SEED") or 0, watermark),
+                },
             )
 
             if not status:
                 raise Exception("Model update failed.")
 
-            # Add the new model parameters to the database
+            # Swap in the new parameter arrays, which every worker picks up
+            # on its next read of the parameter store
+            new_parameters, new_arrays = split_array_parameters(new_parameters)
+            if new_arrays:
+                if app.parameter_store is None:
+                    raise Exception(
+                        f"The update returned the array parameters {sorted(new_arrays)}, "
+                        "but PARAMETERS_DIR is not set."
+                    )
+                app.parameter_store.publish_all(new_arrays)
+
+            # Add the new model parameters to the database, along with the
+            # watermark of the data read, and mark the consumed rows in the
+            # same transaction. Rows that arrived during the update are still
+            # pending and trigger the next one.
             new_model_parameters = ModelParameters(
-                new_parameters["probability_of_action"]
+                new_parameters["probability_of_action"],
+                datetime.datetime.now().isoformat(),
+                data_watermark=watermark,
             )
 
             db.session.add(new_model_parameters)
+            db.session.flush()
+            mark_consumed(consumed, new_model_parameters.id)
             db.session.commit()
 
-            # Update the status of the request
-            model_update_request = ModelUpdateRequests.query.filter_by(
-                update_id=update_id
-            ).first()
-            model_update_request.status = "completed"
-            model_update_request.completed_at = datetime.datetime.now().isoformat()
-            db.session.commit()
-
-            # Send a callback to the callback URL
-            requests.post(
-                callback_url,
-                json={
+            # Swap the new version in for this worker's action requests.
+            # Other workers pick it up on their next poll.
+            snapshots = getattr(app, "parameter_snapshots", None)
+            if snapshots is not None:
+                snapshots.load()
+
+            # Create the upcoming partitions of partitioned tables. A failure
+            # here does not fail the update; the default partition takes the
+            # rows until the partitions exist.
+            try:
+                if app.config.get("PARTITIONED_TABLES"):
+                    from app.partitioning import ensure_configured_partitions
+
+                    ensure_configured_partitions(app)
+            except Exception as e:
+                logging.error(f"[Update] Partition maintenance failed: {e}")
+
+            # Generate the actions for the upcoming decision points
+            if app.config.get("PRECOMPUTE_ACTIONS"):
+                precompute_actions(
+                    rl_algorithm,
+                    new_model_parameters,
+                    app.config["PRECOMPUTE_HORIZON"],
+                    get_parameter_arrays(app),
+                )
+
+            # Update the status of the requests and send the callbacks
+            finish_update_requests(
+                requests,
+                "completed",
+                {
                     "status": "completed",
-                    "update_id": update_id,
                     "timestamp": datetime.datetime.now().isoformat(),
                 },
             )
@@ -122,29 +281,33 @@ def process_update_request(
             # Log the error
             logging.error(f"[Update] Error: {e}")
             logging.exception(e)
-
-            # Update the status of the request
-            model_update_request = ModelUpdateRequests.query.filter_by(
-                update_id=update_id
-            ).first()
-            model_update_request.status = "failed"
-            model_update_request.completed_at = datetime.datetime.now().isoformat()
-            model_update_request.error_message = str(e)
-            db.session.commit()
-
-            # Send a callback to the callback URL
-            requests.post(
-                callback_url,
-                json={
-                    "status": "failed",
-                    "update_id": update_id,
-                    "message": "Model update failed.",
-                },
+            db.session.rollback()
+
+            # Update the status of the requests and send the callbacks
+            finish_update_requests(
+                requests,
+                "failed",
+                {"status": "failed", "message": "Model update failed."},
+                str(e),
             )
 
             # Log the completion
             logging.info(f"[Update] Update ID: {update_id} failed.")
 
+    finally:
+        running_updates.pop(update_id, None)
+
+
+def process_and_release(release, *args):
+    """
+    Process the update request, then free the admission slot of the
+    request that started it.
+    """
+    try:
+        process_update_request(*args)
+    finally:
+        release()
+
 
 def check_fields(data: dict) -> tuple[bool, str]:
     """
@@ -176,8 +339,10 @@ def update_model():
         request_timestamp = data["timestamp"]
         callback_url = data["callback_url"]
 
-        # Get the RL algorithm
-        rl_algorithm = current_app.rl_algorithm
+        # Get the study of the request, or the app for the default study,
+        # and its RL algorithm
+        study = get_study()
+        rl_algorithm = study.rl_algorithm
 
         # Generate a unique update ID for the request
         update_id = str(uuid.uuid4())
@@ -185,18 +350,40 @@ def update_model():
 
         # Add the update request to the database
         model_update_request = ModelUpdateRequests(
-            update_id, callback_url, request_timestamp
+            update_id,
+            callback_url,
+            request_timestamp,
+            created_at=datetime.datetime.now().isoformat(),
+            trigger_reason="request",
         )
         db.session.add(model_update_request)
         db.session.commit()
 
-        # Process the update request in a separate thread
-        app = current_app._get_current_object()  # Get the actual app object
-        thread = Thread(
-            target=process_update_request,
-            args=(app, update_id, rl_algorithm, callback_url),
-        )
-        thread.start()
+        # Hand the request to the scheduler if requests are debounced, or to
+        # the study's update queue, otherwise process it in a separate thread.
+        # Updates that start right away keep the request's admission slot
+        # until they finish.
+        from app.admission import detach_admission
+
+        scheduler = getattr(study, "update_scheduler", None)
+        update_executor = getattr(study, "update_executor", None)
+        if scheduler is not None and scheduler.debounce_seconds > 0:
+            scheduler.submit(update_id, callback_url)
+        elif update_executor is not None:
+            update_executor.submit(
+                process_and_release,
+                detach_admission(),
+                study,
+                update_id,
+                rl_algorithm,
+                callback_url,
+            )
+        else:
+            thread = Thread(
+                target=process_and_release,
+                args=(detach_admission(), study, update_id, rl_algorithm, callback_url),
+            )
+            thread.start()
 
         return jsonify({"status": "processing", "update_id": update_id}), 202
 
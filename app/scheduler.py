@@ -0,0 +1,331 @@
+import datetime
+import logging
+import threading
+import time
+import uuid
+from app.extensions import db
+from app.models import ModelUpdateRequests, StudyData
+
+# Ranges of the fields of a cron expression
+CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 6),
+)
+
+
+def _parse_cron_field(text: str, low: int, high: int) -> frozenset:
+    """
+    Parse one field of a cron expression: "*", "*/n", "a", "a-b", "a-b/n"
+    or a comma-separated list of those.
+    """
+    values = set()
+    for part in text.split(","):
+        expression, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if expression == "*":
+            start, end = low, high
+        elif "-" in expression:
+            start, end = (int(value) for value in expression.split("-"))
+        else:
+            start = end = int(expression)
+        if start < low or end > high or start > end or step <= 0:
+            raise ValueError(f"Invalid cron field: {text}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """
+    A five-field cron expression, "minute hour day month weekday", e.g.
+    "0 3 * * *" for 3am every day or "*/30 * * * 1-5" for every half hour on
+    weekdays. Weekdays are 0-6 starting on Sunday. As in cron, when both the
+    day and the weekday are restricted, a time matches either of them.
+    """
+
+    def __init__(self, expression: str):
+        """
+        Parse the expression.
+        """
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"A cron expression has 5 fields: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_cron_field(field, low, high)
+            for field, (_, low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _matches_day(self, moment: datetime.datetime) -> bool:
+        """
+        Whether the date of `moment` matches the day, month and weekday.
+        """
+        if moment.month not in self.months:
+            return False
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime.datetime) -> datetime.datetime:
+        """
+        Return the first matching minute after `moment`.
+        """
+        candidate = moment.replace(second=0, microsecond=0) + datetime.timedelta(
+            minutes=1
+        )
+        # Skip whole days and hours that cannot match; five years covers
+        # every valid expression, including February 29
+        limit = candidate + datetime.timedelta(days=366 * 5)
+        while candidate < limit:
+            if not self._matches_day(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + datetime.timedelta(
+                    days=1
+                )
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + datetime.timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += datetime.timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"The cron expression never matches: {self.expression}")
+
+
+class UpdateScheduler:
+    """
+    Triggers model updates from a background thread:
+
+    - Update requests are debounced: requests arriving within
+      `debounce_seconds` of each other are coalesced into one update, which
+      starts once the requests stop, or `max_wait_seconds` after the first.
+    - With a cron `schedule`, an update is triggered at each matching time.
+    - With `min_new_rows`, an update is triggered once that many study data
+      rows have arrived since the current model parameters, checked every
+      `poll_seconds`.
+
+    Updates run one at a time in the scheduler thread. Updates without new
+    study data are skipped by process_update_request.
+    """
+
+    def __init__(
+        self,
+        app,
+        debounce_seconds: float = 0,
+        max_wait_seconds: float = 300,
+        schedule: str = None,
+        min_new_rows: int = None,
+        poll_seconds: float = 60,
+        callback_url: str = None,
+    ):
+        """
+        Initialize the scheduler. Call start() to start its thread.
+        `callback_url` receives the callbacks of scheduled and
+        threshold-triggered updates.
+        """
+        self.app = app
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.schedule = CronSchedule(schedule) if schedule else None
+        self.min_new_rows = min_new_rows
+        self.poll_seconds = poll_seconds
+        self.callback_url = callback_url or ""
+
+        self.pending = []
+        self.first_pending_at = None
+        self.deadline = None
+        self.next_scheduled = (
+            self.schedule.next_after(datetime.datetime.now()) if self.schedule else None
+        )
+        self.next_poll = time.monotonic() + poll_seconds
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+        # Counters, read by the diagnostics endpoints
+        self.triggered = {"request": 0, "schedule": 0, "data_threshold": 0}
+        self.coalesced = 0
+
+    def start(self):
+        """
+        Start the scheduler thread.
+        """
+        self.thread = threading.Thread(
+            target=self._run, name="update-scheduler", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the scheduler thread after the running update, if any.
+        """
+        if self.thread is not None:
+            self.stopping.set()
+            self.wake.set()
+            self.thread.join(timeout)
+            self.thread = None
+
+    def submit(self, update_id: str, callback_url: str):
+        """
+        Queue an update request that was already recorded in the database.
+        It runs together with the requests that arrive within the debounce
+        window.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if not self.pending:
+                self.first_pending_at = now
+            else:
+                self.coalesced += 1
+            self.pending.append((update_id, callback_url))
+            self.deadline = min(
+                now + self.debounce_seconds,
+                self.first_pending_at + self.max_wait_seconds,
+            )
+        self.wake.set()
+
+    def stats(self) -> dict:
+        """
+        Return the trigger counters and the number of pending requests.
+        """
+        return {
+            "pending": len(self.pending),
+            "triggered": dict(self.triggered),
+            "coalesced": self.coalesced,
+            "next_scheduled": (
+                self.next_scheduled.isoformat() if self.next_scheduled else None
+            ),
+        }
+
+    def _seconds_to_wake(self) -> float:
+        """
+        Return the time until the next debounce deadline, scheduled update or
+        poll.
+        """
+        now = time.monotonic()
+        times = []
+        if self.pending:
+            times.append(self.deadline - now)
+        if self.next_scheduled is not None:
+            times.append(
+                (self.next_scheduled - datetime.datetime.now()).total_seconds()
+            )
+        if self.min_new_rows:
+            times.append(self.next_poll - now)
+        return max(min(times), 0) if times else None
+
+    def _run(self):
+        """
+        Wait for the next trigger and run updates until stopped.
+        """
+        while not self.stopping.is_set():
+            self.wake.wait(self._seconds_to_wake())
+            self.wake.clear()
+            if self.stopping.is_set():
+                break
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"[Scheduler] Error: {e}")
+                logging.exception(e)
+
+    def new_rows(self) -> int:
+        """
+        Return the number of study data rows that no update has consumed
+        yet. Must be called inside an app context.
+        """
+        return db.session.scalar(
+            db.select(db.func.count(StudyData.id)).where(StudyData.consumed_by.is_(None))
+        )
+
+    def _record_request(self, reason: str) -> tuple[str, str]:
+        """
+        Record a triggered update in the database. Must be called inside an
+        app context.
+        """
+        update_id = str(uuid.uuid4())
+        now = datetime.datetime.now().isoformat()
+        db.session.add(
+            ModelUpdateRequests(
+                update_id,
+                self.callback_url,
+                now,
+                created_at=now,
+                trigger_reason=reason,
+            )
+        )
+        db.session.commit()
+        return update_id, self.callback_url
+
+    def tick(self) -> str:
+        """
+        Run an update if a trigger is due. Returns the trigger reason, or
+        None if no update ran.
+        """
+        from app.routes.update import process_update_request
+
+        reason = None
+        requests = []
+        with self.lock:
+            if self.pending and time.monotonic() >= self.deadline:
+                requests, self.pending = self.pending, []
+                reason = "request"
+
+        with self.app.app_context():
+            if reason is None and self.next_scheduled is not None:
+                if datetime.datetime.now() >= self.next_scheduled:
+                    self.next_scheduled = self.schedule.next_after(
+                        datetime.datetime.now()
+                    )
+                    reason = "schedule"
+
+            if reason is None and self.min_new_rows:
+                if time.monotonic() >= self.next_poll:
+                    self.next_poll = time.monotonic() + self.poll_seconds
+                    if self.new_rows() >= self.min_new_rows:
+                        reason = "data_threshold"
+
+            if reason is None:
+                return None
+            if not requests:
+                requests = [self._record_request(reason)]
+
+        self.triggered[reason] += 1
+        logging.info(
+            f"[Scheduler] Running update for {len(requests)} requests ({reason})."
+        )
+        (update_id, callback_url), coalesced = requests[0], requests[1:]
+        process_update_request(
+            self.app, update_id, self.app.rl_algorithm, callback_url, coalesced
+        )
+        return reason
+
+
+def initialize_scheduler(app) -> UpdateScheduler:
+    """
+    Create and start the update scheduler if debouncing, a schedule or a
+    data threshold is configured, or return None.
+    """
+    debounce = app.config.get("UPDATE_DEBOUNCE_SECONDS", 0)
+    schedule = app.config.get("UPDATE_SCHEDULE")
+    min_new_rows = app.config.get("UPDATE_MIN_NEW_ROWS")
+    if not (debounce or schedule or min_new_rows):
+        return None
+
+    scheduler = UpdateScheduler(
+        app,
+        debounce_seconds=debounce,
+        max_wait_seconds=app.config.get("UPDATE_DEBOUNCE_MAX_SECONDS", 300),
+        schedule=schedule,
+        min_new_rows=min_new_rows,
+        poll_seconds=app.config.get("UPDATE_POLL_SECONDS", 60),
+        callback_url=app.config.get("UPDATE_CALLBACK_URL"),
+    )
+    scheduler.start()
+    return scheduler
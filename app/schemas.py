@@ -0,0 +1,227 @@
+import datetime
+import itertools
+
+# Names of types in the default error messages
+TYPE_NAMES = {
+    str: "a string",
+    int: "an integer",
+    float: "a float",
+    bool: "a boolean",
+    dict: "a dictionary",
+    list: "a list",
+    datetime.datetime: "a datetime object",
+}
+
+
+class Field:
+    """
+    A field of a request schema. `types` is a type or a tuple of types the
+    value must be an instance of, or None to accept any value. A nested
+    `schema` validates the fields of a dictionary value. The error messages
+    default to "<name> is required." and "<name> must be <types>.".
+    """
+
+    def __init__(
+        self,
+        types=None,
+        required: bool = True,
+        missing: str = None,
+        invalid: str = None,
+        schema=None,
+    ):
+        """
+        Initialize the field.
+        """
+        if isinstance(types, type):
+            types = (types,)
+        self.types = tuple(types) if types else None
+        self.required = required
+        self.missing = missing
+        self.invalid = invalid
+        self.schema = Schema(schema) if isinstance(schema, dict) else schema
+
+    def messages(self, name: str, parent: str = None) -> tuple[str, str]:
+        """
+        Return the messages for a missing and an invalid value. Fields of a
+        named schema are reported as "Invalid <schema>. <Name> is required."
+        """
+        missing = self.missing
+        if missing is None:
+            if parent:
+                missing = f"Invalid {parent}. {name.capitalize()} is required."
+            else:
+                missing = f"{name} is required."
+
+        invalid = self.invalid
+        if invalid is None and self.types:
+            names = " or ".join(TYPE_NAMES.get(t, t.__name__) for t in self.types)
+            invalid = f"{name} must be {names}."
+        return missing, invalid
+
+
+class Schema:
+    """
+    A declarative request schema: an ordered mapping from field names to
+    Fields. The schema is compiled once into straight-line Python code, so
+    a request is checked in a single pass with no interpretation of the
+    schema, and the cost of validation does not depend on how it is nested.
+
+    validate(data) checks a single payload. validate_columns(data) checks a
+    batch payload of the same shape in which every leaf is a list holding
+    one value per row. Both return (True, "") or (False, error message).
+    """
+
+    def __init__(self, fields: dict, name: str = None):
+        """
+        Initialize and compile the schema. `name` is used in the messages of
+        the fields, e.g. "context" for "Invalid context. Temperature is
+        required."
+        """
+        self.fields = dict(fields)
+        self.name = name
+        self.source, self.validate = compile_validator(self)
+        self.column_source, self.validate_columns = compile_column_validator(self)
+
+    def __repr__(self):
+        """
+        Return a string representation of the Schema object.
+        """
+        return f"<Schema name={self.name} fields={list(self.fields)}>"
+
+
+def _compile(name: str, lines: list, namespace: dict):
+    """
+    Compile the generated function `name` from its lines.
+    """
+    source = "\n".join(lines) + "\n"
+    exec(compile(source, f"<schema {name}>", "exec"), namespace)
+    return source, namespace[name]
+
+
+def _emit(schema: Schema, var: str, depth: int, lines: list, namespace: dict, ids):
+    """
+    Append the checks of a single payload, in field order.
+    """
+    pad = "    " * depth
+    for name, field in schema.fields.items():
+        missing, invalid = field.messages(name, schema.name)
+        value = f"v{next(ids)}"
+
+        if field.required:
+            lines.append(f"{pad}if {name!r} not in {var}:")
+            lines.append(f"{pad}    return False, {missing!r}")
+            inner = pad
+        else:
+            lines.append(f"{pad}if {name!r} in {var}:")
+            inner = pad + "    "
+        lines.append(f"{inner}{value} = {var}[{name!r}]")
+
+        if field.types:
+            types = f"T{len(namespace)}"
+            namespace[types] = field.types
+            lines.append(f"{inner}if not isinstance({value}, {types}):")
+            lines.append(f"{inner}    return False, {invalid!r}")
+
+        if field.schema is not None:
+            # A value that is not a dictionary has none of the nested fields
+            lines.append(f"{inner}if not isinstance({value}, dict):")
+            lines.append(f"{inner}    {value} = {{}}")
+            _emit(field.schema, value, len(inner) // 4, lines, namespace, ids)
+
+
+def compile_validator(schema: Schema):
+    """
+    Generate and compile the single payload validator of a schema. Return
+    its source and the function.
+    """
+    namespace = {}
+    lines = [
+        "def validate(data):",
+        "    if not isinstance(data, dict):",
+        "        data = {}",
+    ]
+    _emit(schema, "data", 1, lines, namespace, itertools.count())
+    lines.append('    return True, ""')
+    return _compile("validate", lines, namespace)
+
+
+def _emit_columns(
+    schema: Schema, var: str, depth: int, lines: list, namespace: dict, ids
+):
+    """
+    Append the checks of a batch payload. Every leaf must be a list with one
+    value per row; the types are checked over whole columns at once.
+    """
+    pad = "    " * depth
+    for name, field in schema.fields.items():
+        missing, invalid = field.messages(name, schema.name)
+        value = f"v{next(ids)}"
+
+        if field.required:
+            lines.append(f"{pad}if {name!r} not in {var}:")
+            lines.append(f"{pad}    return False, {missing!r}")
+            inner = pad
+        else:
+            lines.append(f"{pad}if {name!r} in {var}:")
+            inner = pad + "    "
+        lines.append(f"{inner}{value} = {var}[{name!r}]")
+
+        if field.schema is not None:
+            message = f"{name} must be a dictionary of columns."
+            lines.append(f"{inner}if not isinstance({value}, dict):")
+            lines.append(f"{inner}    return False, {message!r}")
+            _emit_columns(field.schema, value, len(inner) // 4, lines, namespace, ids)
+            continue
+
+        message = f"{name} must be a list of values."
+        lines.append(f"{inner}if not isinstance({value}, list):")
+        lines.append(f"{inner}    return False, {message!r}")
+        lines.append(f"{inner}if n < 0:")
+        lines.append(f"{inner}    n = len({value})")
+        lines.append(f"{inner}elif len({value}) != n:")
+        lines.append(f"{inner}    return False, f{name + ' must have {n} values.'!r}")
+
+        if field.types:
+            # Compare the exact types of the column first, which runs in C,
+            # and only look for the failing row if a type is not listed
+            types = f"T{len(namespace)}"
+            namespace[types] = field.types
+            namespace[f"{types}_exact"] = frozenset(field.types)
+            lines.append(f"{inner}if not set(map(type, {value})) <= {types}_exact:")
+            lines.append(f"{inner}    for i, x in enumerate({value}):")
+            lines.append(f"{inner}        if not isinstance(x, {types}):")
+            lines.append(
+                f"{inner}            return False, f'Row {{i}}: ' + {invalid!r}"
+            )
+
+
+def compile_column_validator(schema: Schema):
+    """
+    Generate and compile the batch payload validator of a schema. Return its
+    source and the function.
+    """
+    namespace = {}
+    lines = [
+        "def validate_columns(data):",
+        "    if not isinstance(data, dict):",
+        "        data = {}",
+        "    n = -1",
+    ]
+    _emit_columns(schema, "data", 1, lines, namespace, itertools.count())
+    lines.append('    return True, ""')
+    return _compile("validate_columns", lines, namespace)
+
+
+def algorithm_schema(attribute: str) -> Schema:
+    """
+    Return the context_schema or outcome_schema of the algorithm serving
+    the current study. Outside of an app, the schema of the default
+    algorithm is returned.
+    """
+    from flask import has_app_context
+    from app.algorithms.registry import get_algorithm_class
+    from app.studies import get_study
+
+    if has_app_context() and getattr(get_study(), "rl_algorithm", None) is not None:
+        return getattr(get_study().rl_algorithm, attribute)
+    return getattr(get_algorithm_class("flat_prob"), attribute)
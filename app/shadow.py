@@ -0,0 +1,187 @@
+import datetime
+import logging
+import queue
+import threading
+from app.extensions import db
+from app.models import ShadowAction
+from app.algorithms.base import RLAlgorithm
+
+
+class ShadowEvaluator:
+    """
+    Runs a candidate algorithm on live action requests without affecting
+    participants. Requests are handed over through a bounded queue and
+    processed in batches by a background thread, which stores the shadow
+    decisions in the shadow_actions table. When the queue is full, new
+    requests are dropped instead of slowing down the primary response.
+    """
+
+    def __init__(
+        self, app, algorithm: RLAlgorithm, queue_size: int = 1000, batch_size: int = 100
+    ):
+        """
+        Initialize the evaluator. Call start() to start the worker thread.
+        """
+        self.app = app
+        self.algorithm = algorithm
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+
+        # Counters, read by the diagnostics endpoints
+        self.submitted = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        """
+        Start the worker thread.
+        """
+        self.thread = threading.Thread(
+            target=self._run, name="shadow-evaluator", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the worker thread once the queued requests are processed.
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def submit(
+        self,
+        user_id: str,
+        decision_idx: int,
+        context: dict,
+        parameters: dict,
+        model_parameters_id: int,
+        primary_action: int,
+    ) -> bool:
+        """
+        Queue an action request for the shadow algorithm without blocking.
+        Return False if the request was dropped because the queue is full.
+        """
+        try:
+            self.queue.put_nowait(
+                (
+                    user_id,
+                    decision_idx,
+                    context,
+                    parameters,
+                    model_parameters_id,
+                    primary_action,
+                )
+            )
+            self.submitted += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stats(self) -> dict:
+        """
+        Return the counters and the current queue length.
+        """
+        return {
+            "algorithm": self.algorithm.version_string(),
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+    def _next_batch(self) -> tuple[list, bool]:
+        """
+        Block for the next request, then drain up to batch_size requests
+        without waiting. Return the batch and whether stop was requested.
+        """
+        item = self.queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        """
+        Process queued requests in batches until stopped.
+        """
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            try:
+                with self.app.app_context():
+                    self.processed += self.process(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logging.error(f"[Shadow] Error: {e}")
+                logging.exception(e)
+
+    def process(self, batch: list) -> int:
+        """
+        Compute the shadow decisions for a batch of requests and store them.
+        Must be called inside an app context. Returns the number of stored
+        decisions.
+        """
+        algorithm = self.algorithm
+        version = algorithm.version_string()
+        created_at = datetime.datetime.now()
+        rows = []
+
+        # Requests made with different model parameters are computed separately
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[4], []).append(item)
+
+        for model_parameters_id, items in groups.items():
+            user_ids, decision_idxs, contexts, parameters, _, primary_actions = zip(
+                *items
+            )
+            status, states = algorithm.make_states(list(contexts))
+            if not status.any():
+                self.failed += len(items)
+                continue
+
+            keep = status.nonzero()[0]
+            actions, probs, _ = algorithm.get_actions(
+                [user_ids[i] for i in keep],
+                states[keep],
+                algorithm.action_parameters(parameters[0]),
+                [decision_idxs[i] for i in keep],
+            )
+            self.failed += len(items) - len(keep)
+
+            for i, action, prob in zip(keep, actions, probs):
+                rows.append(
+                    {
+                        "user_id": user_ids[i],
+                        "decision_idx": decision_idxs[i],
+                        "algorithm_version": version,
+                        "action": int(action),
+                        "action_prob": float(prob),
+                        "primary_action": int(primary_actions[i]),
+                        "model_parameters_id": model_parameters_id,
+                        "created_at": created_at,
+                    }
+                )
+
+        if rows:
+            db.session.execute(db.insert(ShadowAction), rows)
+            db.session.commit()
+        return len(rows)
@@ -0,0 +1,293 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from app.algorithms.base import RLAlgorithm
+from app.batch import JSONColumn, StudyBatch
+from app.logging_config import get_rl_logger
+
+
+class SimulationError(Exception):
+    """
+    Raised when the algorithm fails during a simulation.
+    """
+
+
+class TemperatureClicksEnvironment:
+    """
+    Synthetic environment for the reference scenario. Each user has a mean
+    temperature and the context at every decision is a noisy draw around it.
+    Sending a prompt (action 1) increases the expected number of clicks when
+    it is cold and decreases it when it is hot. Clicks are Poisson.
+    """
+
+    def __init__(
+        self,
+        base_clicks: float = 2.0,
+        cold_effect: float = 1.0,
+        hot_effect: float = -0.5,
+        threshold: float = 30.0,
+        temperature_mean: float = 28.0,
+        temperature_sd: float = 5.0,
+    ):
+        """
+        Initialize the environment parameters.
+        """
+        self.base_clicks = base_clicks
+        self.cold_effect = cold_effect
+        self.hot_effect = hot_effect
+        self.threshold = threshold
+        self.temperature_mean = temperature_mean
+        self.temperature_sd = temperature_sd
+
+    def init_users(self, rng: np.random.Generator, n_users: int) -> dict:
+        """
+        Draw the per-user characteristics of a cohort as column arrays.
+        """
+        return {
+            "mean_temperature": rng.normal(
+                self.temperature_mean, self.temperature_sd, n_users
+            )
+        }
+
+    def contexts(
+        self, rng: np.random.Generator, users: dict, decision_idx: int
+    ) -> dict:
+        """
+        Draw the contexts of all users at a decision point as column arrays.
+        """
+        mean_temperature = users["mean_temperature"]
+        return {"temperature": rng.normal(mean_temperature, 2.0)}
+
+    def expected_clicks(self, contexts: dict, actions: np.ndarray) -> np.ndarray:
+        """
+        Return the expected number of clicks for each user and action.
+        """
+        effect = np.where(
+            contexts["temperature"] < self.threshold, self.cold_effect, self.hot_effect
+        )
+        return self.base_clicks + effect * actions
+
+    def outcomes(
+        self, rng: np.random.Generator, contexts: dict, actions: np.ndarray
+    ) -> dict:
+        """
+        Draw the outcomes of the chosen actions as column arrays.
+        """
+        return {"clicks": rng.poisson(self.expected_clicks(contexts, actions))}
+
+    def regret(self, contexts: dict, actions: np.ndarray) -> float:
+        """
+        Return the total expected regret of the chosen actions against the
+        best action for each context.
+        """
+        n = len(actions)
+        best = np.maximum(
+            self.expected_clicks(contexts, np.zeros(n)),
+            self.expected_clicks(contexts, np.ones(n)),
+        )
+        return float(np.sum(best - self.expected_clicks(contexts, actions)))
+
+    def update_data(self, history: dict, user_ids: np.ndarray, first_id: int = 1) -> dict:
+        """
+        Build the data passed to RLAlgorithm.update, in the same format as
+        the update endpoint, with the rows of `history` numbered from
+        `first_id`. The JSON columns of the batch are empty objects; the
+        temperatures are passed as column arrays.
+        """
+        n = len(history["reward"])
+        batch = StudyBatch(
+            np.arange(first_id, first_id + n, dtype=np.int64),
+            user_ids,
+            history["user_code"].astype(np.int32),
+            history["decision_idx"].astype(np.int32),
+            history["action"].astype(np.int32),
+            history["action_prob"].astype(np.float64),
+            history["reward"].astype(np.float64),
+            history["state"].astype(np.float32),
+            JSONColumn(b"{}" * n, np.arange(n + 1, dtype=np.int64) * 2),
+            JSONColumn(b"{}" * n, np.arange(n + 1, dtype=np.int64) * 2),
+        )
+        return {
+            "temperatures": history["temperature"],
+            "rewards": history["reward"],
+            "states": history["state"],
+            "batch": batch,
+        }
+
+
+def simulate_replicate(
+    algorithm_class: type,
+    priors: dict,
+    n_users: int,
+    n_decisions: int,
+    update_every: int,
+    seed,
+    algorithm_kwargs: dict = None,
+    environment: TemperatureClicksEnvironment = None,
+) -> dict:
+    """
+    Run one simulated study of `n_users` users for `n_decisions` decision
+    points, updating the algorithm every `update_every` decision points.
+    The cohort is held as NumPy arrays and the algorithm is driven through
+    the batch methods of the RLAlgorithm interface, without HTTP or a
+    database. `seed` is an int
+    or a np.random.SeedSequence; equal seeds give identical results.
+    """
+    environment = environment or TemperatureClicksEnvironment()
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    environment_seed, algorithm_seed = seed.spawn(2)
+
+    rng = np.random.default_rng(environment_seed)
+    algorithm = algorithm_class(
+        seed=int(algorithm_seed.generate_state(1)[0]), **(algorithm_kwargs or {})
+    )
+
+    # Per-decision logging would dominate the run time
+    algorithm.logger = get_rl_logger(quiet=True)
+
+    user_ids = np.array([f"sim_user_{i}" for i in range(n_users)])
+    users = environment.init_users(rng, n_users)
+    parameters = dict(priors)
+    action_parameters = algorithm.action_parameters(parameters)
+
+    history = {
+        "temperature": [],
+        "state": [],
+        "action": [],
+        "action_prob": [],
+        "reward": [],
+        "user_code": [],
+        "decision_idx": [],
+    }
+    # Incremental algorithms are only given the rows since their last update
+    first_update_row = 0
+    total_reward = 0.0
+    total_regret = 0.0
+    n_updates = 0
+
+    start = time.perf_counter()
+    for decision_idx in range(n_decisions):
+        contexts = environment.contexts(rng, users, decision_idx)
+        status, states = algorithm.make_states(contexts)
+        if not np.all(status):
+            raise SimulationError(f"make_states failed at decision {decision_idx}.")
+
+        actions, probs, _ = algorithm.get_actions(
+            user_ids, states, action_parameters, np.full(n_users, decision_idx)
+        )
+        outcomes = environment.outcomes(rng, contexts, actions)
+
+        status, rewards = algorithm.make_rewards(user_ids, states, actions, outcomes)
+        if not np.all(status):
+            raise SimulationError(f"make_rewards failed at decision {decision_idx}.")
+
+        total_reward += float(np.sum(rewards))
+        total_regret += environment.regret(contexts, actions)
+
+        history["temperature"].append(contexts["temperature"])
+        history["state"].append(states)
+        history["action"].append(actions)
+        history["action_prob"].append(probs)
+        history["reward"].append(rewards)
+        history["user_code"].append(np.arange(n_users))
+        history["decision_idx"].append(np.full(n_users, decision_idx))
+
+        if (decision_idx + 1) % update_every == 0:
+            first_row = first_update_row if algorithm.incremental_updates else 0
+            data = environment.update_data(
+                {name: np.concatenate(values[first_row:]) for name, values in history.items()},
+                user_ids,
+                first_row * n_users + 1,
+            )
+            first_update_row = decision_idx + 1
+            status, new_parameters = algorithm.update(parameters, data)
+            if not status:
+                raise SimulationError(f"Update failed at decision {decision_idx}.")
+            parameters = new_parameters
+            action_parameters = algorithm.action_parameters(parameters)
+            n_updates += 1
+
+    elapsed = time.perf_counter() - start
+    n_total = n_users * n_decisions
+
+    return {
+        "decisions": n_total,
+        "updates": n_updates,
+        "seconds": elapsed,
+        "throughput": n_total / elapsed if elapsed > 0 else float("inf"),
+        "mean_reward": total_reward / n_total,
+        "regret": total_regret,
+        "regret_per_decision": total_regret / n_total,
+        "final_parameters": {
+            name: value.tolist() if isinstance(value, np.ndarray) else value
+            for name, value in parameters.items()
+        },
+    }
+
+
+def run_simulation(
+    algorithm_class: type,
+    priors: dict,
+    n_users: int,
+    n_decisions: int,
+    update_every: int,
+    n_replicates: int = 1,
+    processes: int = 1,
+    seed: int = 0,
+    algorithm_kwargs: dict = None,
+    environment: TemperatureClicksEnvironment = None,
+) -> dict:
+    """
+    Run independent replicates of a simulated study, in parallel across a
+    process pool when `processes` > 1. Each replicate gets its own child of
+    np.random.SeedSequence(seed), so results do not depend on the number of
+    processes. Returns the per-replicate results and a summary with the
+    overall throughput and the mean and standard deviation of the regret.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(n_replicates)
+    args = [
+        (
+            algorithm_class,
+            priors,
+            n_users,
+            n_decisions,
+            update_every,
+            replicate_seed,
+            algorithm_kwargs,
+            environment,
+        )
+        for replicate_seed in seeds
+    ]
+
+    start = time.perf_counter()
+    if processes > 1:
+        # Workers are spawned rather than forked, as in the map-reduce
+        # updates, since the API process runs other threads
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            replicates = list(executor.map(simulate_replicate, *zip(*args)))
+    else:
+        replicates = [simulate_replicate(*replicate_args) for replicate_args in args]
+    elapsed = time.perf_counter() - start
+
+    regrets = np.array([replicate["regret"] for replicate in replicates])
+    total_decisions = sum(replicate["decisions"] for replicate in replicates)
+
+    return {
+        "replicates": replicates,
+        "summary": {
+            "replicates": n_replicates,
+            "processes": processes,
+            "decisions": total_decisions,
+            "seconds": elapsed,
+            "throughput": total_decisions / elapsed if elapsed > 0 else float("inf"),
+            "mean_reward": float(
+                np.mean([replicate["mean_reward"] for replicate in replicates])
+            ),
+            "mean_regret": float(np.mean(regrets)),
+            "sd_regret": float(np.std(regrets, ddof=1)) if n_replicates > 1 else 0.0,
+        },
+    }
@@ -0,0 +1,191 @@
+import datetime
+import logging
+import os
+import threading
+from types import MappingProxyType
+from app.models import ModelParameters
+from app.parameter_store import get_parameter_arrays
+from app.algorithms.base import RLAlgorithm
+
+
+class ParameterSnapshot:
+    """
+    An immutable version of the model parameters: the ModelParameters row
+    with its id as the version, the data watermark it was trained on, the
+    shared parameter arrays, and the action parameters derived from them by
+    one algorithm version. Request handlers read a snapshot once and use it
+    for the whole request, so they never see a mix of two versions.
+    """
+
+    __slots__ = (
+        "version",
+        "data_watermark",
+        "algorithm_version",
+        "parameters",
+        "action_parameters",
+        "loaded_at",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        data_watermark: int,
+        parameters: dict,
+        algorithm: RLAlgorithm,
+    ):
+        """
+        Initialize the snapshot and derive the algorithm's action parameters.
+        """
+        self.version = version
+        self.data_watermark = data_watermark
+        self.parameters = MappingProxyType(dict(parameters))
+        self.algorithm_version = algorithm.version_string()
+        self.action_parameters = algorithm.action_parameters(self.parameters)
+        self.loaded_at = datetime.datetime.now()
+
+    def for_algorithm(self, algorithm: RLAlgorithm):
+        """
+        Return a snapshot of the same parameters for another algorithm, e.g.
+        after a hot swap. Does not touch the database.
+        """
+        return ParameterSnapshot(
+            self.version, self.data_watermark, self.parameters, algorithm
+        )
+
+    def __repr__(self):
+        """
+        Return a string representation of the ParameterSnapshot object.
+        """
+        return f"<ParameterSnapshot version={self.version}, algorithm_version={self.algorithm_version}>"
+
+
+class ParameterSnapshots:
+    """
+    Holds the current parameter snapshot behind a single reference. Readers
+    take the reference without a lock or a database query. A background
+    thread polls the database every `refresh_seconds` for a new version,
+    which another worker's update may have written, and swaps the reference
+    when it finds one. Updates in this process swap it right away.
+    """
+
+    def __init__(self, app, refresh_seconds: float = 1.0):
+        """
+        Initialize the holder. Call load() to read the first snapshot and
+        start() to start polling.
+        """
+        self.app = app
+        self.refresh_seconds = refresh_seconds
+        self.current = None
+        self.refreshed_at = None
+        self.thread = None
+        self.pid = None
+        self.stopping = threading.Event()
+
+        # Counters, read by the diagnostics endpoints
+        self.swaps = 0
+        self.refresh_errors = 0
+
+    def get(self, algorithm: RLAlgorithm) -> ParameterSnapshot:
+        """
+        Return the current snapshot for `algorithm`, or None if there are no
+        model parameters yet.
+        """
+        # The polling thread does not survive a fork, so restart it in the
+        # worker after a pre-fork initialization
+        if self.refresh_seconds and self.pid != os.getpid():
+            self.start()
+
+        snapshot = self.current
+        if snapshot is not None and snapshot.algorithm_version != algorithm.version_string():
+            snapshot = snapshot.for_algorithm(algorithm)
+            self.current = snapshot
+        return snapshot
+
+    def load(self) -> ParameterSnapshot:
+        """
+        Read the latest model parameters and swap in a new snapshot if the
+        version changed. Must be called inside an app context.
+        """
+        latest = ModelParameters.query.order_by(ModelParameters.timestamp.desc()).first()
+        self.refreshed_at = datetime.datetime.now()
+        if latest is None:
+            return None
+
+        current = self.current
+        if current is not None and current.version == latest.id:
+            return current
+
+        snapshot = ParameterSnapshot(
+            latest.id,
+            latest.data_watermark,
+            {
+                "probability_of_action": latest.probability_of_action,
+                **get_parameter_arrays(self.app),
+            },
+            self.app.rl_algorithm,
+        )
+        self.current = snapshot
+        self.swaps += 1
+        logging.info(f"[Snapshots] Swapped in parameter version {snapshot.version}.")
+        return snapshot
+
+    def refresh(self) -> ParameterSnapshot:
+        """
+        Load the latest snapshot in a fresh app context.
+        """
+        with self.app.app_context():
+            return self.load()
+
+    def start(self):
+        """
+        Start the polling thread.
+        """
+        self.pid = os.getpid()
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="parameter-snapshots", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the polling thread.
+        """
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join(timeout)
+            self.thread = None
+
+    def stats(self) -> dict:
+        """
+        Return the current version, its age and the counters.
+        """
+        snapshot = self.current
+        return {
+            "version": snapshot.version if snapshot else None,
+            "data_watermark": snapshot.data_watermark if snapshot else None,
+            "algorithm_version": snapshot.algorithm_version if snapshot else None,
+            "age_seconds": (
+                (datetime.datetime.now() - snapshot.loaded_at).total_seconds()
+                if snapshot
+                else None
+            ),
+            "seconds_since_refresh": (
+                (datetime.datetime.now() - self.refreshed_at).total_seconds()
+                if self.refreshed_at
+                else None
+            ),
+            "swaps": self.swaps,
+            "refresh_errors": self.refresh_errors,
+        }
+
+    def _run(self):
+        """
+        Poll for new versions until stopped.
+        """
+        while not self.stopping.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.refresh_errors += 1
+                logging.error(f"[Snapshots] Error: {e}")
@@ -0,0 +1,67 @@
+import logging
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Records how long each phase of application startup takes.
+    """
+
+    def __init__(self):
+        """
+        Initialize the profiler and start the total startup clock.
+        """
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time the enclosed block and record it under `name`. Repeated phases
+        are accumulated.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed_ms
+
+    def record(self, name: str, elapsed_ms: float):
+        """
+        Record a phase that ran before the profiler was created, e.g. the
+        imports of the package. The total startup time includes it.
+        """
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed_ms
+        self.started -= elapsed_ms / 1000
+
+    def report(self, target_ms: float = None) -> dict:
+        """
+        Return the phase timings, the total startup time and whether the
+        total is within the cold-start target.
+        """
+        total_ms = (time.perf_counter() - self.started) * 1000
+        report = {
+            "phases_ms": {name: round(ms, 2) for name, ms in self.phases.items()},
+            "total_ms": round(total_ms, 2),
+        }
+        if target_ms is not None:
+            report["target_ms"] = target_ms
+            report["within_target"] = total_ms <= target_ms
+        return report
+
+    def log_report(self, target_ms: float = None) -> dict:
+        """
+        Log the startup report and warn if the cold-start target was missed.
+        """
+        report = self.report(target_ms)
+        logger = logging.getLogger()
+        logger.info("Startup profile: %s", report)
+        if report.get("within_target") is False:
+            logger.warning(
+                "Startup took %.2f ms, above the %.2f ms target.",
+                report["total_ms"],
+                target_ms,
+            )
+        return report
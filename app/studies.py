@@ -0,0 +1,153 @@
+import contextlib
+import logging
+import os
+import sqlalchemy as sa
+from flask import current_app, g, request, jsonify
+from app.extensions import db, current_study
+from app.idempotency import ActionCache
+
+# URL prefix of the routes of a study
+STUDY_URL_PREFIX = "/api/v1/studies/<study_id>"
+
+
+class Study:
+    """
+    One study of a multi-study deployment. It stands in for the app in the
+    code that serves and updates a study: it has the app's config,
+    rl_algorithm, parameter_store, parameter_snapshots, action_cache and
+    update_scheduler attributes, and app_context() runs the database session
+    on the study's engine. Studies share the worker processes; their
+    updates run one at a time on the study's own update thread.
+    """
+
+    def __init__(self, app, study_id: str, settings: dict):
+        """
+        Initialize the study with the app's config overridden by `settings`.
+        The engine, algorithm and parameters are set up by
+        initialize_study.
+        """
+        if not settings.get("SCHEMA") and not settings.get("DATABASE_URL"):
+            raise ValueError(f"Study {study_id} needs a SCHEMA or a DATABASE_URL.")
+
+        self.app = app
+        self.study_id = study_id
+        self.config = {**app.config, **settings}
+        self.schema = settings.get("SCHEMA")
+        self.logger = app.logger
+
+        # Keep the study's parameter arrays apart from the default study's
+        if "PARAMETERS_DIR" not in settings and self.config.get("PARAMETERS_DIR"):
+            self.config["PARAMETERS_DIR"] = os.path.join(
+                self.config["PARAMETERS_DIR"], study_id
+            )
+
+        self.engine = None
+        self.rl_algorithm = None
+        self.parameter_store = None
+        self.parameter_snapshots = None
+        self.action_cache = ActionCache(self.config.get("ACTION_CACHE_SIZE", 10000))
+        self.action_writer = None
+        self.shadow_evaluator = None
+        self.update_scheduler = None
+        self.update_executor = None
+
+    def __repr__(self):
+        """
+        Return a string representation of the Study object.
+        """
+        return f"<Study {self.study_id}>"
+
+    def create_engine(self):
+        """
+        Return the study's engine: a new engine with its own connection pool
+        for its DATABASE_URL, or the default engine, sharing its pool, with
+        the tables translated to the study's schema. Must be called inside
+        an app context.
+        """
+        url = self.config.get("DATABASE_URL")
+        if url:
+            options = dict(self.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+            if sa.engine.make_url(url).database in (None, "", ":memory:"):
+                # An in-memory SQLite database only lives as long as its
+                # connection, so all threads share one
+                options.setdefault("poolclass", sa.pool.StaticPool)
+                options.setdefault("connect_args", {"check_same_thread": False})
+            engine = sa.create_engine(url, **options)
+        else:
+            engine = db.engine
+        if self.schema:
+            with engine.begin() as connection:
+                connection.execute(db.text(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"'))
+            engine = engine.execution_options(schema_translate_map={None: self.schema})
+        return engine
+
+    @contextlib.contextmanager
+    def activate(self):
+        """
+        Make this the current study of the block, in the current app
+        context.
+        """
+        token = current_study.set(self)
+        try:
+            yield self
+        finally:
+            db.session.remove()
+            current_study.reset(token)
+
+    @contextlib.contextmanager
+    def app_context(self):
+        """
+        Push an app context in which this is the current study.
+        """
+        with self.app.app_context(), self.activate():
+            yield self
+
+
+def get_study():
+    """
+    Return the study of the current request or job, or the app itself for
+    the default study.
+    """
+    study = current_study.get()
+    return study if study is not None else current_app._get_current_object()
+
+
+def register_study_routes(app, blueprints: list):
+    """
+    Serve the blueprints under STUDY_URL_PREFIX too, and make the study in
+    the URL, or in the "study_id" field of a JSON payload, the current
+    study of the request. Requests for an unknown study get a 404.
+    """
+    if app.config.get("STUDIES"):
+        for blueprint in blueprints:
+            app.register_blueprint(
+                blueprint, url_prefix=STUDY_URL_PREFIX, name=f"study_{blueprint.name}"
+            )
+
+    @app.url_value_preprocessor
+    def pull_study_id(endpoint, values):
+        if values and "study_id" in values:
+            g.study_id = values.pop("study_id")
+
+    @app.before_request
+    def activate_study():
+        study_id = g.pop("study_id", None)
+        if study_id is None and app.studies and request.is_json:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                study_id = data.get("study_id")
+        if study_id is None:
+            return None
+
+        study = app.studies.get(study_id)
+        if study is None:
+            logging.info(f"[Studies] Unknown study: {study_id}")
+            return jsonify({"status": "failed", "message": "Study not found."}), 404
+        g.study_token = current_study.set(study)
+
+    @app.teardown_request
+    def deactivate_study(exception):
+        token = g.pop("study_token", None)
+        if token is not None:
+            db.session.remove()
+            current_study.reset(token)
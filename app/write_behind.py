@@ -0,0 +1,182 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+
+# Durability modes: wait for the group commit, or acknowledge once buffered
+DURABILITY_MODES = ("wait", "ack")
+
+
+class WriteBehindBuffer:
+    """
+    Buffers new rows of a model in memory and commits them in groups from a
+    background thread. A group is committed when it reaches max_batch rows
+    or when its oldest row has waited max_delay_ms, so a burst of requests
+    shares one transaction instead of paying for one commit each.
+    """
+
+    def __init__(
+        self,
+        app,
+        model,
+        max_batch: int = 500,
+        max_delay_ms: float = 20,
+        queue_size: int = 10000,
+        wait_timeout: float = 10,
+    ):
+        """
+        Initialize the buffer. Call start() to start the flusher thread.
+        """
+        self.app = app
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.wait_timeout = wait_timeout
+        # Submitting blocks when the queue is full, which applies backpressure
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.columns = [
+            column.key for column in model.__table__.columns if not column.primary_key
+        ]
+
+        # Counters, read by the diagnostics endpoints
+        self.started_at = None
+        self.commits = 0
+        self.rows = 0
+        self.failed = 0
+        self.max_batch_size = 0
+        self.last_batch_size = 0
+
+    def start(self):
+        """
+        Start the flusher thread.
+        """
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(
+            target=self._run, name="write-behind", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the flusher thread once the buffered rows are committed.
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+            logging.info(f"[WriteBehind] Stopped: {self.stats()}")
+
+    def write(self, obj, wait: bool = True) -> Future:
+        """
+        Buffer a new, unsaved model object. With `wait`, block until its group
+        is committed and raise if the commit failed. Otherwise return as soon
+        as the row is buffered. If the flusher is not running, the row is
+        committed immediately.
+        """
+        row = {key: getattr(obj, key) for key in self.columns}
+        future = Future()
+        if self.thread is None:
+            self._flush([(row, future)])
+        else:
+            self.queue.put((row, future))
+        if wait:
+            future.result(self.wait_timeout)
+        return future
+
+    def stats(self) -> dict:
+        """
+        Return the commit rate, the batch sizes and the current queue length.
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return {
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "commits": self.commits,
+            "rows": self.rows,
+            "failed": self.failed,
+            "commits_per_second": self.commits / elapsed if elapsed else 0.0,
+            "mean_batch_size": self.rows / self.commits if self.commits else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "last_batch_size": self.last_batch_size,
+        }
+
+    def _next_batch(self) -> tuple[list, bool]:
+        """
+        Block for the next row, then collect rows until the batch is full or
+        the first row has waited max_delay. Return the batch and whether stop
+        was requested.
+        """
+        item = self.queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        """
+        Commit buffered rows in groups until stopped.
+        """
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: list):
+        """
+        Insert a batch of rows in one transaction and resolve their futures.
+        If a row violates a constraint, insert the rows one at a time, so
+        only the offending rows fail.
+        """
+        rows = [row for row, _ in batch]
+        try:
+            with self.app.app_context():
+                db.session.execute(db.insert(self.model), rows)
+                db.session.commit()
+        except IntegrityError as e:
+            with self.app.app_context():
+                db.session.rollback()
+            if len(batch) == 1:
+                self._fail(batch, e)
+                return
+            for item in batch:
+                self._flush([item])
+            return
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        self.commits += 1
+        self.rows += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        for _, future in batch:
+            future.set_result(True)
+
+    def _fail(self, batch: list, e: Exception):
+        """
+        Count the rows of a batch as failed and pass the error to their
+        futures.
+        """
+        self.failed += len(batch)
+        logging.error(f"[WriteBehind] Error: {e}")
+        logging.exception(e)
+        for _, future in batch:
+            future.set_exception(e)
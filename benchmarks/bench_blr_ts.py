@@ -0,0 +1,95 @@
+"""
+Measures the throughput of the blr_ts algorithm: actions per second, and the
+time of each update of a growing study when the posterior is updated with
+only the new rows, against refitting it from all rows as linear_ts does.
+
+    python benchmarks/bench_blr_ts.py --updates 10 --rows-per-update 20000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.algorithms.blr_ts import BayesianLinearTSAlgorithm  # noqa: E402
+from app.algorithms.linear_ts import LinearTSAlgorithm  # noqa: E402
+from app.batch import JSONColumn, StudyBatch  # noqa: E402
+
+
+def make_batch(n_rows: int, n_users: int, first_id: int, rng) -> StudyBatch:
+    """
+    Create a synthetic batch of rows numbered from `first_id`.
+    """
+    temperature = rng.uniform(10, 40, n_rows)
+    states = np.column_stack([np.ones(n_rows), temperature]).astype(np.float32)
+    probs = rng.uniform(0.1, 0.9, n_rows)
+    actions = (rng.random(n_rows) < probs).astype(np.int32)
+    rewards = 2.0 + actions * (1.5 - 0.05 * temperature) + rng.normal(size=n_rows)
+    return StudyBatch(
+        np.arange(first_id, first_id + n_rows),
+        np.array([f"user_{i}" for i in range(n_users)]),
+        (np.arange(n_rows) % n_users).astype(np.int32),
+        np.zeros(n_rows, dtype=np.int32),
+        actions,
+        probs,
+        rewards,
+        states,
+        JSONColumn(b"{}" * n_rows, np.arange(n_rows + 1, dtype=np.int64) * 2),
+        JSONColumn(b"{}" * n_rows, np.arange(n_rows + 1, dtype=np.int64) * 2),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--rows-per-update", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--actions", type=int, default=5000)
+    parser.add_argument("--backend", default="auto")
+    args = parser.parse_args()
+
+    priors = {
+        "probability_of_action": 0.5,
+        "mean": np.zeros(4),
+        "cov": np.eye(4) * 10,
+    }
+    incremental = BayesianLinearTSAlgorithm(seed=0, backend=args.backend)
+    refit = LinearTSAlgorithm(seed=0, backend=args.backend)
+    incremental.kernels.warm_up(4)
+    print(f"Kernels: {incremental.kernels.backend}")
+
+    rng = np.random.default_rng(0)
+    batches = []
+    incremental_params = priors
+    print(f"{'rows':>9} {'incremental s':>14} {'refit s':>10}")
+    for update in range(args.updates):
+        batch = make_batch(
+            args.rows_per_update, args.users, update * args.rows_per_update + 1, rng
+        )
+        batches.append(batch)
+
+        start = time.perf_counter()
+        status, incremental_params = incremental.update(incremental_params, {"batch": batch})
+        incremental_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        refit.update(priors, {"batch": StudyBatch.concatenate(batches)})
+        refit_seconds = time.perf_counter() - start
+
+        rows = (update + 1) * args.rows_per_update
+        print(f"{rows:>9} {incremental_seconds:>14.4f} {refit_seconds:>10.4f}")
+
+    action_parameters = incremental.action_parameters(incremental_params)
+    states = np.column_stack([np.ones(args.actions), rng.uniform(10, 40, args.actions)])
+    start = time.perf_counter()
+    for i, state in enumerate(states):
+        incremental.get_action("user_0", state, action_parameters, i)
+    elapsed = time.perf_counter() - start
+    print(f"Actions: {args.actions / elapsed:,.0f} per second")
+    print(f"Treatment effect: {np.round(incremental_params['mean'][2:], 3)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compares the time of a linear Thompson sampling action on the interpreted
+path, which factors the covariance and draws with
+Generator.multivariate_normal on every request, with the kernels of
+app.algorithms.kernels. The Numba kernels are only measured when Numba is
+installed; their compilation happens in the warm-up, outside the timing.
+
+    python benchmarks/bench_kernels.py --dim 4 8 16 --requests 5000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.algorithms.kernels import get_kernels, numba_available  # noqa: E402
+
+
+def interpreted_action(state, mean, cov, rng, samples):
+    """
+    Thompson sampling action without kernels: one multivariate normal draw
+    for the action and `samples` more for its probability.
+    """
+    theta = rng.multivariate_normal(mean, cov)
+    action = int(state @ theta > 0)
+    draws = rng.multivariate_normal(mean, cov, size=samples)
+    probability_of_one = np.mean(np.concatenate([[state @ theta], draws @ state]) > 0)
+    return action, probability_of_one
+
+
+def kernel_action(kernels, state, mean, chol, rng, samples):
+    """
+    The same action with the kernels and the Cholesky factor computed
+    ahead of time, as on the Monte Carlo path of the probability service.
+    """
+    noise = rng.standard_normal((samples + 1, len(state)))
+    scores = kernels.sample_scores(state, mean, chol, noise)
+    action = int(scores[0] > 0)
+    probability_of_one = np.count_nonzero(scores > 0) / len(scores)
+    return action, probability_of_one
+
+
+def time_requests(function, states) -> float:
+    """
+    Return the mean time of one call of `function` per state, in µs.
+    """
+    start = time.perf_counter()
+    for state in states:
+        function(state)
+    return (time.perf_counter() - start) / len(states) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dim", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=1000)
+    args = parser.parse_args()
+
+    backends = ["numpy"] + (["numba"] if numba_available() else [])
+    print(f"Backends: {', '.join(backends)}")
+
+    for dim in args.dim:
+        rng = np.random.default_rng(0)
+        a = rng.normal(size=(dim, dim))
+        cov = a @ a.T / dim + np.eye(dim)
+        mean = rng.normal(size=dim)
+        states = rng.normal(size=(args.requests, dim))
+
+        results = {
+            "interpreted": time_requests(
+                lambda state: interpreted_action(state, mean, cov, rng, args.samples),
+                states,
+            )
+        }
+        for backend in backends:
+            kernels = get_kernels(backend)
+            kernels.warm_up(dim)
+            chol = kernels.cholesky(cov)
+            results[backend] = time_requests(
+                lambda state: kernel_action(kernels, state, mean, chol, rng, args.samples),
+                states,
+            )
+
+        baseline = results["interpreted"]
+        print(
+            f"d={dim:>3}  "
+            + "  ".join(
+                f"{name} {elapsed:>8.1f} µs ({baseline / elapsed:>4.1f}x)"
+                for name, elapsed in results.items()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measures how the time of a map-reduce update scales with the number of
+processes, with a per-user ridge regression as the map step.
+
+    python benchmarks/bench_mapreduce.py --rows 400000 --processes 1 2 4
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.algorithms.mapreduce import MapReduceAlgorithm  # noqa: E402
+from app.batch import JSONColumn, StudyBatch  # noqa: E402
+
+
+class PerUserRidge(MapReduceAlgorithm):
+    """
+    Fits a ridge regression of the reward on the state for every user and
+    averages the coefficients.
+    """
+
+    name = "per_user_ridge"
+    n_shards = 32
+
+    def map_shard(self, old_params, shard, rng):
+        total = np.zeros(shard.states.shape[1])
+        users = np.unique(shard.user_codes)
+        for code in users:
+            rows = shard.user_codes == code
+            X = shard.states[rows].astype(np.float64)
+            y = shard.rewards[rows]
+            # Posterior draws make the map step as heavy as a real one
+            precision = X.T @ X + np.eye(X.shape[1])
+            mean = np.linalg.solve(precision, X.T @ y)
+            draws = rng.multivariate_normal(mean, np.linalg.inv(precision), size=20)
+            total += draws.mean(axis=0)
+        return total, len(users)
+
+    def reduce_shards(self, old_params, results):
+        total = sum(result[0] for result in results)
+        count = sum(result[1] for result in results)
+        return True, {"mean_coefficients": total / count}
+
+    def get_action(self, user_id, state, parameters, decision_idx):
+        return 0, 1.0, {}
+
+    def make_state(self, context):
+        return True, []
+
+    def make_reward(self, user_id, state, action, outcome):
+        return True, 0.0
+
+
+def make_batch(n_rows: int, n_users: int, dim: int, seed: int = 0) -> StudyBatch:
+    """
+    Create a synthetic batch.
+    """
+    rng = np.random.default_rng(seed)
+    states = rng.normal(size=(n_rows, dim)).astype(np.float32)
+    return StudyBatch(
+        np.arange(1, n_rows + 1),
+        np.array([f"user_{i}" for i in range(n_users)]),
+        (np.arange(n_rows) % n_users).astype(np.int32),
+        (np.arange(n_rows) // n_users).astype(np.int32),
+        rng.integers(0, 2, n_rows).astype(np.int32),
+        np.full(n_rows, 0.5),
+        states @ rng.normal(size=dim) + rng.normal(size=n_rows),
+        states,
+        JSONColumn.from_texts(["{}"] * n_rows),
+        JSONColumn.from_texts(["{}"] * n_rows),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=8)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    algorithm = PerUserRidge()
+    batch = make_batch(args.rows, args.users, args.dim)
+    print(f"{args.rows} rows, {args.users} users, {os.cpu_count()} CPUs")
+
+    baseline = None
+    for processes in args.processes:
+        data = {"batch": batch, "processes": processes, "seed": (0, 1)}
+        if processes > 1:
+            # Start the pool outside the timing
+            algorithm.update({}, data)
+        start = time.perf_counter()
+        status, parameters = algorithm.update({}, data)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(
+            f"{processes:>3} processes {elapsed:>8.3f} s  speedup {baseline / elapsed:>5.2f}"
+            f"  {parameters['mean_coefficients'][:2]}"
+        )
+
+
+if __name__ == "__main__":
+    main()
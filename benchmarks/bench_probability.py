@@ -0,0 +1,81 @@
+"""
+Compares the time and accuracy of the action probability of a linear
+Thompson sampling policy computed by Monte Carlo, in closed form, and read
+from the cache of the probability service, per request and for a batch of
+states.
+
+    python benchmarks/bench_probability.py --dim 4 --samples 1000 10000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.algorithms.kernels import sample_score_matrix  # noqa: E402
+from app.algorithms.probability import (  # noqa: E402
+    ProbabilityService,
+    linear_gaussian_probability,
+)
+
+
+def closed_form(states, parameters):
+    """
+    Closed form of the linear Thompson sampling policy.
+    """
+    return linear_gaussian_probability(states, parameters["mean"], parameters["chol"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dim", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--samples", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    def sampler(states, parameters, noise):
+        return sample_score_matrix(states, parameters["mean"], parameters["chol"], noise)
+
+    rng = np.random.default_rng(0)
+    a = rng.normal(size=(args.dim, args.dim))
+    parameters = {
+        "version": 1,
+        "mean": rng.normal(size=args.dim) / 4,
+        "chol": np.linalg.cholesky(a @ a.T / args.dim + np.eye(args.dim)),
+    }
+    states = rng.normal(size=(args.requests, args.dim))
+    exact = closed_form(states, parameters)
+    print(f"d={args.dim}, {args.requests} states")
+
+    services = {
+        f"monte carlo {samples}": ProbabilityService(sampler=sampler, samples=samples, seed=0)
+        for samples in args.samples
+    }
+    services["closed form"] = ProbabilityService(closed_form=closed_form)
+
+    for name, service in services.items():
+        start = time.perf_counter()
+        probabilities = np.array([service.probability(parameters, state) for state in states])
+        elapsed = (time.perf_counter() - start) / args.requests * 1e6
+        error = np.max(np.abs(probabilities - exact))
+        print(f"{name:<20} {elapsed:>9.1f} µs per request  max error {error:.4f}")
+
+        # One call for all the states, as off-policy evaluation makes
+        start = time.perf_counter()
+        service.probabilities(parameters, states)
+        elapsed = (time.perf_counter() - start) / args.requests * 1e6
+        print(f"{name + ' batch':<20} {elapsed:>9.1f} µs per state")
+
+    # Every state is now cached
+    service = services["closed form"]
+    start = time.perf_counter()
+    for state in states:
+        service.probability(parameters, state)
+    elapsed = (time.perf_counter() - start) / args.requests * 1e6
+    print(f"{'cached':<20} {elapsed:>9.1f} µs per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compares the memory and time taken to load the study data for an update as
+ORM objects and as a StudyBatch.
+
+    python benchmarks/bench_study_batch.py --rows 200000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.batch import load_study_batch  # noqa: E402
+from app.models import StudyData  # noqa: E402
+
+
+def insert_rows(n_rows: int, n_users: int, seed: int = 0):
+    """
+    Insert synthetic study data rows.
+    """
+    rng = np.random.default_rng(seed)
+    temperatures = rng.integers(0, 40, n_rows)
+    rows = [
+        {
+            "user_id": f"user_{i % n_users}",
+            "decision_idx": i // n_users,
+            "action": int(i % 2),
+            "action_prob": 0.5,
+            "state": [float(temperatures[i])],
+            "raw_context": {"temperature": int(temperatures[i])},
+            "outcome": {"clicks": int(i % 7)},
+            "reward": float(i % 7),
+            "request_timestamp": "2025-01-01T12:00:00",
+            "created_at": "2025-01-01T12:00:00",
+        }
+        for i in range(n_rows)
+    ]
+    for start in range(0, n_rows, 10000):
+        db.session.execute(db.insert(StudyData), rows[start : start + 10000])
+    db.session.commit()
+
+
+def load_orm():
+    """
+    Load the study data the way updates used to: ORM objects, then lists.
+    """
+    study_data = StudyData.query.all()
+    temperatures = [data.raw_context["temperature"] for data in study_data]
+    rewards = [data.reward for data in study_data]
+    states = np.array([data.state for data in study_data], dtype=np.float32)
+    return study_data, temperatures, rewards, states
+
+
+def load_batch():
+    """
+    Load the study data as a StudyBatch.
+    """
+    batch = load_study_batch()
+    return batch, batch.raw_contexts.field("temperature"), batch.rewards, batch.states
+
+
+def measure(name: str, load):
+    """
+    Print the time, the memory retained by the result and the peak memory
+    while loading.
+    """
+    db.session.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<12} {elapsed:>8.3f} s {retained / 2**20:>10.1f} MiB retained"
+        f" {peak / 2**20:>10.1f} MiB peak"
+    )
+    del result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        insert_rows(args.rows, args.users)
+        print(f"{args.rows} rows, {args.users} users")
+        measure("orm", load_orm)
+        measure("study_batch", load_batch)
+
+
+if __name__ == "__main__":
+    main()
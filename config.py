@@ -12,13 +12,171 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         "pool_recycle": 3600,  # Recycle connections after 3600 seconds (1 hour)
     }
-    RL_ALGORITHM_SEED = 42  # Seed for RL Algorithm random state
+    RL_ALGORITHM_SEED = None  # Seed for RL Algorithm random state, None for fresh entropy
+
+    # Algorithm Configuration
+    # Name of the algorithm in app/algorithms/registry.py, an installed
+    # "justin_rl_api.algorithms" entry point, or a "module:Class" path
+    RL_ALGORITHM = "flat_prob"
+    RL_ALGORITHM_KWARGS = {}  # Extra keyword arguments for the algorithm
+
+    # Shadow Configuration
+    # A candidate algorithm that is handed every action request through a
+    # bounded queue and evaluated off the hot path. Its decisions are stored in
+    # the shadow_actions table. Requests are dropped when the queue is full.
+    SHADOW_ALGORITHM = None
+    SHADOW_ALGORITHM_KWARGS = {}
+    SHADOW_QUEUE_SIZE = 1000
+
+    # Action requests read the model parameters from an in-memory snapshot.
+    # Each worker polls the database for a new version this often, in
+    # seconds. Updates in the same worker are visible right away. Set to 0
+    # to disable polling.
+    PARAMETER_REFRESH_SECONDS = 1.0
+
+    # Idempotency Configuration
+    # Retried action requests for the same (user_id, decision_idx), or with the
+    # same Idempotency-Key header, return the stored action instead of drawing
+    # a new one. Responses are cached in memory, with the actions table as the
+    # fallback.
+    ACTION_CACHE_SIZE = 10000  # Number of action responses kept in memory
+
+    # Write-behind Configuration
+    # With ACTION_WRITE_BEHIND, action rows are buffered in memory and committed
+    # in groups by a background thread, when a group reaches
+    # WRITE_BEHIND_MAX_BATCH rows or its oldest row has waited
+    # WRITE_BEHIND_MAX_DELAY_MS. With WRITE_BEHIND_DURABILITY = "wait", a request
+    # returns once its group is committed. With "ack", it returns as soon as the
+    # row is buffered, and rows buffered when the process is killed or whose
+    # group commit fails are lost, and counted as failed.
+    ACTION_WRITE_BEHIND = False
+    WRITE_BEHIND_MAX_BATCH = 500
+    WRITE_BEHIND_MAX_DELAY_MS = 20
+    WRITE_BEHIND_DURABILITY = "wait"
+
+    # Update Scheduler Configuration
+    # Update requests arriving within UPDATE_DEBOUNCE_SECONDS of each other
+    # are coalesced into one update, started at most
+    # UPDATE_DEBOUNCE_MAX_SECONDS after the first. With 0, every request
+    # starts its own update. UPDATE_SCHEDULE is a cron expression, e.g.
+    # "0 3 * * *", and UPDATE_MIN_NEW_ROWS triggers an update once that many
+    # study data rows have arrived, checked every UPDATE_POLL_SECONDS.
+    # Triggered updates send their callbacks to UPDATE_CALLBACK_URL. Enable
+    # the schedule and the threshold in a single process only.
+    UPDATE_DEBOUNCE_SECONDS = 0
+    UPDATE_DEBOUNCE_MAX_SECONDS = 300
+    UPDATE_SCHEDULE = None
+    UPDATE_MIN_NEW_ROWS = None
+    UPDATE_POLL_SECONDS = 60
+    UPDATE_CALLBACK_URL = None
+    # Skip updates when no study data has arrived since the last one
+    SKIP_NOOP_UPDATES = True
+    # Processes running the user shards of map-reduce updates, see
+    # app/algorithms/mapreduce.py. The pool is started by the first update.
+    UPDATE_PROCESSES = 1
+
+    # Partitioning Configuration (PostgreSQL only)
+    # Tables in PARTITIONED_TABLES are range partitioned on PARTITION_COLUMN,
+    # "request_timestamp" or "decision_idx", once converted with
+    # `flask partition-tables`. PARTITION_INTERVAL is "day", "week" or "month"
+    # for timestamps, or a number of decision points for decision_idx.
+    # PARTITIONS_AHEAD upcoming partitions are created at startup and after
+    # each model update. Old partitions are archived to Parquet files in
+    # ARCHIVE_DIR with `flask archive-partitions`.
+    PARTITIONED_TABLES = ()
+    PARTITION_COLUMN = "request_timestamp"
+    PARTITION_INTERVAL = "month"
+    PARTITIONS_AHEAD = 2
+    ARCHIVE_DIR = "archive"
+
+    # Multi-study Configuration
+    # Further studies served by the same workers, by study id. Requests for a
+    # study go to /api/v1/studies/<study_id>/..., or carry a "study_id" field
+    # in the payload; other requests go to the default study configured
+    # above. Each study has its own algorithm, parameter snapshots and update
+    # queue, and its tables in its own PostgreSQL SCHEMA or its own
+    # DATABASE_URL. Any other setting above can be overridden per study, e.g.
+    # {"trial_b": {"SCHEMA": "trial_b", "RL_ALGORITHM": "flat_prob",
+    #              "MODEL_PRIORS": {"probability_of_action": 0.3}}}
+    STUDIES = {}
+
+    # Admission Control
+    # Requests to the endpoints in ADMISSION_ENDPOINTS, by view function name,
+    # are admitted by class. ADMISSION_CAPACITY limits the requests in flight
+    # across all classes, and each class can limit its own with
+    # max_concurrent, and the requests per second of each client with rate and
+    # burst. Requests over a limit wait up to queue_timeout seconds for a slot,
+    # and are then rejected with a 429 and a Retry-After header. Classes with a
+    # lower priority are served first, and reserve slots of the capacity are
+    # kept free for a class from those of lower priority. An update holds its
+    # slot until it finishes. Clients are identified by their address, or by
+    # ADMISSION_CLIENT_HEADER if set. Only set it when a trusted proxy sets the
+    # header, since clients could otherwise pick a new identity per request.
+    ADMISSION_CONTROL = False
+    ADMISSION_CAPACITY = 32
+    ADMISSION_CLIENT_HEADER = None
+    ADMISSION_ENDPOINTS = {
+        "request_action": "action",
+        "upload_data": "upload",
+        "upload_data_batch": "upload",
+        "update_model": "update",
+    }
+    ADMISSION_LIMITS = {
+        "action": {"priority": 0, "reserve": 8, "queue_timeout": 1},
+        "upload": {
+            "priority": 1,
+            "max_concurrent": 8,
+            "rate": 20,
+            "burst": 100,
+            "queue_timeout": 5,
+        },
+        "update": {
+            "priority": 2,
+            "max_concurrent": 1,
+            "rate": 0.1,
+            "burst": 5,
+            "retry_after": 30,
+        },
+    }
+
+    # Health Check Configuration
+    # /readyz fails when a database round trip takes longer than
+    # HEALTH_DB_TIMEOUT_MS, the parameter snapshots were not refreshed for
+    # HEALTH_MAX_SNAPSHOT_AGE_SECONDS, or a queue is more than
+    # HEALTH_MAX_QUEUE_FILL full, or more than HEALTH_MAX_UPDATE_BACKLOG update
+    # requests of a study are waiting. /healthz fails when a background thread
+    # has died or an update has run for longer than HEALTH_MAX_UPDATE_SECONDS.
+    HEALTH_DB_TIMEOUT_MS = 250
+    HEALTH_MAX_SNAPSHOT_AGE_SECONDS = 30
+    HEALTH_MAX_QUEUE_FILL = 0.8
+    HEALTH_MAX_UPDATE_BACKLOG = 10
+    HEALTH_MAX_UPDATE_SECONDS = 3600
+
+    # Logging Configuration
+    # Log records are written by a background thread. When its queue is full,
+    # logging waits for room, or with LOG_DROP_WHEN_FULL drops the record so
+    # requests never wait on log output.
+    LOG_DROP_WHEN_FULL = False
+
+    # Token required in the X-Admin-Token header of the admin endpoints.
+    # The admin endpoints are disabled while it is None.
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+    # Startup Configuration
+    # With LAZY_INIT, creating the app only registers routes. The algorithm,
+    # tables and priors are set up by the first request, or before forking
+    # workers by calling app.initialize_app(app) from a pre-fork hook.
+    LAZY_INIT = False
+    STARTUP_TARGET_MS = 2000  # Cold-start target reported in the startup profile
 
     # Prior Configuration
-    # If you specify a pickle file, it should be a dictionary with the same keys
-    # as the entries in the ModelParameters table. Otherwise, see the next setting
-    # to specify the individual keys in text format.
-    PRIORS_PICKLE_FILE = None  # Path to the pickled priors file
+    # A priors file holds one entry per key of the algorithm's parameter
+    # schema, which matches the entries in the ModelParameters table. The
+    # format is chosen by extension: .npz, .json manifest, .arrow/.feather or,
+    # for compatibility, .pkl/.pickle. Arrays are memory-mapped where possible.
+    # Otherwise, see the next setting to specify the individual keys in text format.
+    PRIORS_FILE = None  # Path to the priors file
+    PRIORS_PICKLE_FILE = None  # Deprecated, path to a pickled priors file
 
     # If you don't want to use a pickle file, you can specify the priors directly
     # using the following format. The keys should match the entries in the
@@ -27,9 +185,21 @@ class Config:
         "probability_of_action": 0.5,
     }
 
+    # Directory of the shared parameter store. Array-valued priors and
+    # parameters are kept there as .npy files that all workers memory-map
+    # read-only. Updates replace the files atomically. Set to None to disable.
+    PARAMETERS_DIR = None
+
     # Backup database before processing an update request
     BACKUP_DATABASE = True
 
+    # Generate actions for the next PRECOMPUTE_HORIZON decision points of every
+    # user after each update, so action requests become a lookup. Requires a
+    # state-independent algorithm or one that can forecast the state; other
+    # requests fall back to computing the action live.
+    PRECOMPUTE_ACTIONS = False
+    PRECOMPUTE_HORIZON = 5
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
@@ -38,6 +208,8 @@ class TestingConfig(Config):
     TESTING = True
     BACKUP_DATABASE = False
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    PARAMETER_REFRESH_SECONDS = 0  # Tests run in one process
+    ADMISSION_CONTROL = False  # Tests send bursts from one client
 
 
 class ProductionConfig(Config):
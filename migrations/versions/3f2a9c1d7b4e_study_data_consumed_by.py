@@ -0,0 +1,58 @@
+"""Track the update that consumed each study data row
+
+Revision ID: 3f2a9c1d7b4e
+Revises:
+Create Date: 2026-10-19 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b4e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables are created by the app at startup, so the migration only
+    # upgrades study_data tables created before the column existed
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("study_data"):
+        return
+    columns = {column["name"] for column in inspector.get_columns("study_data")}
+    if "consumed_by" in columns:
+        return
+
+    op.add_column("study_data", sa.Column("consumed_by", sa.Integer(), nullable=True))
+    op.create_index(
+        "ix_study_data_pending",
+        "study_data",
+        ["id"],
+        postgresql_where=sa.text("consumed_by IS NULL"),
+        sqlite_where=sa.text("consumed_by IS NULL"),
+    )
+
+    # Rows up to the watermark of the latest parameters were read by the
+    # updates so far; mark them consumed by those parameters so incremental
+    # algorithms do not count them twice
+    latest = op.get_bind().execute(
+        sa.text(
+            "SELECT id, data_watermark FROM model_parameters "
+            "WHERE data_watermark IS NOT NULL ORDER BY id DESC LIMIT 1"
+        )
+    ).first()
+    if latest is not None:
+        op.execute(
+            sa.text(
+                "UPDATE study_data SET consumed_by = :parameters_id "
+                "WHERE id <= :watermark"
+            ).bindparams(parameters_id=latest.id, watermark=latest.data_watermark)
+        )
+
+
+def downgrade():
+    op.drop_index("ix_study_data_pending", table_name="study_data")
+    op.drop_column("study_data", "consumed_by")
@@ -0,0 +1,67 @@
+"""Allow one action per decision slot
+
+Revision ID: 8c41e07a5d2f
+Revises: 3f2a9c1d7b4e
+Create Date: 2026-10-19 12:30:00
+
+"""
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+from app.partitioning import is_partitioned
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41e07a5d2f'
+down_revision = '3f2a9c1d7b4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("actions"):
+        return
+    constraints = {c["name"] for c in inspector.get_unique_constraints("actions")}
+    if "uq_actions_user_id_decision_idx" in constraints:
+        return
+
+    # Concurrent retries could store two actions for a slot. Retries were
+    # answered with the first, so the later ones are left for the operator
+    # to review rather than deleted here.
+    duplicates = op.get_bind().execute(
+        sa.text(
+            "SELECT COUNT(*) FROM (SELECT user_id, decision_idx FROM actions "
+            "GROUP BY user_id, decision_idx HAVING COUNT(*) > 1) AS slots"
+        )
+    ).scalar()
+    if duplicates:
+        raise RuntimeError(
+            f"{duplicates} decision slots have more than one action. Keep the "
+            "action with the lowest id of each slot, which retries were answered "
+            "with, and run the upgrade again."
+        )
+
+    # The unique constraints of a partitioned table include its partition
+    # column, as in app.partitioning.convert_table_sql
+    columns = ["user_id", "decision_idx"]
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql" and is_partitioned(bind, "actions"):
+        column = current_app.config.get("PARTITION_COLUMN", "request_timestamp")
+        if column not in columns:
+            columns.append(column)
+
+    indexes = {index["name"] for index in inspector.get_indexes("actions")}
+    with op.batch_alter_table("actions") as batch_op:
+        if "ix_actions_user_id_decision_idx" in indexes:
+            batch_op.drop_index("ix_actions_user_id_decision_idx")
+        batch_op.create_unique_constraint("uq_actions_user_id_decision_idx", columns)
+
+
+def downgrade():
+    with op.batch_alter_table("actions") as batch_op:
+        batch_op.drop_constraint("uq_actions_user_id_decision_idx", type_="unique")
+        batch_op.create_index(
+            "ix_actions_user_id_decision_idx", ["user_id", "decision_idx"]
+        )
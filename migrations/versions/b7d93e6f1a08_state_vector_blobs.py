@@ -0,0 +1,73 @@
+"""Store state vectors as float32 blobs
+
+Revision ID: b7d93e6f1a08
+Revises: 8c41e07a5d2f
+Create Date: 2026-10-19 13:00:00
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.column_types import encode_state
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d93e6f1a08'
+down_revision = '8c41e07a5d2f'
+branch_labels = None
+depends_on = None
+
+# Tables whose state column held a JSON list or a float array, and whether
+# the column is nullable
+STATE_TABLES = {"actions": True, "study_data": False}
+
+CHUNK_SIZE = 10000
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, nullable in STATE_TABLES.items():
+        if not inspector.has_table(table):
+            continue
+        columns = {column["name"]: column for column in inspector.get_columns(table)}
+        if isinstance(columns["state"]["type"], sa.LargeBinary):
+            continue
+
+        op.add_column(table, sa.Column("state_blob", sa.LargeBinary(), nullable=True))
+
+        # Encode the states in chunks of ids, as the app writes them
+        update = sa.text(f"UPDATE {table} SET state_blob = :blob WHERE id = :id")
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.text(
+                    f"SELECT id, state FROM {table} WHERE id > :last_id "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": CHUNK_SIZE},
+            ).all()
+            if not rows:
+                break
+            values = []
+            for row_id, state in rows:
+                if isinstance(state, str):
+                    state = json.loads(state)
+                values.append(
+                    {"id": row_id, "blob": None if state is None else encode_state(state)}
+                )
+            bind.execute(update, values)
+            last_id = rows[-1][0]
+
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("state")
+            batch_op.alter_column(
+                "state_blob", new_column_name="state", nullable=nullable
+            )
+
+
+def downgrade():
+    # The float32 encoding is lossy, so the old columns are not restored
+    raise RuntimeError("The state vector conversion cannot be downgraded.")
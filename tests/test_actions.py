@@ -3,102 +3,358 @@ from app.routes.action import check_fields, request_action
 from app.models import User, StudyData
 from unittest.mock import patch, MagicMock
 
+
 # Test check_fields for all scenarios
 def test_check_fields_missing_user_id():
-    data = {"timestamp": "2025-01-01T12:00:00", "decision_idx": 0, "context": {"temperature": 22}}
+    data = {
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "user_id and timestamp are required." in error_message
 
+
 def test_check_fields_missing_timestamp():
-    data = {"user_id": "test_user_123", "decision_idx": 0, "context": {"temperature": 22}}
+    data = {
+        "user_id": "test_user_123",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "user_id and timestamp are required." in error_message
 
+
 def test_check_fields_missing_decision_idx():
-    data = {"user_id": "test_user_123", "timestamp": "2025-01-01T12:00:00", "context": {"temperature": 22}}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "context": {"temperature": 22},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "decision_idx is required." in error_message
 
+
 def test_check_fields_missing_context():
-    data = {"user_id": "test_user_123", "timestamp": "2025-01-01T12:00:00", "decision_idx": 0}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "context is required." in error_message
 
+
 def test_check_fields_missing_temperature():
-    data = {"user_id": "test_user_123", "timestamp": "2025-01-01T12:00:00", "decision_idx": 0, "context": {}}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "Invalid context. Temperature is required." in error_message
 
+
 # Now all the fields with wrong data types
 def test_check_fields_user_id_not_string():
-    data = {"user_id": 123, "timestamp": "2025-01-01T12:00:00", "decision_idx": 0, "context": {"temperature": 22}}
+    data = {
+        "user_id": 123,
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "user_id must be a string." in error_message
 
+
 def test_check_fields_timestamp_not_string():
-    data = {"user_id": "test_user_123", "timestamp": 123, "decision_idx": 0, "context": {"temperature": 22}}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": 123,
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "timestamp must be a string or datetime object." in error_message
 
+
 def test_check_fields_decision_idx_not_int():
-    data = {"user_id": "test_user_123", "timestamp": "2025-01-01T12:00:00", "decision_idx": "0", "context": {"temperature": 22}}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": "0",
+        "context": {"temperature": 22},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "decision_idx must be an integer." in error_message
 
+
 def test_check_fields_context_not_dict():
-    data = {"user_id": "test_user_123", "timestamp": "2025-01-01T12:00:00", "decision_idx": 0, "context": "temperature"}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": "temperature",
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "context must be a dictionary." in error_message
 
+
 def test_check_fields_temperature_not_float_or_int():
-    data = {"user_id": "test_user_123", "timestamp": "2025-01-01T12:00:00", "decision_idx": 0, "context": {"temperature": "22"}}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": "22"},
+    }
     result, error_message = check_fields(data)
     assert not result
     assert "temperature must be a float or int." in error_message
 
+
 # Finally, a valid data
 
+
 def test_check_fields_valid():
-    data = {"user_id": "test_user_123", "timestamp": "2025-01-01T12:00:00", "decision_idx": 0, "context": {"temperature": 22}}
+    data = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    }
     result, error_message = check_fields(data)
     assert result
     assert error_message == ""
 
+
 # Test request_action for all scenarios
 # Test request_action_missing_user
 @patch("app.routes.action.User.query")
 def test_request_action_missing_user(mock_user_query, client):
     mock_user_query.filter_by.return_value.first.return_value = None
-    response = client.post("/api/v1/action", json={
-        "user_id": "test_user_123",
-        "timestamp": "2025-01-01T12:00:00",
-        "decision_idx": 0,
-        "context": {"temperature": 22}
-    })
+    response = client.post(
+        "/api/v1/action",
+        json={
+            "user_id": "test_user_123",
+            "timestamp": "2025-01-01T12:00:00",
+            "decision_idx": 0,
+            "context": {"temperature": 22},
+        },
+    )
     assert response.status_code == 404
     assert response.json["message"] == "User not found."
 
+
 # Test request_action_success
 def test_request_action_success(client):
-    with patch("app.routes.action.User.query") as mock_user_query, \
-         patch("app.routes.action.StudyData.query") as mock_study_data_query:
+    with patch("app.routes.action.User.query") as mock_user_query, patch(
+        "app.routes.action.StudyData.query"
+    ) as mock_study_data_query:
         mock_user_query.filter_by.return_value.first.return_value = MagicMock()
         mock_study_data_query.filter_by.return_value.first.return_value = None
 
-        response = client.post("/api/v1/action", json={
+        response = client.post(
+            "/api/v1/action",
+            json={
+                "user_id": "test_user_123",
+                "timestamp": "2025-01-01T12:00:00",
+                "decision_idx": 0,
+                "context": {"temperature": 22},
+            },
+        )
+        assert response.status_code == 201
+        assert response.json["status"] == "success"
+
+
+# Test request_action with precomputed actions
+def test_request_action_uses_precomputed_action(app, client):
+    from app.models import ModelParameters, PrecomputedAction
+    from app.precompute import precompute_actions
+
+    app.config["PRECOMPUTE_ACTIONS"] = True
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+
+    model_parameters = ModelParameters.query.first()
+    count = precompute_actions(app.rl_algorithm, model_parameters, 3)
+    assert count == 3
+
+    slot = PrecomputedAction.query.filter_by(
+        user_id="test_user_123", decision_idx=0
+    ).first()
+    expected_action = slot.action
+
+    with patch.object(app.rl_algorithm, "get_action") as mock_get_action:
+        response = client.post(
+            "/api/v1/action",
+            json={
+                "user_id": "test_user_123",
+                "timestamp": "2025-01-01T12:00:00",
+                "decision_idx": 0,
+                "context": {"temperature": 22},
+            },
+        )
+        mock_get_action.assert_not_called()
+
+    assert response.status_code == 201
+    assert response.json["action"] == expected_action
+    assert PrecomputedAction.query.count() == 2
+
+
+def test_request_action_without_precomputed_slot(app, client):
+    app.config["PRECOMPUTE_ACTIONS"] = True
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+
+    response = client.post(
+        "/api/v1/action",
+        json={
             "user_id": "test_user_123",
             "timestamp": "2025-01-01T12:00:00",
-            "decision_idx": 0,
-            "context": {"temperature": 22}
-        })
-        assert response.status_code == 201
-        assert response.json["status"] == "success"
\ No newline at end of file
+            "decision_idx": 7,
+            "context": {"temperature": 22},
+        },
+    )
+    assert response.status_code == 201
+    assert response.json["status"] == "success"
+
+
+# Test that retried requests return the stored action
+def test_request_action_retry_returns_stored_action(app, client):
+    from app.models import Action
+
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    payload = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    }
+    first = client.post("/api/v1/action", json=payload)
+    assert first.status_code == 201
+
+    with patch.object(app.rl_algorithm, "get_action") as mock_get_action:
+        retry = client.post("/api/v1/action", json=payload)
+        mock_get_action.assert_not_called()
+
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json == first.json
+    assert Action.query.count() == 1
+
+
+def test_request_action_retry_falls_back_to_database(app, client):
+    from app.idempotency import ActionCache
+
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    payload = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 3,
+        "context": {"temperature": 22},
+    }
+    headers = {"Idempotency-Key": "retry-abc"}
+    first = client.post("/api/v1/action", json=payload, headers=headers)
+    assert first.status_code == 201
+
+    # Simulate a restarted worker with an empty cache
+    app.action_cache = ActionCache(10)
+    with patch.object(app.rl_algorithm, "get_action") as mock_get_action:
+        retry = client.post("/api/v1/action", json=payload, headers=headers)
+        mock_get_action.assert_not_called()
+
+    assert retry.status_code == 200
+    assert retry.json["action"] == first.json["action"]
+    assert retry.json["action_prob"] == first.json["action_prob"]
+    assert retry.json["timestamp"] == first.json["timestamp"]
+
+
+# Test that a request racing a retry returns the action stored first
+def test_request_action_concurrent_insert_returns_stored_action(app, client):
+    from app.idempotency import find_previous_action
+    from app.models import Action
+
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    payload = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 4,
+        "context": {"temperature": 22},
+    }
+    first = client.post("/api/v1/action", json=payload)
+    assert first.status_code == 201
+
+    # The second request checks for a stored action before the first commits
+    lookups = []
+
+    def racing_lookup(*args):
+        lookups.append(args)
+        return None if len(lookups) == 1 else find_previous_action(*args)
+
+    app.action_cache.discard(("test_user_123", 4))
+    with patch("app.routes.action.find_previous_action", side_effect=racing_lookup):
+        second = client.post("/api/v1/action", json=payload)
+
+    assert second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json == first.json
+    assert Action.query.filter_by(user_id="test_user_123", decision_idx=4).count() == 1
+
+
+def test_action_cache_evicts_least_recently_used():
+    from app.idempotency import ActionCache
+
+    cache = ActionCache(2)
+    cache.put("a", {"action": 0})
+    cache.put("b", {"action": 1})
+    cache.get("a")
+    cache.put("c", {"action": 1})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"action": 0}
+    assert cache.stats()["size"] == 2
+
+
+def test_request_action_idempotency_key_conflicts(app, client):
+    from app.models import Action
+
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    payload = {
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 3,
+        "context": {"temperature": 22},
+    }
+    first = client.post(
+        "/api/v1/action", json=payload, headers={"Idempotency-Key": "a"}
+    )
+    assert first.status_code == 201
+
+    # Retries without a key are deduplicated on the decision slot
+    assert client.post("/api/v1/action", json=payload).status_code == 200
+
+    # The same slot under another key
+    response = client.post(
+        "/api/v1/action", json=payload, headers={"Idempotency-Key": "b"}
+    )
+    assert response.status_code == 409
+
+    # The same key with another context or another slot
+    changed = {**payload, "context": {"temperature": 30}}
+    response = client.post(
+        "/api/v1/action", json=changed, headers={"Idempotency-Key": "a"}
+    )
+    assert response.status_code == 422
+    other_slot = {**payload, "decision_idx": 4}
+    response = client.post(
+        "/api/v1/action", json=other_slot, headers={"Idempotency-Key": "a"}
+    )
+    assert response.status_code == 422
+    assert Action.query.count() == 1
@@ -0,0 +1,115 @@
+import time
+import pytest
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+from app.algorithms.registry import (
+    algorithm_seed,
+    create_algorithm,
+    get_algorithm_class,
+    register_algorithm,
+    swap_algorithm,
+)
+from app.models import Action
+
+
+@register_algorithm("flat_prob_v2")
+class FlatProbV2(FlatProbRLAlgorithm):
+    version = "2.0.0"
+
+    def warm_up(self, parameters):
+        self.warmed_up_with = parameters
+
+
+def test_get_algorithm_class():
+    assert get_algorithm_class("flat_prob") is FlatProbRLAlgorithm
+    assert get_algorithm_class("flat_prob_v2") is FlatProbV2
+    assert (
+        get_algorithm_class("app.algorithms.flat_prob:FlatProbRLAlgorithm")
+        is FlatProbRLAlgorithm
+    )
+    with pytest.raises(KeyError):
+        get_algorithm_class("unknown")
+
+
+def test_create_algorithm_version():
+    algorithm = create_algorithm("flat_prob_v2", seed=1)
+    assert algorithm.version_string() == "flat_prob_v2@2.0.0"
+
+
+def test_algorithm_seeds():
+    # Unseeded unless a seed is configured
+    assert algorithm_seed({"RL_ALGORITHM_SEED": None}, "primary", 0) is None
+
+    config = {"RL_ALGORITHM_SEED": 42}
+    seeds = {
+        algorithm_seed(config, "primary", 0),
+        algorithm_seed(config, "primary", 1),
+        algorithm_seed(config, "shadow"),
+        algorithm_seed(config, "study", "trial_b"),
+    }
+    assert len(seeds) == 4
+    assert algorithm_seed(config, "shadow") == algorithm_seed(config, "shadow")
+
+
+def test_forked_process_reseeds_rng():
+    algorithm = FlatProbRLAlgorithm(seed=1)
+    rng = algorithm.rng
+    assert algorithm.rng is rng
+
+    # As seen from a worker forked after the generator was created
+    algorithm._rng_pid = -1
+    assert algorithm.rng is not rng
+    assert algorithm.rng.random() != FlatProbRLAlgorithm(seed=1).rng.random()
+
+
+def test_swap_algorithm_warms_up(app):
+    old = app.rl_algorithm
+    new = swap_algorithm(app, "flat_prob_v2", parameters={"probability_of_action": 0.4})
+    assert app.rl_algorithm is new
+    assert new is not old
+    assert new.warmed_up_with == {"probability": 0.4}
+
+
+def test_admin_requires_token(app, client):
+    response = client.post("/api/v1/admin/algorithm", json={"algorithm": "flat_prob_v2"})
+    assert response.status_code == 403
+
+    app.config["ADMIN_TOKEN"] = "secret"
+    response = client.post(
+        "/api/v1/admin/algorithm",
+        json={"algorithm": "flat_prob_v2"},
+        headers={"X-Admin-Token": "wrong"},
+    )
+    assert response.status_code == 403
+
+
+def test_admin_swap_and_action_records_version(app, client):
+    app.config["ADMIN_TOKEN"] = "secret"
+    headers = {"X-Admin-Token": "secret"}
+
+    response = client.post(
+        "/api/v1/admin/algorithm", json={"algorithm": "unknown"}, headers=headers
+    )
+    assert response.status_code == 404
+
+    response = client.post(
+        "/api/v1/admin/algorithm", json={"algorithm": "flat_prob_v2"}, headers=headers
+    )
+    assert response.status_code == 202
+
+    for _ in range(50):
+        status = client.get("/api/v1/admin/algorithm", headers=headers).json
+        if status["swap"]["status"] != "loading":
+            break
+        time.sleep(0.1)
+    assert status["swap"]["status"] == "completed"
+    assert status["algorithm"] == "flat_prob_v2@2.0.0"
+
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    response = client.post("/api/v1/action", json={
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    })
+    assert response.status_code == 201
+    assert Action.query.first().algorithm_version == "flat_prob_v2@2.0.0"
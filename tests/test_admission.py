@@ -0,0 +1,96 @@
+import threading
+import time
+import pytest
+from app import create_app, db
+from app.admission import AdmissionController, TokenBucket
+from config import TestingConfig
+
+
+class AdmissionConfig(TestingConfig):
+    ADMISSION_CONTROL = True
+    ADMISSION_CLIENT_HEADER = "X-Client-Id"
+    ADMISSION_LIMITS = {
+        "action": {"priority": 0},
+        "upload": {"priority": 1, "rate": 0.01, "burst": 1},
+        "update": {"priority": 2, "max_concurrent": 1},
+    }
+
+
+@pytest.fixture
+def admission_client():
+    app_instance = create_app(AdmissionConfig)
+    with app_instance.app_context():
+        yield app_instance.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def upload(client, client_id):
+    return client.post(
+        "/api/v1/upload_data",
+        json={
+            "user_id": "non_existent_user",
+            "timestamp": "2024-01-01T12:00:00Z",
+            "decision_idx": 0,
+            "data": {
+                "context": {"temperature": 23},
+                "action": 1,
+                "action_prob": 0.5,
+                "state": [23],
+                "outcome": {"clicks": 4},
+            },
+        },
+        headers={"X-Client-Id": client_id},
+    )
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1, burst=2, now=0)
+    assert bucket.take(0) == 0
+    assert bucket.take(0) == 0
+    assert bucket.take(0) == pytest.approx(1.0)
+    assert bucket.take(1) == 0
+
+
+def test_rate_limit_per_client(admission_client):
+    assert upload(admission_client, "phone-1").status_code == 404
+
+    response = upload(admission_client, "phone-1")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Other clients have their own bucket
+    assert upload(admission_client, "phone-2").status_code == 404
+
+
+def test_capacity_is_reserved_for_higher_priority():
+    controller = AdmissionController(
+        {"action": {"priority": 0, "reserve": 1}, "upload": {"priority": 1}},
+        capacity=2,
+    )
+    assert controller.admit("upload", "a") == 0
+    assert controller.admit("upload", "a") > 0
+    assert controller.admit("action", "a") == 0
+
+    stats = controller.stats()
+    assert stats["in_flight"] == 2
+    assert stats["classes"]["upload"]["rejected_busy"] == 1
+
+
+def test_queued_request_is_admitted_when_a_slot_frees():
+    controller = AdmissionController(
+        {"action": {"priority": 0}, "upload": {"priority": 1, "queue_timeout": 5}},
+        capacity=1,
+    )
+    assert controller.admit("action", "a") == 0
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(controller.admit("upload", "b")))
+    thread.start()
+    time.sleep(0.1)
+    assert controller.stats()["classes"]["upload"]["queued"] == 1
+
+    controller.release("action")
+    thread.join(5)
+    assert results == [0]
+    assert controller.stats()["classes"]["upload"]["queued_total"] == 1
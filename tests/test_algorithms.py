@@ -0,0 +1,106 @@
+import pytest
+import numpy as np
+from app.algorithms.base import RLAlgorithm, as_rows, as_columns
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+
+
+class ScalarOnlyAlgorithm(RLAlgorithm):
+    """
+    Algorithm with only the per-user methods, to test the batch defaults.
+    """
+
+    def get_action(self, user_id, state, parameters, decision_idx):
+        return int(state[0] > 0), 0.5, {"decision_idx": decision_idx}
+
+    def update(self, old_params, data):
+        return True, old_params
+
+    def make_state(self, context):
+        if "x" not in context:
+            return False, []
+        return True, [context["x"], 1.0]
+
+    def make_reward(self, user_id, state, action, outcome):
+        return True, outcome["y"] * 2
+
+
+def test_as_rows_and_columns():
+    columns = {"temperature": np.array([20.0, 25.0])}
+    rows = as_rows(columns)
+    assert rows == [{"temperature": 20.0}, {"temperature": 25.0}]
+    assert as_columns(rows) == {"temperature": [20.0, 25.0]}
+
+
+def test_default_make_states_marks_failed_rows():
+    algorithm = ScalarOnlyAlgorithm()
+    status, states = algorithm.make_states([{"x": 1.0}, {}, {"x": -2.0}])
+    assert status.tolist() == [True, False, True]
+    assert states.shape == (3, 2)
+    assert np.isnan(states[1]).all()
+
+
+def test_default_get_actions_and_make_rewards():
+    algorithm = ScalarOnlyAlgorithm()
+    states = np.array([[1.0, 1.0], [-1.0, 1.0]])
+    actions, probs, random_states = algorithm.get_actions(
+        ["a", "b"], states, {}, [3, 4]
+    )
+    assert actions.tolist() == [1, 0]
+    assert probs.tolist() == [0.5, 0.5]
+    assert random_states == [{"decision_idx": 3}, {"decision_idx": 4}]
+
+    status, rewards = algorithm.make_rewards(
+        ["a", "b"], states, actions, {"y": np.array([1.0, 2.0])}
+    )
+    assert status.all()
+    assert rewards.tolist() == [2.0, 4.0]
+
+
+def test_flat_prob_batch_methods():
+    algorithm = FlatProbRLAlgorithm(seed=0)
+    status, states = algorithm.make_states({"temperature": [20, 31.5]})
+    assert status.all()
+    np.testing.assert_array_equal(states, [[20.0], [31.5]])
+
+    actions, probs, random_states = algorithm.get_actions(
+        ["a", "b"], states, {"probability": 0.3}, [0, 0]
+    )
+    assert set(actions.tolist()) <= {0, 1}
+    assert probs.tolist() == [0.3, 0.3]
+    assert len(random_states) == 2
+    assert random_states[0] != random_states[1]
+
+    # Each row replays from its own rng state
+    for action, random_state in zip(actions, random_states):
+        rng = np.random.default_rng()
+        rng.bit_generator.state = random_state
+        assert rng.binomial(1, 0.3) == action
+
+    status, rewards = algorithm.make_rewards(
+        ["a", "b"], states, actions, [{"clicks": 4}, {"clicks": 1}]
+    )
+    assert status.all()
+    assert rewards.tolist() == [4.0, 1.0]
+
+
+@pytest.mark.parametrize("probability", [0.3, 0.7])
+def test_flat_prob_batch_actions_match_single_actions(probability):
+    n = 200
+    states = np.full((n, 1), 20.0)
+    parameters = {"probability": probability}
+    actions, _, random_states = FlatProbRLAlgorithm(seed=7).get_actions(
+        ["u"] * n, states, parameters, [0] * n
+    )
+
+    algorithm = FlatProbRLAlgorithm(seed=7)
+    for action, random_state in zip(actions, random_states):
+        single_action, _, single_state = algorithm.get_action("u", [20.0], parameters, 0)
+        assert single_action == action
+        assert single_state == random_state
+
+
+def test_flat_prob_make_states_falls_back_per_row():
+    algorithm = FlatProbRLAlgorithm(seed=0)
+    status, states = algorithm.make_states([{"temperature": 20}, {}])
+    assert status.tolist() == [True, False]
+    assert states[0, 0] == 20
@@ -0,0 +1,75 @@
+import numpy as np
+from app.batch import JSONColumn, StudyBatch, load_study_batch
+from app.extensions import db
+from app.models import StudyData
+
+
+def add_study_data(rows):
+    for i, (user_id, temperature, reward) in enumerate(rows):
+        db.session.add(
+            StudyData(
+                user_id=user_id,
+                decision_idx=i,
+                action=i % 2,
+                action_prob=0.5,
+                state=[float(temperature)],
+                raw_context={"temperature": temperature},
+                outcome={"clicks": i},
+                reward=reward,
+                request_timestamp="2025-01-01T12:00:00",
+            )
+        )
+    db.session.commit()
+
+
+def test_load_study_batch(app):
+    add_study_data([("u1", 20, 1.0), ("u2", 25, None), ("u1", 30, 3.0)])
+
+    batch = load_study_batch(chunk_size=2)
+    assert len(batch) == 3
+    assert batch.user_ids.tolist() == ["u1", "u2", "u1"]
+    assert batch.users.tolist() == ["u1", "u2"]
+    assert batch.decision_idxs.tolist() == [0, 1, 2]
+    assert batch.actions.dtype == np.int32
+    assert batch.states.dtype == np.float32
+    assert batch.states.tolist() == [[20.0], [25.0], [30.0]]
+    np.testing.assert_array_equal(batch.rewards, [1.0, np.nan, 3.0])
+    assert batch.raw_contexts.field("temperature").tolist() == [20.0, 25.0, 30.0]
+    assert batch.outcomes[2] == {"clicks": 2}
+    assert batch.nbytes > 0
+
+
+def test_load_study_batch_up_to_watermark(app):
+    add_study_data([("u1", 20, 1.0), ("u2", 25, 2.0)])
+    assert load_study_batch(max_id=1).ids.tolist() == [1]
+    assert len(load_study_batch(max_id=0)) == 0
+
+
+def test_concatenate_recodes_users():
+    def batch(users, codes, texts):
+        n = len(codes)
+        return StudyBatch(
+            np.arange(n),
+            np.array(users),
+            np.array(codes, dtype=np.int32),
+            np.zeros(n, dtype=np.int32),
+            np.zeros(n, dtype=np.int32),
+            np.zeros(n),
+            np.zeros(n),
+            np.zeros((n, 1), dtype=np.float32),
+            JSONColumn.from_texts(texts),
+            JSONColumn.from_texts(texts),
+        )
+
+    joined = StudyBatch.concatenate(
+        [batch(["b", "c"], [1, 0], ['{"x": 1}', '{"x": 2}']), batch(["a", "b"], [1, 0], ['{"x": 3}', "{}"])]
+    )
+    assert joined.user_ids.tolist() == ["c", "b", "b", "a"]
+    assert joined.users.tolist() == ["a", "b", "c"]
+    assert list(joined.raw_contexts) == [{"x": 1}, {"x": 2}, {"x": 3}, {}]
+
+
+def test_load_study_batch_after_id(app):
+    add_study_data([("u1", 20, 1.0), ("u2", 25, 2.0), ("u1", 30, 3.0)])
+    assert load_study_batch(max_id=2, after_id=1).ids.tolist() == [2]
+    assert load_study_batch(after_id=1).ids.tolist() == [2, 3]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from app.column_types import (
+    encode_state,
+    decode_state,
+    decode_state_matrix,
+    register_state_dim,
+    get_state_dim,
+)
+
+
+def test_encode_decode_state_roundtrip():
+    blob = encode_state([23.5, 1.0, -2.25])
+    assert len(blob) == 12
+    assert decode_state(blob).tolist() == [23.5, 1.0, -2.25]
+
+
+def test_encode_state_wrong_dimension():
+    with pytest.raises(ValueError):
+        encode_state([1.0, 2.0], dim=3)
+
+
+def test_decode_state_matrix():
+    blobs = [encode_state([i, i + 0.5]) for i in range(4)]
+    matrix = decode_state_matrix(blobs, 2)
+    assert matrix.shape == (4, 2)
+    assert matrix.dtype == np.float32
+    np.testing.assert_array_equal(matrix[:, 0], [0, 1, 2, 3])
+
+
+def test_decode_state_matrix_infers_dimension():
+    blobs = [encode_state([1.0, 2.0, 3.0]), encode_state([4.0, 5.0, 6.0])]
+    assert decode_state_matrix(blobs).shape == (2, 3)
+
+
+def test_decode_state_matrix_mixed_dimensions():
+    blobs = [encode_state([1.0, 2.0]), encode_state([3.0])]
+    with pytest.raises(ValueError):
+        decode_state_matrix(blobs, 2)
+
+
+def test_decode_state_matrix_empty():
+    assert decode_state_matrix([], 2).shape == (0, 2)
+
+
+def test_register_state_dim():
+    register_state_dim("test_state", 3)
+    assert get_state_dim("test_state") == 3
+    with pytest.raises(ValueError):
+        register_state_dim("test_state", 0)
@@ -54,3 +54,142 @@ def test_upload_data_user_not_found(client):
 
     assert response.status_code == 404
     assert response.json["message"] == "User not found."
+
+
+def test_upload_data_wrong_state_dimension(client):
+    """
+    Tests uploading data with a state of the wrong dimension.
+    """
+    client.post(
+        "/api/v1/add_user",
+        json={"user_id": "test_user_123"},
+    )
+
+    response = client.post(
+        "/api/v1/upload_data",
+        json={
+            "user_id": "test_user_123",
+            "timestamp": "2024-01-01T12:00:00Z",
+            "decision_idx": 0,
+            "data": {
+                "context": {"temperature": 23},
+                "action": 1,
+                "action_prob": 0.5,
+                "state": [23, 1],
+                "outcome": {"clicks": 4},
+            },
+        },
+    )
+
+    assert response.status_code == 400
+    assert response.json["message"] == "state must have dimension 1."
+
+
+def test_upload_data_invalid_state_values(client):
+    """
+    Tests uploading data with a state that is not a list of numbers.
+    """
+    client.post(
+        "/api/v1/add_user",
+        json={"user_id": "test_user_123"},
+    )
+
+    for state in (["hot"], [True], [[23]]):
+        response = client.post(
+            "/api/v1/upload_data",
+            json={
+                "user_id": "test_user_123",
+                "timestamp": "2024-01-01T12:00:00Z",
+                "decision_idx": 0,
+                "data": {
+                    "context": {"temperature": 23},
+                    "action": 1,
+                    "action_prob": 0.5,
+                    "state": state,
+                    "outcome": {"clicks": 4},
+                },
+            },
+        )
+
+        assert response.status_code == 400
+        assert response.json["message"] == "state must be a list of numbers."
+
+
+def test_check_states():
+    """
+    Tests that state values must be finite numbers.
+    """
+    from app.routes.data import check_states
+
+    assert check_states([[1.0], [2]]) == (True, "")
+    assert check_states([[1.0], [float("nan")]], batch=True) == (
+        False,
+        "state values must be finite.",
+    )
+    assert check_states([[10**400]]) == (False, "state values must be finite.")
+    assert check_states([[1.0], "1.0"], batch=True) == (
+        False,
+        "Row 1: state must be a list of numbers.",
+    )
+
+
+def batch_payload(user_ids, decision_idxs, temperatures):
+    """
+    Build a batch upload with one value per row in each field.
+    """
+    n = len(user_ids)
+    return {
+        "user_id": user_ids,
+        "timestamp": ["2024-01-01T12:00:00Z"] * n,
+        "decision_idx": decision_idxs,
+        "data": {
+            "context": {"temperature": temperatures},
+            "action": [1] * n,
+            "action_prob": [0.5] * n,
+            "state": [[t] for t in temperatures],
+            "outcome": {"clicks": list(range(n))},
+        },
+    }
+
+
+def test_upload_data_batch_success(client):
+    """
+    Tests uploading a batch of interaction data in columns.
+    """
+    from app.models import StudyData
+
+    client.post("/api/v1/add_user", json={"user_id": "a"})
+    client.post("/api/v1/add_user", json={"user_id": "b"})
+
+    response = client.post(
+        "/api/v1/upload_data_batch",
+        json=batch_payload(["a", "b", "a"], [0, 0, 1], [20, 21.5, 22]),
+    )
+
+    assert response.status_code == 201
+    assert response.json["count"] == 3
+    row = StudyData.query.filter_by(user_id="a", decision_idx=1).one()
+    assert row.raw_context == {"temperature": 22}
+    assert row.outcome == {"clicks": 2}
+    assert row.reward == 2.0
+
+
+def test_upload_data_batch_rejects_invalid_rows(client):
+    """
+    Tests that a batch is rejected as a whole if a column has a bad value.
+    """
+    client.post("/api/v1/add_user", json={"user_id": "a"})
+
+    response = client.post(
+        "/api/v1/upload_data_batch",
+        json=batch_payload(["a", "a"], [0, 1], [20, "hot"]),
+    )
+    assert response.status_code == 400
+    assert response.json["message"] == "Row 1: temperature must be a float or int."
+
+    response = client.post(
+        "/api/v1/upload_data_batch",
+        json=batch_payload(["a", "a"], [0, 0], [20, 21]),
+    )
+    assert response.status_code == 400
+    assert response.json["message"] == "Decision index already exists."
@@ -0,0 +1,98 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.logging_config import BackgroundQueueHandler
+from app.routes import health
+from app.routes.update import running_updates
+
+
+def test_healthz(client):
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json["status"] == "ok"
+    assert response.json["checks"]["updates"]["running"] == 0
+
+
+def test_healthz_fails_on_hung_update(app, client):
+    app.config["HEALTH_MAX_UPDATE_SECONDS"] = 10
+    running_updates["hung"] = time.monotonic() - 60
+    try:
+        response = client.get("/healthz")
+    finally:
+        running_updates.pop("hung")
+    assert response.status_code == 503
+    assert response.json["checks"]["updates"]["ok"] is False
+
+
+def test_readyz(client):
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    checks = response.json["checks"]
+    assert checks["database"]["ok"] is True
+    assert checks["default.parameters"]["version"] == 1
+    assert checks["logging"]["ok"] is True
+
+
+def test_readyz_fails_on_slow_database(app, client, monkeypatch):
+    monkeypatch.setattr(health, "round_trip", lambda engine: time.sleep(0.2))
+    app.config["HEALTH_DB_TIMEOUT_MS"] = 20
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["checks"]["database"]["ok"] is False
+    health.database_checks["default"].result(5)
+
+
+def test_readyz_fails_on_update_backlog(app, client, monkeypatch):
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app, "update_executor", executor, raising=False)
+    app.config["HEALTH_MAX_UPDATE_BACKLOG"] = 1
+    for _ in range(3):
+        executor.submit(release.wait, 5)
+    try:
+        response = client.get("/readyz")
+    finally:
+        release.set()
+        executor.shutdown()
+    assert response.status_code == 503
+    check = response.json["checks"]["default.update_backlog"]
+    assert check["ok"] is False
+    assert check["queued"] == 2
+
+
+def test_log_queue_waits_for_room_unless_dropping():
+    handler = BackgroundQueueHandler(queue.Queue(1))
+    handler.listener.stop()
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "message", None, None)
+    handler.emit(record)
+
+    writer = threading.Thread(target=handler.emit, args=(record,))
+    writer.start()
+    writer.join(0.1)
+    assert writer.is_alive()
+    handler.queue.get()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert handler.dropped == 0
+
+    handler.drop_when_full = True
+    handler.emit(record)
+    assert handler.dropped == 1
+
+
+def test_debug_vars_requires_admin_token(app, client):
+    assert client.get("/debug/vars").status_code == 403
+
+    app.config["ADMIN_TOKEN"] = "secret"
+    response = client.get("/debug/vars", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json["initialized"] is True
+    assert response.json["studies"]["default"]["parameters"]["version"] == 1
+    assert response.json["admission"] is None
+    backends = response.json["backends"]
+    assert backends["json"] in ("orjson", "json")
+    assert backends["kernels"] in ("numba", "numpy")
+    assert backends["normal_cdf"] in ("scipy", "numpy")
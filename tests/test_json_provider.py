@@ -0,0 +1,71 @@
+import datetime
+import json
+import numpy as np
+import pytest
+import app.json_provider as json_provider
+from app.json_provider import dumps, loads
+
+
+def test_dumps_numpy_and_dates():
+    data = {
+        "action": np.int64(1),
+        "prob": np.float32(0.5),
+        "state": np.array([1.5, 2.5]),
+        "flag": np.bool_(True),
+        "timestamp": datetime.datetime(2025, 1, 1, 12, 0, 0),
+    }
+    assert json.loads(dumps(data)) == {
+        "action": 1,
+        "prob": 0.5,
+        "state": [1.5, 2.5],
+        "flag": True,
+        "timestamp": "2025-01-01T12:00:00",
+    }
+
+
+def test_dumps_falls_back_for_wide_integers():
+    state = np.random.default_rng(0).bit_generator.state
+    assert loads(dumps(state)) == state
+
+
+def test_bit_generator_states_skip_orjson(monkeypatch):
+    if json_provider.orjson is None:
+        pytest.skip("orjson is not installed.")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("orjson was tried first.")
+
+    monkeypatch.setattr(json_provider.orjson, "dumps", fail)
+    state = np.random.default_rng(0).bit_generator.state
+    assert json.loads(dumps(state)) == state
+
+
+def test_dumps_without_orjson(monkeypatch):
+    monkeypatch.setattr(json_provider, "orjson", None)
+    assert loads(dumps({"b": np.int64(2), "a": [np.float64(1.0)]}, sort_keys=True)) == {
+        "a": [1.0],
+        "b": 2,
+    }
+
+
+def test_jsonify_numpy_values(app):
+    from flask import jsonify
+
+    response = jsonify({"action": np.int64(1), "state": np.array([22.0])})
+    assert response.mimetype == "application/json"
+    assert response.get_json() == {"action": 1, "state": [22.0]}
+
+
+def test_random_state_round_trips_through_database(app, client):
+    from app.models import Action
+
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    client.post("/api/v1/action", json={
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    })
+    random_state = Action.query.one().random_state
+    assert random_state["bit_generator"] == "PCG64"
+    assert isinstance(random_state["state"]["state"], int)
@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+from app import create_app, db
+from app.algorithms.kernels import (
+    cholesky_loops,
+    get_kernels,
+    numba_available,
+    sample_scores_loops,
+)
+from app.algorithms.linear_ts import LinearTSAlgorithm
+from app.batch import JSONColumn, StudyBatch
+from config import TestingConfig
+
+
+def random_problem(d=4, n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    a = rng.normal(size=(d, d))
+    return rng.normal(size=d), rng.normal(size=d), a @ a.T + np.eye(d), rng.normal(size=(n, d))
+
+
+def test_numpy_kernels_match_loops():
+    state, mean, cov, noise = random_problem()
+    kernels = get_kernels("numpy")
+
+    chol = kernels.cholesky(cov)
+    np.testing.assert_allclose(cholesky_loops(cov), chol)
+    np.testing.assert_allclose(
+        kernels.sample_scores(state, mean, chol, noise),
+        sample_scores_loops(state, mean, chol, noise),
+    )
+    np.testing.assert_allclose(
+        kernels.sample_scores(state, mean, chol, noise),
+        (mean + noise @ chol.T) @ state,
+    )
+
+
+def test_numba_kernels_match_numpy():
+    if not numba_available():
+        pytest.skip("Numba is not installed.")
+    state, mean, cov, noise = random_problem()
+    compiled, reference = get_kernels("numba"), get_kernels("numpy")
+
+    compiled.warm_up(4)
+    assert compiled.warmed_up
+    np.testing.assert_allclose(compiled.cholesky(cov), reference.cholesky(cov))
+    chol = reference.cholesky(cov)
+    np.testing.assert_allclose(
+        compiled.sample_scores(state, mean, chol, noise),
+        reference.sample_scores(state, mean, chol, noise),
+    )
+
+
+def treatment_batch(n=2000, seed=1):
+    rng = np.random.default_rng(seed)
+    temperature = rng.uniform(10, 30, n)
+    states = np.column_stack([np.ones(n), temperature]).astype(np.float32)
+    actions = rng.integers(0, 2, n)
+    # Action 1 helps below 20 degrees and hurts above
+    rewards = 1.0 + actions * (2.0 - 0.1 * temperature) + rng.normal(0, 0.1, n)
+    return StudyBatch(
+        np.arange(1, n + 1),
+        np.array([f"user_{i}" for i in range(10)]),
+        (np.arange(n) % 10).astype(np.int32),
+        np.zeros(n, dtype=np.int32),
+        actions.astype(np.int32),
+        np.full(n, 0.5),
+        rewards,
+        states,
+        JSONColumn.from_texts(["{}"] * n),
+        JSONColumn.from_texts(["{}"] * n),
+    )
+
+
+def test_update_recovers_treatment_effect():
+    n = 2000
+    batch = treatment_batch(n)
+
+    algorithm = LinearTSAlgorithm(seed=0, backend="numpy", noise_variance=0.01)
+    status, parameters = algorithm.update(
+        {"probability_of_action": 0.5, "mean": np.zeros(4), "cov": np.eye(4) * 10},
+        {"batch": batch, "seed": (0, n)},
+    )
+    assert status
+    np.testing.assert_allclose(parameters["mean"], [1.0, 0.0, 2.0, -0.1], atol=0.05)
+
+    action_parameters = algorithm.action_parameters(parameters)
+    action, probability, _ = algorithm.get_action("user_0", [1.0, 12.0], action_parameters, 0)
+    assert (action, probability) == (1, 1.0)
+    action, probability, _ = algorithm.get_action("user_0", [1.0, 28.0], action_parameters, 0)
+    assert action == 0
+    assert probability == pytest.approx(0.0)
+
+
+def test_update_starts_from_the_prior():
+    batch = treatment_batch(200)
+    algorithm = LinearTSAlgorithm(seed=0, backend="numpy", noise_variance=0.01)
+    vague = {"probability_of_action": 0.5, "mean": np.zeros(4), "cov": np.eye(4) * 10}
+    # A tight prior that the treatment effect is 5 at every temperature
+    tight = {
+        "probability_of_action": 0.5,
+        "mean": np.array([0.0, 0.0, 5.0, 0.0]),
+        "cov": np.eye(4) * 1e-6,
+    }
+
+    _, from_vague = algorithm.update(vague, {"batch": batch, "seed": (0, 200)})
+    _, from_tight = algorithm.update(tight, {"batch": batch, "seed": (0, 200)})
+    assert from_vague["mean"][2] == pytest.approx(2.0, abs=0.1)
+    assert from_tight["mean"][2] == pytest.approx(5.0, abs=0.01)
+    np.testing.assert_array_equal(from_tight["prior_mean"], tight["mean"])
+
+    # Later updates refit from the prior, not from the previous posterior
+    _, refit = algorithm.update(from_tight, {"batch": batch, "seed": (0, 200)})
+    np.testing.assert_allclose(refit["mean"], from_tight["mean"])
+    np.testing.assert_allclose(refit["cov"], from_tight["cov"])
+
+
+class LinearTSConfig(TestingConfig):
+    RL_ALGORITHM = "linear_ts"
+    RL_ALGORITHM_KWARGS = {"backend": "numpy"}
+    MODEL_PRIORS = {
+        "probability_of_action": 0.5,
+        "mean": np.zeros(4),
+        "cov": np.eye(4),
+    }
+
+
+@pytest.fixture
+def linear_ts_client(tmp_path):
+    config = type("Config", (LinearTSConfig,), {"PARAMETERS_DIR": str(tmp_path)})
+    app_instance = create_app(config)
+    with app_instance.app_context():
+        yield app_instance.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_action_from_prior(linear_ts_client):
+    assert get_kernels("numpy").warmed_up
+
+    linear_ts_client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    response = linear_ts_client.post("/api/v1/action", json={
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    })
+    assert response.status_code == 201
+    assert response.json["action"] in (0, 1)
+    assert 0 < response.json["action_prob"] <= 1
+
+
+def test_array_parameters_require_the_parameter_store():
+    with pytest.raises(ValueError, match="PARAMETERS_DIR"):
+        create_app(LinearTSConfig)
+
@@ -0,0 +1,72 @@
+import numpy as np
+from app.algorithms.mapreduce import MapReduceAlgorithm, split_batch
+from app.batch import JSONColumn, StudyBatch
+
+
+class MeanRewardAlgorithm(MapReduceAlgorithm):
+    name = "mean_reward"
+    n_shards = 4
+
+    def map_shard(self, old_params, shard, rng):
+        return np.nansum(shard.rewards), len(shard), rng.random()
+
+    def reduce_shards(self, old_params, results):
+        total, count, noise = (sum(values) for values in zip(*results))
+        return True, {"mean_reward": total / count, "noise": noise}
+
+    def get_action(self, user_id, state, parameters, decision_idx):
+        return 0, 1.0, {}
+
+    def make_state(self, context):
+        return True, []
+
+    def make_reward(self, user_id, state, action, outcome):
+        return True, 0.0
+
+
+def make_batch(n_rows=200, n_users=20):
+    users = np.array([f"user_{i}" for i in range(n_users)])
+    codes = np.arange(n_rows) % n_users
+    return StudyBatch(
+        np.arange(1, n_rows + 1),
+        users,
+        codes.astype(np.int32),
+        (np.arange(n_rows) // n_users).astype(np.int32),
+        (np.arange(n_rows) % 2).astype(np.int32),
+        np.full(n_rows, 0.5),
+        np.arange(n_rows, dtype=np.float64),
+        np.zeros((n_rows, 1), dtype=np.float32),
+        JSONColumn.from_texts(["{}"] * n_rows),
+        JSONColumn.from_texts([f'{{"i": {i}}}' for i in range(n_rows)]),
+    )
+
+
+def test_split_batch_keeps_users_together():
+    batch = make_batch()
+    shards = split_batch(batch, 4)
+
+    assert sum(len(shard) for _, shard in shards) == len(batch)
+    seen = set()
+    for _, shard in shards:
+        users = set(shard.user_ids.tolist())
+        assert not users & seen
+        seen |= users
+        assert np.all(np.diff(shard.ids) > 0)
+        assert [row["i"] for row in shard.outcomes] == (shard.ids - 1).tolist()
+
+
+def test_update_is_deterministic_across_process_counts():
+    algorithm = MeanRewardAlgorithm()
+    batch = make_batch()
+    data = {"batch": batch, "seed": (42, 200)}
+
+    status, serial = algorithm.update({}, {**data, "processes": 1})
+    assert status
+    assert serial["mean_reward"] == np.mean(batch.rewards)
+
+    status, parallel = algorithm.update({}, {**data, "processes": 2})
+    assert status
+    assert parallel == serial
+
+    status, reseeded = algorithm.update({}, {**data, "seed": (42, 201)})
+    assert reseeded["noise"] != serial["noise"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from app.extensions import db
+from app.models import StudyData
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+from app.ope import evaluate_policy, iter_study_data_chunks
+
+
+def add_study_data(n, action_prob=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        temperature = float(rng.normal(28, 5))
+        action = int(rng.random() < action_prob)
+        reward = 2.0 + action * (1.0 if temperature < 30 else -0.5) + rng.normal()
+        db.session.add(
+            StudyData(
+                user_id=f"user_{i % 5}",
+                decision_idx=i,
+                action=action,
+                action_prob=action_prob,
+                state=[temperature],
+                raw_context={"temperature": temperature},
+                outcome={"clicks": reward},
+                reward=reward,
+                request_timestamp="2025-01-01T12:00:00",
+            )
+        )
+    db.session.commit()
+
+
+def test_iter_study_data_chunks(app):
+    add_study_data(25)
+    chunks = list(iter_study_data_chunks(chunk_size=10))
+    assert [len(chunk["action"]) for chunk in chunks] == [10, 10, 5]
+    assert chunks[0]["state"].shape == (10, 1)
+
+
+def test_evaluate_logging_policy_matches_behavior(app):
+    add_study_data(200)
+    result = evaluate_policy(
+        FlatProbRLAlgorithm(seed=0), {"probability": 0.5}, chunk_size=64, n_bootstrap=50
+    )
+    assert result["n"] == 200
+    # Evaluating the logging policy gives weights of one
+    assert result["ipw"]["estimate"] == pytest.approx(result["behavior"]["estimate"])
+    assert result["snipw"]["estimate"] == pytest.approx(result["behavior"]["estimate"])
+    lower, upper = result["dr"]["ci"]
+    assert lower <= result["dr"]["estimate"] <= upper
+
+
+def test_importance_weights_use_probability_of_action_one(app):
+    # The logged action_prob is P(A=1), so rows with action 0 have
+    # behavior probability 0.7
+    add_study_data(200, action_prob=0.3)
+    result = evaluate_policy(
+        FlatProbRLAlgorithm(seed=0), {"probability": 0.3}, chunk_size=64, n_bootstrap=10
+    )
+    assert result["ipw"]["estimate"] == pytest.approx(result["behavior"]["estimate"])
+
+
+def test_evaluate_policy_is_deterministic_across_processes(app):
+    add_study_data(100)
+    algorithm = FlatProbRLAlgorithm(seed=0)
+    serial = evaluate_policy(algorithm, {"probability": 0.8}, chunk_size=30, n_bootstrap=20)
+    parallel = evaluate_policy(
+        algorithm, {"probability": 0.8}, chunk_size=30, n_bootstrap=20, processes=2
+    )
+    assert serial == parallel
+    assert serial["ipw"]["estimate"] != serial["behavior"]["estimate"]
+
+
+def test_evaluate_policy_without_data(app):
+    with pytest.raises(ValueError):
+        evaluate_policy(FlatProbRLAlgorithm(seed=0), {"probability": 0.5})
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from app.parameter_store import ParameterStore, split_array_parameters
+
+
+def test_publish_and_get(tmp_path):
+    store = ParameterStore(str(tmp_path))
+    store.publish("prior_mean", np.arange(6, dtype=np.float64).reshape(2, 3))
+
+    array = store.get("prior_mean")
+    assert isinstance(array, np.memmap)
+    np.testing.assert_array_equal(array, [[0, 1, 2], [3, 4, 5]])
+    assert store.names() == ["prior_mean"]
+
+
+def test_mapped_arrays_are_read_only(tmp_path):
+    store = ParameterStore(str(tmp_path))
+    store.publish("prior_mean", np.zeros(3))
+
+    with pytest.raises(ValueError):
+        store.get("prior_mean")[0] = 1.0
+
+
+def test_hot_swap_is_visible_to_other_readers(tmp_path):
+    writer = ParameterStore(str(tmp_path))
+    reader = ParameterStore(str(tmp_path))
+
+    writer.publish("theta", np.zeros(3))
+    old = reader.get("theta")
+    np.testing.assert_array_equal(old, np.zeros(3))
+
+    writer.publish("theta", np.ones(3))
+    np.testing.assert_array_equal(reader.get("theta"), np.ones(3))
+
+    # Arrays mapped before the swap keep their old values
+    np.testing.assert_array_equal(old, np.zeros(3))
+
+
+def test_split_array_parameters():
+    scalars, arrays = split_array_parameters(
+        {"probability_of_action": 0.5, "prior_mean": [0.0, 1.0]}
+    )
+    assert scalars == {"probability_of_action": 0.5}
+    assert list(arrays) == ["prior_mean"]
+    assert isinstance(arrays["prior_mean"], np.ndarray)
+
+
+def test_readers_see_whole_versions(tmp_path):
+    writer = ParameterStore(str(tmp_path))
+    reader = ParameterStore(str(tmp_path))
+
+    writer.publish_all({"mean": np.zeros(2), "cov": np.eye(2)})
+    first = reader.arrays()
+    assert reader.arrays() is first
+
+    # Publishing one array carries the others over into the new version
+    writer.publish("mean", np.ones(2))
+    second = reader.arrays()
+    assert second is not first
+    assert sorted(second) == ["cov", "mean"]
+    np.testing.assert_array_equal(second["mean"], np.ones(2))
+    np.testing.assert_array_equal(second["cov"], np.eye(2))
+    np.testing.assert_array_equal(first["mean"], np.zeros(2))
+
+    # Only the current version and the one before it are kept
+    writer.publish("mean", np.full(2, 2.0))
+    assert len(list((tmp_path / "versions").iterdir())) == 2
@@ -0,0 +1,90 @@
+import datetime
+import pytest
+from app.models import Action
+from app.partitioning import (
+    PartitionError,
+    PartitionScheme,
+    convert_table_sql,
+    create_partition_sql,
+    ensure_configured_partitions,
+    partition_sql,
+)
+
+
+def test_monthly_ranges_and_names():
+    scheme = PartitionScheme("request_timestamp", "month")
+    ranges = scheme.ranges(
+        datetime.datetime(2024, 11, 15, 8), datetime.datetime(2025, 1, 2)
+    )
+    assert [scheme.suffix(lower) for lower, _ in ranges] == [
+        "p2024_11",
+        "p2024_12",
+        "p2025_01",
+    ]
+    assert ranges[1][1] == datetime.datetime(2025, 1, 1)
+    assert scheme.parse_suffix("p2024_12") == datetime.datetime(2024, 12, 1)
+    assert scheme.parse_suffix("default") is None
+
+
+def test_weekly_partitions_start_on_monday():
+    scheme = PartitionScheme("request_timestamp", "week")
+    lower = scheme.lower_bound(datetime.datetime(2025, 1, 1, 12))
+    assert lower == datetime.datetime(2024, 12, 30)
+    assert scheme.next_bound(lower) == datetime.datetime(2025, 1, 6)
+
+
+def test_decision_idx_partitions():
+    scheme = PartitionScheme("decision_idx", 100)
+    assert scheme.ranges(150, 310) == [(100, 200), (200, 300), (300, 400)]
+    assert partition_sql("actions", scheme, 100, 200) == (
+        "CREATE TABLE IF NOT EXISTS actions_p000100 PARTITION OF actions "
+        "FOR VALUES FROM (100) TO (200)"
+    )
+
+
+def test_invalid_schemes():
+    with pytest.raises(PartitionError):
+        PartitionScheme("created_at", "month")
+    with pytest.raises(PartitionError):
+        PartitionScheme("decision_idx", "month")
+
+
+def test_convert_table_sql_keeps_indexes_and_foreign_keys():
+    scheme = PartitionScheme("request_timestamp", "month")
+    start = datetime.datetime(2025, 1, 1)
+    statements = convert_table_sql(
+        Action.__table__, scheme, [(start, scheme.next_bound(start))]
+    )
+    assert statements[0] == "ALTER TABLE actions RENAME TO actions_unpartitioned"
+    assert "PARTITION BY RANGE (request_timestamp)" in statements[2]
+    assert "ALTER TABLE actions ADD PRIMARY KEY (id, request_timestamp)" in statements
+    assert (
+        "CREATE TABLE IF NOT EXISTS actions_p2025_01 PARTITION OF actions FOR VALUES "
+        "FROM ('2025-01-01 00:00:00') TO ('2025-02-01 00:00:00')"
+    ) in statements
+    # Indexes are created after the old table and its index names are gone
+    drop = statements.index("DROP TABLE actions_unpartitioned")
+    assert any("FOREIGN KEY(model_parameters_id)" in s for s in statements[drop:])
+    assert any("ix_actions_user_id_idempotency_key" in s for s in statements[drop:])
+    assert (
+        "ALTER TABLE actions ADD CONSTRAINT uq_actions_user_id_decision_idx "
+        "UNIQUE (user_id, decision_idx, request_timestamp)"
+    ) in statements[drop:]
+
+
+def test_ensure_partitions_skips_other_databases(app):
+    app.config["PARTITIONED_TABLES"] = ("actions",)
+    assert ensure_configured_partitions(app) == []
+
+
+def test_create_partition_sql_moves_rows_out_of_default_partition():
+    scheme = PartitionScheme("decision_idx", 100)
+    statements = create_partition_sql("study_data", scheme, 200, 300)
+    in_range = "decision_idx >= 200 AND decision_idx < 300"
+    assert statements[:3] == [
+        "CREATE TEMPORARY TABLE study_data_p000200_moved AS "
+        f"SELECT * FROM study_data_default WHERE {in_range}",
+        f"DELETE FROM study_data_default WHERE {in_range}",
+        partition_sql("study_data", scheme, 200, 300),
+    ]
+    assert statements[3] == "INSERT INTO study_data SELECT * FROM study_data_p000200_moved"
@@ -0,0 +1,97 @@
+import json
+import pickle
+import numpy as np
+import pytest
+from app import create_app, db
+from app.models import ModelParameters
+from app.priors import load_priors, save_priors, validate_priors, PriorsError
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+from config import TestingConfig
+
+SCHEMA = {"probability_of_action": float, "mean": ("d",), "cov": ("d", "d")}
+
+
+def make_priors():
+    return {
+        "probability_of_action": 0.5,
+        "mean": np.arange(3, dtype=np.float64),
+        "cov": np.eye(3),
+    }
+
+
+def test_load_npz_priors_memory_maps_arrays(tmp_path):
+    path = str(tmp_path / "priors.npz")
+    save_priors(make_priors(), path)
+
+    priors = load_priors(path, SCHEMA)
+    assert priors["probability_of_action"] == 0.5
+    assert isinstance(priors["cov"], np.memmap)
+    np.testing.assert_array_equal(priors["cov"], np.eye(3))
+    np.testing.assert_array_equal(priors["mean"], [0, 1, 2])
+
+
+def test_load_compressed_npz_priors(tmp_path):
+    path = str(tmp_path / "priors.npz")
+    np.savez_compressed(path, **make_priors())
+
+    priors = load_priors(path, SCHEMA)
+    np.testing.assert_array_equal(priors["cov"], np.eye(3))
+
+
+def test_load_manifest_priors(tmp_path):
+    np.save(tmp_path / "cov.npy", np.eye(3))
+    manifest = {
+        "probability_of_action": 0.5,
+        "mean": [0.0, 1.0, 2.0],
+        "cov": {"file": "cov.npy"},
+    }
+    path = tmp_path / "priors.json"
+    path.write_text(json.dumps(manifest))
+
+    priors = load_priors(str(path), SCHEMA)
+    assert isinstance(priors["cov"], np.memmap)
+    np.testing.assert_array_equal(priors["mean"], [0, 1, 2])
+
+
+def test_load_pickle_priors(tmp_path):
+    path = tmp_path / "priors.pkl"
+    with open(path, "wb") as f:
+        pickle.dump({"probability_of_action": 0.3}, f)
+
+    priors = load_priors(str(path), FlatProbRLAlgorithm.parameter_schema)
+    assert priors == {"probability_of_action": 0.3}
+
+
+def test_priors_pickle_file_ignores_extension(tmp_path):
+    path = str(tmp_path / "priors.bin")
+    with open(path, "wb") as f:
+        pickle.dump({"probability_of_action": 0.3}, f)
+
+    config = type("Config", (TestingConfig,), {"PRIORS_PICKLE_FILE": path})
+    app_instance = create_app(config)
+    with app_instance.app_context():
+        assert ModelParameters.query.first().probability_of_action == 0.3
+        db.session.remove()
+        db.drop_all()
+
+
+def test_load_priors_unsupported_format(tmp_path):
+    with pytest.raises(PriorsError):
+        load_priors(str(tmp_path / "priors.csv"))
+
+
+def test_validate_priors_missing_parameter():
+    with pytest.raises(PriorsError, match="missing the parameter probability_of_action"):
+        validate_priors({}, FlatProbRLAlgorithm.parameter_schema)
+
+
+def test_validate_priors_inconsistent_dimensions():
+    priors = make_priors()
+    priors["cov"] = np.eye(4)
+    with pytest.raises(PriorsError, match="shape"):
+        validate_priors(priors, SCHEMA)
+
+
+def test_validate_priors_wrong_type():
+    with pytest.raises(PriorsError, match="type float"):
+        validate_priors({"probability_of_action": "0.5"}, FlatProbRLAlgorithm.parameter_schema)
@@ -0,0 +1,103 @@
+import math
+import pickle
+import numpy as np
+import pytest
+from app.algorithms.blr_ts import BayesianLinearTSAlgorithm
+from app.algorithms.kernels import sample_score_matrix
+from app.algorithms.probability import (
+    ProbabilityService,
+    erfc,
+    linear_gaussian_probability,
+    normal_cdf,
+)
+
+
+def test_normal_cdf():
+    np.testing.assert_allclose(
+        normal_cdf([0.0, 1.0, -1.96]), [0.5, 0.8413447460685429, 0.024997895148220435]
+    )
+    # The lower tail keeps its relative precision
+    assert normal_cdf(-20.0) == pytest.approx(2.7536241186e-89)
+
+
+def test_vectorized_erfc_matches_math_erfc():
+    x = np.concatenate([np.linspace(-6, 26, 5001), [0.46875, -0.46875, 4.0, -4.0]])
+    expected = np.array([math.erfc(value) for value in x])
+    np.testing.assert_allclose(erfc(x), expected, rtol=1e-14)
+    np.testing.assert_array_equal(erfc([30.0, np.inf, -np.inf]), [0.0, 0.0, 2.0])
+
+    # Large arrays take the vectorized path
+    tail = np.full(2000, -20.0)
+    np.testing.assert_allclose(normal_cdf(tail), 2.7536241186e-89, rtol=1e-9)
+
+
+def test_linear_gaussian_probability_matches_monte_carlo():
+    rng = np.random.default_rng(0)
+    mean = np.array([0.3, -0.2])
+    chol = np.array([[1.0, 0.0], [0.5, 0.8]])
+    states = np.array([[1.0, 0.0], [1.0, 2.0], [0.0, 0.0]])
+
+    probabilities = linear_gaussian_probability(states, mean, chol)
+    draws = mean + rng.standard_normal((200000, 2)) @ chol.T
+    np.testing.assert_allclose(probabilities[:2], np.mean(draws @ states[:2].T > 0, axis=0), atol=0.01)
+    # A state with no uncertainty takes action 1 only if its mean is positive
+    assert probabilities[2] == 0.0
+
+
+def sampler(states, parameters, noise):
+    return sample_score_matrix(states, parameters["mean"], parameters["chol"], noise)
+
+
+def closed_form(states, parameters):
+    return linear_gaussian_probability(states, parameters["mean"], parameters["chol"])
+
+
+def test_cache_is_keyed_by_version_and_state():
+    service = ProbabilityService(closed_form=closed_form, cache_size=2)
+    parameters = {"version": 1, "mean": np.array([1.0]), "chol": np.eye(1)}
+
+    first = service.probability(parameters, [1.0])
+    assert service.probability(parameters, np.array([1.0])) == first
+    assert service.probability({**parameters, "version": 2, "mean": np.array([-1.0])}, [1.0]) < 0.5
+    assert service.stats()["hits"] == 1
+    assert service.stats()["misses"] == 2
+
+    # Parameters without a version are computed every time
+    service.probability({"mean": np.array([1.0]), "chol": np.eye(1)}, [1.0])
+    assert service.stats()["size"] == 2
+    assert service.stats()["closed_form"] == 3
+
+
+def test_monte_carlo_fallback():
+    service = ProbabilityService(sampler=sampler, samples=20000, seed=0)
+    parameters = {"version": 1, "mean": np.array([0.5, 0.0]), "chol": np.eye(2)}
+
+    probability = service.probability(parameters, [1.0, 1.0])
+    assert probability == pytest.approx(closed_form(np.array([[1.0, 1.0]]), parameters)[0], abs=0.02)
+    assert service.stats()["monte_carlo"] == 1
+
+    # One set of draws scores a batch of states
+    states = np.array([[1.0, 1.0], [1.0, -2.0], [0.0, 3.0]])
+    np.testing.assert_allclose(
+        service.probabilities(parameters, states), closed_form(states, parameters), atol=0.02
+    )
+    assert service.stats()["monte_carlo"] == 4
+
+    # The service can be sent to worker processes, without its cache
+    copy = pickle.loads(pickle.dumps(service))
+    assert copy.stats()["size"] == 0
+
+
+def test_blr_ts_action_probabilities():
+    algorithm = BayesianLinearTSAlgorithm(seed=0, backend="numpy")
+    parameters = algorithm.action_parameters(
+        {"mean": [0.0, 0.0, 1.0, -0.1], "cov": np.diag([1.0, 1.0, 1.0, 1e-4])}
+    )
+    states = np.array([[1.0, 0.0], [1.0, 10.0], [1.0, 100.0]])
+
+    probabilities = algorithm.action_probabilities(["u"] * 3, states, parameters, [0] * 3)
+    np.testing.assert_allclose(probabilities, [0.8413447460685429, 0.5, 0.1])
+
+    action, probability, _ = algorithm.get_action("u", states[0], parameters, 0)
+    assert probability == pytest.approx(probabilities[0])
+    assert algorithm.stats()["probabilities"]["closed_form"] == 4
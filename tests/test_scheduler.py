@@ -0,0 +1,163 @@
+import datetime
+import time
+import numpy as np
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+from app.extensions import db
+from app.models import ModelParameters, ModelUpdateRequests, StudyData
+from app.routes.update import process_update_request
+from app.scheduler import CronSchedule, UpdateScheduler
+
+
+def add_study_data(decision_idx):
+    db.session.add(
+        StudyData(
+            user_id="test_user_123",
+            decision_idx=decision_idx,
+            action=1,
+            action_prob=0.5,
+            state=[20.0],
+            raw_context={"temperature": 20},
+            outcome={"clicks": 1},
+            reward=1.0,
+            request_timestamp="2025-01-01T12:00:00",
+        )
+    )
+    db.session.commit()
+
+
+def add_update_request(update_id):
+    db.session.add(
+        ModelUpdateRequests(
+            update_id, "", "2025-01-01T12:00:00", created_at="2025-01-01T12:00:00"
+        )
+    )
+    db.session.commit()
+
+
+def test_cron_schedule_next_after():
+    daily = CronSchedule("0 3 * * *")
+    assert daily.next_after(datetime.datetime(2025, 1, 1, 3, 0)) == datetime.datetime(
+        2025, 1, 2, 3, 0
+    )
+
+    weekdays = CronSchedule("*/30 9-10 * * 1-5")
+    # Saturday 4 January 2025 goes to Monday
+    assert weekdays.next_after(
+        datetime.datetime(2025, 1, 4, 12, 0)
+    ) == datetime.datetime(2025, 1, 6, 9, 0)
+    assert weekdays.next_after(
+        datetime.datetime(2025, 1, 6, 9, 10)
+    ) == datetime.datetime(2025, 1, 6, 9, 30)
+
+
+def test_update_is_skipped_without_new_data(app):
+    algorithm = FlatProbRLAlgorithm(seed=0, update_delay=0)
+    add_study_data(0)
+
+    add_update_request("first")
+    process_update_request(app, "first", algorithm, "")
+    assert ModelParameters.query.count() == 2
+    assert ModelUpdateRequests.query.filter_by(update_id="first").one().status == "completed"
+
+    add_update_request("second")
+    process_update_request(app, "second", algorithm, "")
+    assert ModelParameters.query.count() == 2
+    assert ModelUpdateRequests.query.filter_by(update_id="second").one().status == "skipped"
+
+    add_study_data(1)
+    add_update_request("third")
+    process_update_request(app, "third", algorithm, "")
+    assert ModelParameters.query.count() == 3
+
+
+def test_debounced_requests_share_one_update(app):
+    app.rl_algorithm = FlatProbRLAlgorithm(seed=0, update_delay=0)
+    add_study_data(0)
+
+    scheduler = UpdateScheduler(app, debounce_seconds=0.2)
+    scheduler.start()
+    for update_id in ("a", "b", "c"):
+        add_update_request(update_id)
+        scheduler.submit(update_id, "")
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and scheduler.triggered["request"] == 0:
+        time.sleep(0.05)
+    scheduler.stop(timeout=5)
+
+    assert scheduler.triggered["request"] == 1
+    assert scheduler.coalesced == 2
+    assert ModelParameters.query.count() == 2
+    assert {r.status for r in ModelUpdateRequests.query.all()} == {"completed"}
+
+
+def test_data_threshold_triggers_update(app):
+    app.rl_algorithm = FlatProbRLAlgorithm(seed=0, update_delay=0)
+    scheduler = UpdateScheduler(app, min_new_rows=2, poll_seconds=0)
+
+    add_study_data(0)
+    assert scheduler.tick() is None
+
+    add_study_data(1)
+    assert scheduler.tick() == "data_threshold"
+    request = ModelUpdateRequests.query.one()
+    assert request.trigger_reason == "data_threshold"
+    assert request.status == "completed"
+    assert scheduler.new_rows() == 0
+
+
+def test_update_consumes_rows_committed_late(app, monkeypatch):
+    for decision_idx in range(3):
+        add_study_data(decision_idx)
+    # The second row took its id but has not committed yet
+    late = db.session.get(StudyData, 2)
+    db.session.delete(late)
+    db.session.commit()
+
+    algorithm = FlatProbRLAlgorithm(seed=0, update_delay=0)
+    algorithm.incremental_updates = True
+    batches = []
+    original_update = algorithm.update
+    monkeypatch.setattr(
+        algorithm,
+        "update",
+        lambda params, data: batches.append(data["batch"]) or original_update(params, data),
+    )
+
+    add_update_request("first")
+    process_update_request(app, "first", algorithm, "")
+    assert sorted(batches[0].ids.tolist()) == [1, 3]
+    first = ModelParameters.query.order_by(ModelParameters.id.desc()).first()
+    assert first.data_watermark == 3
+    assert {row.id: row.consumed_by for row in StudyData.query} == {
+        1: first.id,
+        3: first.id,
+    }
+
+    # The row commits below the watermark and is read by the next update
+    add_study_data(1)
+    db.session.execute(db.update(StudyData).where(StudyData.id == 4).values(id=2))
+    db.session.commit()
+
+    add_update_request("second")
+    process_update_request(app, "second", algorithm, "")
+    assert batches[1].ids.tolist() == [2]
+    second = ModelParameters.query.order_by(ModelParameters.id.desc()).first()
+    assert db.session.get(StudyData, 2).consumed_by == second.id
+
+
+def test_update_with_arrays_fails_without_the_parameter_store(app, monkeypatch):
+    algorithm = FlatProbRLAlgorithm(seed=0, update_delay=0)
+    monkeypatch.setattr(
+        algorithm,
+        "update",
+        lambda params, data: (True, {"probability_of_action": 0.5, "weights": np.zeros(3)}),
+    )
+    add_study_data(0)
+
+    add_update_request("arrays")
+    process_update_request(app, "arrays", algorithm, "")
+    request = ModelUpdateRequests.query.filter_by(update_id="arrays").one()
+    assert request.status == "failed"
+    assert "PARAMETERS_DIR" in request.error_message
+    assert ModelParameters.query.count() == 1
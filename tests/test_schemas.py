@@ -0,0 +1,60 @@
+from app.schemas import Schema, Field
+
+CONTEXT = Schema(
+    {
+        "temperature": Field((float, int), invalid="temperature must be a float or int."),
+        "steps": Field(int, required=False),
+    },
+    name="context",
+)
+REQUEST = Schema({"user_id": Field(str), "context": Field(dict, schema=CONTEXT)})
+
+
+def test_validate_messages():
+    assert REQUEST.validate(None) == (False, "user_id is required.")
+    assert REQUEST.validate({"user_id": 1}) == (False, "user_id must be a string.")
+    assert REQUEST.validate({"user_id": "a"}) == (False, "context is required.")
+    assert REQUEST.validate({"user_id": "a", "context": []}) == (
+        False,
+        "context must be a dictionary.",
+    )
+    assert REQUEST.validate({"user_id": "a", "context": {}}) == (
+        False,
+        "Invalid context. Temperature is required.",
+    )
+    assert REQUEST.validate({"user_id": "a", "context": {"temperature": "x"}}) == (
+        False,
+        "temperature must be a float or int.",
+    )
+
+
+def test_validate_optional_fields():
+    data = {"user_id": "a", "context": {"temperature": 20}}
+    assert REQUEST.validate(data) == (True, "")
+    data["context"]["steps"] = 1.5
+    assert REQUEST.validate(data) == (False, "steps must be an integer.")
+
+
+def test_validate_columns():
+    data = {"user_id": ["a", "b"], "context": {"temperature": [20, 21.5]}}
+    assert REQUEST.validate_columns(data) == (True, "")
+
+    data["context"]["temperature"] = [20, None]
+    assert REQUEST.validate_columns(data) == (
+        False,
+        "Row 1: temperature must be a float or int.",
+    )
+
+    data["context"]["temperature"] = [20]
+    assert REQUEST.validate_columns(data) == (False, "temperature must have 2 values.")
+
+    data["context"]["temperature"] = 20
+    assert REQUEST.validate_columns(data) == (
+        False,
+        "temperature must be a list of values.",
+    )
+
+
+def test_validate_columns_accepts_subclasses():
+    schema = Schema({"count": Field(int)})
+    assert schema.validate_columns({"count": [1, True]}) == (True, "")
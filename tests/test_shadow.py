@@ -0,0 +1,49 @@
+import time
+from app import initialize_app
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+from app.models import ShadowAction
+from app.shadow import ShadowEvaluator
+
+
+def test_shadow_drops_requests_when_queue_is_full(app):
+    evaluator = ShadowEvaluator(app, FlatProbRLAlgorithm(seed=0), queue_size=1)
+
+    assert evaluator.submit("a", 0, {"temperature": 20}, {"probability_of_action": 0.5}, 1, 1)
+    assert not evaluator.submit("b", 0, {"temperature": 20}, {"probability_of_action": 0.5}, 1, 0)
+
+    stats = evaluator.stats()
+    assert stats["submitted"] == 1
+    assert stats["dropped"] == 1
+    assert stats["queued"] == 1
+
+
+def test_shadow_process_skips_invalid_contexts(app):
+    evaluator = ShadowEvaluator(app, FlatProbRLAlgorithm(seed=0))
+    batch = [
+        ("a", 0, {"temperature": 20}, {"probability_of_action": 0.5}, 1, 1),
+        ("b", 0, {}, {"probability_of_action": 0.5}, 1, 0),
+    ]
+    assert evaluator.process(batch) == 1
+    assert evaluator.failed == 1
+    assert ShadowAction.query.one().user_id == "a"
+
+
+def test_action_request_is_shadowed(app, client):
+    app.initialized = False
+    app.config["SHADOW_ALGORITHM"] = "flat_prob"
+    initialize_app(app)
+
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    response = client.post("/api/v1/action", json={
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+    })
+    assert response.status_code == 201
+
+    app.shadow_evaluator.stop(timeout=5)
+    shadow_action = ShadowAction.query.one()
+    assert shadow_action.algorithm_version == "flat_prob@1.0.0"
+    assert shadow_action.primary_action == response.json["action"]
+    assert shadow_action.action_prob == 0.5
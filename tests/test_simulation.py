@@ -0,0 +1,65 @@
+import logging
+import numpy as np
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+from app.logging_config import get_rl_logger
+from app.simulation import run_simulation, simulate_replicate, TemperatureClicksEnvironment
+
+PRIORS = {"probability_of_action": 0.5}
+KWARGS = {"update_delay": 0}
+
+
+def test_simulate_replicate():
+    result = simulate_replicate(
+        FlatProbRLAlgorithm, PRIORS, n_users=20, n_decisions=10, update_every=5,
+        seed=1, algorithm_kwargs=KWARGS,
+    )
+    assert result["decisions"] == 200
+    assert result["updates"] == 2
+    assert result["regret"] >= 0
+    assert 0.2 <= result["final_parameters"]["probability_of_action"] <= 0.8
+
+
+def test_simulate_replicate_is_deterministic():
+    results = [
+        simulate_replicate(
+            FlatProbRLAlgorithm, PRIORS, n_users=10, n_decisions=5, update_every=5,
+            seed=3, algorithm_kwargs=KWARGS,
+        )
+        for _ in range(2)
+    ]
+    assert results[0]["regret"] == results[1]["regret"]
+    assert results[0]["mean_reward"] == results[1]["mean_reward"]
+
+
+def test_run_simulation_parallel_matches_serial():
+    kwargs = dict(
+        n_users=10, n_decisions=6, update_every=3, n_replicates=3, seed=7,
+        algorithm_kwargs=KWARGS,
+    )
+    serial = run_simulation(FlatProbRLAlgorithm, PRIORS, processes=1, **kwargs)
+    parallel = run_simulation(FlatProbRLAlgorithm, PRIORS, processes=2, **kwargs)
+
+    assert [r["regret"] for r in serial["replicates"]] == [
+        r["regret"] for r in parallel["replicates"]
+    ]
+    assert serial["summary"]["decisions"] == 180
+
+
+def test_environment_regret_is_zero_for_best_actions():
+    environment = TemperatureClicksEnvironment()
+    contexts = {"temperature": np.array([20.0, 35.0])}
+    assert environment.regret(contexts, np.array([1, 0])) == 0
+    assert environment.regret(contexts, np.array([0, 1])) > 0
+
+
+def test_simulation_leaves_rl_logger_level():
+    rl_logger = get_rl_logger()
+    handlers = len(rl_logger.handlers)
+
+    simulate_replicate(
+        FlatProbRLAlgorithm, PRIORS, n_users=2, n_decisions=2, update_every=2,
+        seed=0, algorithm_kwargs=KWARGS,
+    )
+    assert rl_logger.level == logging.INFO
+    # The file handler is attached once, however many algorithms are created
+    assert len(get_rl_logger().handlers) == handlers
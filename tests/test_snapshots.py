@@ -0,0 +1,57 @@
+import pytest
+from unittest.mock import patch
+from app.algorithms.flat_prob import FlatProbRLAlgorithm
+from app.extensions import db
+from app.models import Action, ModelParameters
+
+
+def test_snapshot_is_immutable(app):
+    snapshot = app.parameter_snapshots.get(app.rl_algorithm)
+    assert snapshot.parameters["probability_of_action"] == 0.5
+    assert snapshot.action_parameters == {"probability": 0.5}
+    with pytest.raises(TypeError):
+        snapshot.parameters["probability_of_action"] = 1.0
+
+
+def test_action_request_reads_snapshot_without_database(app, client):
+    client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    version = app.parameter_snapshots.get(app.rl_algorithm).version
+
+    with patch("app.models.ModelParameters.query") as mock_query:
+        response = client.post("/api/v1/action", json={
+            "user_id": "test_user_123",
+            "timestamp": "2025-01-01T12:00:00",
+            "decision_idx": 0,
+            "context": {"temperature": 22},
+        })
+        mock_query.assert_not_called()
+
+    assert response.status_code == 201
+    assert Action.query.one().model_parameters_id == version
+
+
+def test_new_version_is_swapped_in_on_load(app):
+    snapshots = app.parameter_snapshots
+    old = snapshots.get(app.rl_algorithm)
+
+    db.session.add(ModelParameters(1.0, "2030-01-01T00:00:00", data_watermark=7))
+    db.session.commit()
+    assert snapshots.get(app.rl_algorithm) is old
+
+    snapshots.load()
+    new = snapshots.get(app.rl_algorithm)
+    assert new.version != old.version
+    assert new.data_watermark == 7
+    assert new.action_parameters == {"probability": 1.0}
+    # Requests holding the old snapshot are unaffected
+    assert old.action_parameters == {"probability": 0.5}
+
+
+def test_snapshot_follows_algorithm_swap(app):
+    class Renamed(FlatProbRLAlgorithm):
+        version = "2.0.0"
+
+    algorithm = Renamed(seed=0)
+    snapshot = app.parameter_snapshots.get(algorithm)
+    assert snapshot.algorithm_version == "flat_prob@2.0.0"
+    assert snapshot.version == ModelParameters.query.one().id
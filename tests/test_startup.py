@@ -0,0 +1,70 @@
+from app import create_app, initialize_app, db
+from app.models import ModelParameters
+from app.startup import StartupProfiler
+from config import TestingConfig
+
+
+class LazyTestingConfig(TestingConfig):
+    LAZY_INIT = True
+
+
+def test_startup_profiler_records_phases():
+    profiler = StartupProfiler()
+    with profiler.phase("import"):
+        pass
+    with profiler.phase("import"):
+        pass
+
+    report = profiler.report(target_ms=60000)
+    assert "import" in report["phases_ms"]
+    assert report["total_ms"] >= report["phases_ms"]["import"]
+    assert report["within_target"]
+
+
+def test_startup_profiler_records_earlier_phases():
+    profiler = StartupProfiler()
+    profiler.record("import_app", 500.0)
+
+    report = profiler.report()
+    assert report["phases_ms"]["import_app"] == 500.0
+    assert report["total_ms"] >= 500.0
+
+
+def test_import_skips_features_that_are_off():
+    import subprocess
+    import sys
+
+    modules = ("app.shadow", "app.write_behind", "app.admission", "app.priors", "app.partitioning")
+    code = f"import sys, app; print([m for m in {modules!r} if m in sys.modules])"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "[]"
+
+
+def test_eager_startup_profile(app):
+    report = app.startup_profiler.report()
+    for phase in ("import_blueprints", "create_algorithm", "create_tables", "load_priors"):
+        assert phase in report["phases_ms"]
+
+
+def test_lazy_startup_defers_initialization():
+    app = create_app(LazyTestingConfig)
+    assert not app.initialized
+    assert not hasattr(app, "rl_algorithm")
+
+    client = app.test_client()
+    response = client.post("/api/v1/add_user", json={"user_id": "test_user_123"})
+    assert response.status_code == 201
+    assert app.initialized
+    assert hasattr(app, "rl_algorithm")
+
+    # A second call does not initialize again
+    algorithm = app.rl_algorithm
+    initialize_app(app)
+    assert app.rl_algorithm is algorithm
+
+    with app.app_context():
+        assert ModelParameters.query.count() == 1
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,121 @@
+import pytest
+from app import create_app, db
+from app.models import ModelParameters
+from app.studies import Study
+from config import TestingConfig
+
+
+class MultiStudyConfig(TestingConfig):
+    STUDIES = {
+        "trial_b": {
+            "DATABASE_URL": "sqlite:///:memory:",
+            "MODEL_PRIORS": {"probability_of_action": 0.3},
+            "RL_ALGORITHM_KWARGS": {"update_delay": 0},
+        }
+    }
+
+
+@pytest.fixture
+def multi_app():
+    app_instance = create_app(MultiStudyConfig)
+    with app_instance.app_context():
+        yield app_instance
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def multi_client(multi_app):
+    return multi_app.test_client()
+
+
+def request_action(client, prefix, **extra):
+    return client.post(f"{prefix}/action", json={
+        "user_id": "test_user_123",
+        "timestamp": "2025-01-01T12:00:00",
+        "decision_idx": 0,
+        "context": {"temperature": 22},
+        **extra,
+    })
+
+
+def test_study_has_its_own_tables_and_parameters(multi_client):
+    prefix = "/api/v1/studies/trial_b"
+    response = multi_client.post(f"{prefix}/add_user", json={"user_id": "test_user_123"})
+    assert response.status_code == 201
+
+    response = request_action(multi_client, prefix)
+    assert response.status_code == 201
+    assert response.json["action_prob"] == 0.3
+
+    # The user only exists in the study
+    response = request_action(multi_client, "/api/v1")
+    assert response.status_code == 404
+    assert response.json["message"] == "User not found."
+
+
+def test_study_id_in_payload(multi_client):
+    multi_client.post("/api/v1/add_user", json={"user_id": "test_user_123", "study_id": "trial_b"})
+
+    response = request_action(multi_client, "/api/v1", study_id="trial_b")
+    assert response.status_code == 201
+    assert response.json["action_prob"] == 0.3
+
+
+def test_unknown_study(multi_client):
+    response = request_action(multi_client, "/api/v1/studies/trial_x")
+    assert response.status_code == 404
+    assert response.json["message"] == "Study not found."
+
+
+def test_study_update_runs_on_its_own_queue(multi_app, multi_client):
+    prefix = "/api/v1/studies/trial_b"
+    multi_client.post(f"{prefix}/add_user", json={"user_id": "test_user_123"})
+    multi_client.post(f"{prefix}/upload_data", json={
+        "user_id": "test_user_123",
+        "timestamp": "2024-01-01T12:00:00Z",
+        "decision_idx": 0,
+        "data": {
+            "context": {"temperature": 23},
+            "action": 1,
+            "action_prob": 0.3,
+            "state": [23],
+            "outcome": {"clicks": 4},
+        },
+    })
+
+    response = multi_client.post(
+        f"{prefix}/update", json={"timestamp": "2024-01-01T12:00:00Z", "callback_url": ""}
+    )
+    assert response.status_code == 202
+
+    study = multi_app.studies["trial_b"]
+    study.update_executor.submit(lambda: None).result(10)
+    assert study.parameter_snapshots.current.version == 2
+    assert multi_app.parameter_snapshots.current.version == 1
+    with study.app_context():
+        assert ModelParameters.query.count() == 2
+    assert ModelParameters.query.count() == 1
+
+
+def test_study_requires_schema_or_database(multi_app):
+    with pytest.raises(ValueError):
+        Study(multi_app, "trial_c", {"RL_ALGORITHM": "flat_prob"})
+
+
+def test_readyz_checks_study_database(multi_app, multi_client, monkeypatch):
+    from app.routes import health
+
+    response = multi_client.get("/readyz")
+    assert response.json["checks"]["trial_b.database"]["ok"] is True
+
+    def round_trip(engine):
+        if engine is multi_app.studies["trial_b"].engine:
+            raise RuntimeError("Connection refused.")
+        return 1.0
+
+    monkeypatch.setattr(health, "round_trip", round_trip)
+    response = multi_client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["checks"]["database"]["ok"] is True
+    assert response.json["checks"]["trial_b.database"]["ok"] is False